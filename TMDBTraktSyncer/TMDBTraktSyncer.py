@@ -1,11 +1,444 @@
 import os
-import json
 import sys
 import argparse
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+if not __package__:
+    # Running TMDBTraktSyncer.py directly from a source checkout, make the package importable
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from TMDBTraktSyncer import arguments
 
+async def read_trakt_data(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value, history_source='watched', trakt_activities=None):
+    from TMDBTraktSyncer import traktData
+    from TMDBTraktSyncer import asyncRequests as AR
+
+    async def skip():
+        return []
+
+    print('Processing Trakt Data')
+    trakt_encoded_username = await traktData.get_trakt_encoded_username_async()
+    # Only refetch categories that changed since the last run
+    trakt_delta = await traktData.get_trakt_delta_state_async(trakt_encoded_username, trakt_activities)
+
+    # Fetch the watchlist, ratings and watch history at the same time
+    trakt_watchlist, trakt_ratings, watched_content = await AR.gather_or_cancel(
+        trakt_delta.fetch_async('watchlist', traktData.get_trakt_watchlist_async, trakt_encoded_username) if sync_watchlist_value or remove_watched_from_watchlists_value else skip(),
+        trakt_delta.fetch_async('ratings', traktData.get_trakt_ratings_async, trakt_encoded_username) if sync_ratings_value else skip(),
+        trakt_delta.fetch_async('history', traktData.get_trakt_watched_ids_async, trakt_encoded_username, history_source) if remove_watched_from_watchlists_value else skip()
+    )
+    trakt_delta.save()
+    print('Processing Trakt Data Complete')
+
+    return trakt_watchlist, trakt_ratings, watched_content
+
+async def read_tmdb_data(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value):
+    from TMDBTraktSyncer import tmdbData
+    from TMDBTraktSyncer import asyncRequests as AR
+
+    async def skip():
+        return []
+
+    print('Processing TMDB Data')
+    tmdb_account_id = await tmdbData.fetch_account_id_async()
+
+    # Fetch the watchlist and ratings at the same time
+    tmdb_watchlist, tmdb_ratings = await AR.gather_or_cancel(
+        tmdbData.get_tmdb_watchlist_async(tmdb_account_id) if sync_watchlist_value or remove_watched_from_watchlists_value else skip(),
+        tmdbData.get_tmdb_ratings_async(tmdb_account_id) if sync_ratings_value else skip()
+    )
+    print('Processing TMDB Data Complete')
+
+    return tmdb_watchlist, tmdb_ratings
+
+async def read_libraries(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value, history_source='watched', trakt_activities=None):
+    """
+    Fetch the Trakt and TMDB libraries needed for the selected sync options.
+
+    Both services are read at the same time, they are separate hosts with separate rate
+    limits. A failure on one side cancels the other before the exception is raised.
+
+    :param history_source: Trakt watch history source, see traktData.HISTORY_SOURCES.
+    :param trakt_activities: Trakt /sync/last_activities already fetched, or None to fetch them.
+    :return: ((trakt_watchlist, trakt_ratings, watched_content), (tmdb_watchlist, tmdb_ratings)),
+             watched_content being a list of [type, tmdb_id] pairs.
+    """
+    from TMDBTraktSyncer import asyncRequests as AR
+
+    trakt_data, tmdb_data = await AR.gather_or_cancel(
+        read_trakt_data(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value, history_source, trakt_activities),
+        read_tmdb_data(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value)
+    )
+    return trakt_data, tmdb_data
+
+def compute_plan(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value, local_store=None, deadline=None, history_source='watched', trakt_activities=None):
+    """
+    Fetch both libraries and compute every write needed to sync them.
+
+    :param local_store: LocalStore to refresh with the fetched lists and compute the diffs with, or None.
+    :param deadline: time.monotonic() value the libraries have to be read by, or None.
+    :param history_source: Trakt watch history source, see traktData.HISTORY_SOURCES.
+    :param trakt_activities: Trakt /sync/last_activities already fetched, or None to fetch them.
+    :raises errorHandling.DeadlineExceeded: The libraries could not be read before the deadline.
+    :return: SyncPlan
+    """
+    import time
+    import asyncio
+    from TMDBTraktSyncer import mediaItem as MI
+    from TMDBTraktSyncer import syncPlanner as SP
+    from TMDBTraktSyncer import errorHandling as EH
+
+    async def read():
+        # Cancels every pending read at the deadline, a partly read library must never be planned with
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            return await asyncio.wait_for(read_libraries(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value, history_source, trakt_activities), timeout)
+        except asyncio.TimeoutError:
+            raise EH.DeadlineExceeded() from None
+
+    # Fetch both libraries on a single event loop
+    (trakt_watchlist, trakt_ratings, watched_content), (tmdb_watchlist, tmdb_ratings) = asyncio.run(read())
+    
+    '''
+    # Filter out items that share the same Title, Year and Type, AND have non-matching TMDB_IDs
+    trakt_ratings, tmdb_ratings = EH.filter_mismatched_items(trakt_ratings, tmdb_ratings)
+    trakt_watchlist, tmdb_watchlist = EH.filter_mismatched_items(trakt_watchlist, tmdb_watchlist)
+    '''
+
+    if local_store is not None:
+        # Update the local store with the fetched lists and compute the diffs with indexed joins
+        local_store.replace_list('trakt', 'watchlist', trakt_watchlist)
+        local_store.replace_list('trakt', 'ratings', trakt_ratings)
+        local_store.replace_list('trakt', 'watched', (MI.MediaItem(item_type, tmdb_id=tmdb_id) for item_type, tmdb_id in watched_content))
+        local_store.replace_list('tmdb', 'watchlist', tmdb_watchlist)
+        local_store.replace_list('tmdb', 'ratings', tmdb_ratings)
+
+        sync_plan = SP.SyncPlan(
+            tmdb_ratings_set=local_store.missing_items('trakt', 'tmdb', 'ratings'),
+            trakt_ratings_set=local_store.missing_items('tmdb', 'trakt', 'ratings'),
+            tmdb_watchlist_add=local_store.missing_items('trakt', 'tmdb', 'watchlist', exclude_watched=remove_watched_from_watchlists_value),
+            trakt_watchlist_add=local_store.missing_items('tmdb', 'trakt', 'watchlist', exclude_watched=remove_watched_from_watchlists_value),
+            trakt_watchlist_remove=local_store.watched_items('trakt', 'watchlist') if remove_watched_from_watchlists_value else [],
+            tmdb_watchlist_remove=local_store.watched_items('tmdb', 'watchlist') if remove_watched_from_watchlists_value else []
+        )
+    else:
+        # Compute every add and remove operation in one pass, matching items on (type, tmdb_id)
+        sync_plan = SP.plan_sync(trakt_watchlist, trakt_ratings, watched_content, tmdb_watchlist, tmdb_ratings, remove_watched=remove_watched_from_watchlists_value)
+
+    # Only keep the operations of the selected options, the plan totals count what will be written
+    return sync_plan.for_options({'ratings': sync_ratings_value, 'watchlist': sync_watchlist_value, 'remove_watched': remove_watched_from_watchlists_value})
+
+def apply_plan(sync_plan, sync_options, journal, local_store=None, tmdb_workers=8, trakt_batch_size=100, dispatch_deadline=None):
+    """
+    Send the writes of a SyncPlan to Trakt and TMDB.
+
+    Each successful write is recorded in the journal, and in the local store if one is used.
+    With a dispatch_deadline, removals and the newest items are written first and no new writes
+    are started after it.
+
+    :param sync_options: Dict with the 'ratings', 'watchlist' and 'remove_watched' sync options.
+    :param journal: WriteJournal of the run.
+    :param dispatch_deadline: time.monotonic() value after which no new writes are started, or None.
+    :return: Dict of operation -> number of items not written before dispatch_deadline.
+    """
+    from TMDBTraktSyncer import tmdbData
+    from TMDBTraktSyncer import errorHandling as EH
+    from TMDBTraktSyncer import errorLogger as EL
+    from TMDBTraktSyncer import syncWriter as SW
+    from TMDBTraktSyncer import syncPlanner as SP
+
+    sync_ratings_value = sync_options['ratings']
+    sync_watchlist_value = sync_options['watchlist']
+    remove_watched_from_watchlists_value = sync_options['remove_watched']
+
+    # Sort lists by date, newest first when the run has a time budget
+    if dispatch_deadline is None:
+        tmdb_ratings_to_set = EH.sort_by_date_added(sync_plan.tmdb_ratings_set)
+        trakt_ratings_to_set = EH.sort_by_date_added(sync_plan.trakt_ratings_set)
+        tmdb_watchlist_to_set = EH.sort_by_date_added(sync_plan.tmdb_watchlist_add)
+        trakt_watchlist_to_set = EH.sort_by_date_added(sync_plan.trakt_watchlist_add)
+        trakt_watchlist_items_to_remove = sync_plan.trakt_watchlist_remove
+        tmdb_watchlist_items_to_remove = sync_plan.tmdb_watchlist_remove
+    else:
+        tmdb_ratings_to_set = SP.sort_by_priority(sync_plan.tmdb_ratings_set)
+        trakt_ratings_to_set = SP.sort_by_priority(sync_plan.trakt_ratings_set)
+        tmdb_watchlist_to_set = SP.sort_by_priority(sync_plan.tmdb_watchlist_add)
+        trakt_watchlist_to_set = SP.sort_by_priority(sync_plan.trakt_watchlist_add)
+        trakt_watchlist_items_to_remove = SP.sort_by_priority(sync_plan.trakt_watchlist_remove)
+        tmdb_watchlist_items_to_remove = SP.sort_by_priority(sync_plan.tmdb_watchlist_remove)
+    
+    # Operation -> number of items left for the next run
+    deferred = {}
+
+    # Set TMDB Watchlist Items
+    def set_tmdb_watchlist_items():
+        if tmdb_watchlist_to_set:
+            print('Setting TMDB Watchlist Items')
+            
+            # Fetch Account ID (cached)
+            account_id = tmdbData.fetch_account_id()
+            
+            # Count the total number of items
+            num_items = len(tmdb_watchlist_to_set)
+            item_count = 0
+            
+            # Send the watchlist changes concurrently
+            build_request = SW.build_tmdb_watchlist_request(account_id, True)
+            completed_items = []
+            for item, success in SW.write_tmdb_items(tmdb_watchlist_to_set, build_request, max_workers=tmdb_workers, deadline=dispatch_deadline):
+                item_count += 1
+
+                episode_title = item.episode_label()
+                
+                if success:
+                    print(f" - Added {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) to TMDB Watchlist (TMDB ID: {item.tmdb_id})")
+                    completed_items.append(item)
+                    journal.record('tmdb_watchlist_add', item)
+                else:
+                    error_message = f"Failed to add {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) to TMDB Watchlist (TMDB ID: {item.tmdb_id})"
+                    print(f"   - {error_message}")
+                    EL.logger.error(error_message)
+
+            # Items not sent before the dispatch deadline are left for the next run
+            if item_count < num_items:
+                deferred['tmdb_watchlist_add'] = num_items - item_count
+
+            # Record the completed writes in the local store
+            if local_store:
+                local_store.add_items('tmdb', 'watchlist', completed_items)
+
+            print('Setting TMDB Watchlist Items Complete')
+        else:
+            print('No TMDB Watchlist Items To Set')
+
+    # Set Trakt Watchlist Items
+    def set_trakt_watchlist_items():
+        if trakt_watchlist_to_set:
+            print('Setting Trakt Watchlist Items')
+
+            # Count the total number of items
+            num_items = len(trakt_watchlist_to_set)
+            item_count = 0
+
+            url = "https://api.trakt.tv/sync/watchlist"
+
+            # Send the items in batches and report the result for each item
+            completed_items = []
+            for item, success in SW.write_trakt_batches(url, trakt_watchlist_to_set, SW.build_trakt_watchlist_entry, batch_size=trakt_batch_size, deadline=dispatch_deadline):
+                item_count += 1
+
+                episode_title = item.episode_label()
+                        
+                if success:
+                    print(f" - Added {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) to Trakt Watchlist (TMDB ID: {item.tmdb_id})")
+                    completed_items.append(item)
+                    journal.record('trakt_watchlist_add', item)
+                else:
+                    error_message = f"Failed to add {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) to Trakt Watchlist (TMDB ID: {item.tmdb_id})"
+                    print(f"   - {error_message}")
+                    EL.logger.error(error_message)
+                    
+            # Items not sent before the dispatch deadline are left for the next run
+            if item_count < num_items:
+                deferred['trakt_watchlist_add'] = num_items - item_count
+
+            # Record the completed writes in the local store
+            if local_store:
+                local_store.add_items('trakt', 'watchlist', completed_items)
+
+            print('Setting Trakt Watchlist Items Complete')
+        else:
+            print('No Trakt Watchlist Items To Set')
+
+    # Set TMDB Ratings
+    def set_tmdb_ratings():
+        if tmdb_ratings_to_set:
+            print('Setting TMDB Ratings')
+            
+            # Count the total number of items to rate
+            num_items = len(tmdb_ratings_to_set)
+            item_count = 0
+            
+            # Set TMDB Ratings concurrently
+            completed_items = []
+            for item, success in SW.write_tmdb_items(tmdb_ratings_to_set, SW.build_tmdb_rating_request, max_workers=tmdb_workers, deadline=dispatch_deadline):
+                item_count += 1
+
+                episode_title = item.episode_label()
+                
+                if success:
+                    print(f" - Rated {item.type} ({item_count} of {num_items}): {item.title} {episode_title}({item.year}): {item.rating}/10 on TMDB (TMDB ID: {item.tmdb_id})")
+                    completed_items.append(item)
+                    journal.record('tmdb_ratings_set', item)
+                else:
+                    error_message = f"Failed rating {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}): {item.rating}/10 on TMDB (TMDB ID: {item.tmdb_id})"
+                    print(f"   - {error_message}")
+                    EL.logger.error(error_message)
+
+            # Items not sent before the dispatch deadline are left for the next run
+            if item_count < num_items:
+                deferred['tmdb_ratings_set'] = num_items - item_count
+
+            # Record the completed writes in the local store
+            if local_store:
+                local_store.add_items('tmdb', 'ratings', completed_items)
+
+            print('Setting TMDB Ratings Complete')
+        else:
+            print('No TMDB Ratings To Set')
+
+    # Set Trakt Ratings
+    def set_trakt_ratings():
+        if trakt_ratings_to_set:
+            print('Setting Trakt Ratings')
+
+            # Set the API endpoints
+            rate_url = "https://api.trakt.tv/sync/ratings"
+            
+            # Count the total number of items to rate
+            num_items = len(trakt_ratings_to_set)
+            item_count = 0
+                    
+            # Rate the items on Trakt in batches
+            completed_items = []
+            for item, success in SW.write_trakt_batches(rate_url, trakt_ratings_to_set, SW.build_trakt_rating_entry, batch_size=trakt_batch_size, deadline=dispatch_deadline):
+                item_count += 1
+
+                episode_title = item.episode_label()
+                
+                if success:
+                    print(f" - Rated {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}): {item.rating}/10 on Trakt (TMDB ID: {item.tmdb_id})")
+                    completed_items.append(item)
+                    journal.record('trakt_ratings_set', item)
+                else:
+                    error_message = f"Failed rating {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}): {item.rating}/10 on Trakt (TMDB ID: {item.tmdb_id})"
+                    print(f"   - {error_message}")
+                    EL.logger.error(error_message)
+
+            # Items not sent before the dispatch deadline are left for the next run
+            if item_count < num_items:
+                deferred['trakt_ratings_set'] = num_items - item_count
+
+            # Record the completed writes in the local store
+            if local_store:
+                local_store.add_items('trakt', 'ratings', completed_items)
+
+            print('Setting Trakt Ratings Complete')
+        else:
+            print('No Trakt Ratings To Set')
+    
+    # Remove Watched Items Trakt Watchlist
+    def remove_trakt_watchlist_items():
+        if trakt_watchlist_items_to_remove:
+            print('Removing Watched Items From Trakt Watchlist')
+
+            # Set the API endpoint
+            remove_url = "https://api.trakt.tv/sync/watchlist/remove"
+
+            # Count the total number of items
+            num_items = len(trakt_watchlist_items_to_remove)
+            item_count = 0
+
+            # Remove the items from the watchlist in batches
+            completed_items = []
+            for item, success in SW.write_trakt_batches(remove_url, trakt_watchlist_items_to_remove, SW.build_trakt_watchlist_removal_entry, batch_size=trakt_batch_size, deadline=dispatch_deadline):
+                item_count += 1
+
+                episode_title = item.episode_label()
+                
+                if success:
+                    print(f" - Removed {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) from Trakt Watchlist (TMDB ID: {item.tmdb_id})")
+                    completed_items.append(item)
+                    journal.record('trakt_watchlist_remove', item)
+                else:
+                    error_message = f"Failed removing {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) from Trakt Watchlist (TMDB ID: {item.tmdb_id})"
+                    print(f"   - {error_message}")
+                    EL.logger.error(error_message)
+
+            # Items not sent before the dispatch deadline are left for the next run
+            if item_count < num_items:
+                deferred['trakt_watchlist_remove'] = num_items - item_count
+
+            # Record the completed writes in the local store
+            if local_store:
+                local_store.remove_items('trakt', 'watchlist', completed_items)
+
+            print('Removing Watched Items From Trakt Watchlist Complete')
+        else:
+            print('No Watched Items To Remove From Trakt Watchlist')
+
+    # Remove Watched Items TMDB Watchlist
+    def remove_tmdb_watchlist_items():
+        if tmdb_watchlist_items_to_remove:
+            print('Removing Watched Items From TMDB Watchlist')
+            
+            # Fetch Account ID (cached)
+            account_id = tmdbData.fetch_account_id()
+            
+            # Count the total number of items
+            num_items = len(tmdb_watchlist_items_to_remove)
+            item_count = 0
+            
+            # Send the watchlist removals concurrently
+            build_request = SW.build_tmdb_watchlist_request(account_id, False)
+            completed_items = []
+            for item, success in SW.write_tmdb_items(tmdb_watchlist_items_to_remove, build_request, max_workers=tmdb_workers, deadline=dispatch_deadline):
+                item_count += 1
+
+                episode_title = item.episode_label()
+                
+                if success:
+                    print(f" - Removed {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) from TMDB Watchlist (TMDB ID: {item.tmdb_id})")
+                    completed_items.append(item)
+                    journal.record('tmdb_watchlist_remove', item)
+                else:
+                    error_message = f"Failed to remove {item.type} ({item_count} of {num_items}): {episode_title}{item.title} ({item.year}) from TMDB Watchlist (TMDB ID: {item.tmdb_id})"
+                    print(f"   - {error_message}")
+                    EL.logger.error(error_message)
+
+            
+            # Items not sent before the dispatch deadline are left for the next run
+            if item_count < num_items:
+                deferred['tmdb_watchlist_remove'] = num_items - item_count
+
+            # Record the completed writes in the local store
+            if local_store:
+                local_store.remove_items('tmdb', 'watchlist', completed_items)
+
+            print('Removing Watched Items From TMDB Watchlist Complete')
+        else:
+            print('No Watched Items To Remove From TMDB Watchlist')
+
+    # Operation -> (enabled, function making its writes)
+    steps = {
+        'tmdb_watchlist_add': (sync_watchlist_value, set_tmdb_watchlist_items),
+        'trakt_watchlist_add': (sync_watchlist_value, set_trakt_watchlist_items),
+        'tmdb_ratings_set': (sync_ratings_value, set_tmdb_ratings),
+        'trakt_ratings_set': (sync_ratings_value, set_trakt_ratings),
+        'trakt_watchlist_remove': (remove_watched_from_watchlists_value, remove_trakt_watchlist_items),
+        'tmdb_watchlist_remove': (remove_watched_from_watchlists_value, remove_tmdb_watchlist_items)
+    }
+
+    # Removals and the batched Trakt writes go first when the run has a time budget
+    for operation in (SP.OPERATIONS if dispatch_deadline is None else SP.PRIORITY_OPERATIONS):
+        enabled, make_writes = steps[operation]
+        if enabled:
+            make_writes()
+
+    return deferred
+
+def shard_argument(value):
+    """
+    Parse a --shard value "i/n" into (i, n), shards counting from 1.
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/n, e.g. 1/4, got '{value}'")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {value} is out of range, i must be between 1 and n")
+    return index, count
+
 def main():
 
     parser = argparse.ArgumentParser(description="TMDBTraktSyncer CLI")
@@ -14,8 +447,26 @@ def main():
     parser.add_argument("--uninstall", action="store_true", help="Clears cached data except user entered credentials before uninstalling.")
     parser.add_argument("--clean-uninstall", action="store_true", help="Clears all cached data, inluding user credentials before uninstalling.")
     parser.add_argument("--directory", action="store_true", help="Prints the package install directory.")
+    parser.add_argument("--show-log", nargs="?", type=int, const=20, metavar="N", help="Prints the newest N log entries, newest first (default: 20).")
+    parser.add_argument("--local-store", action="store_true", help="Keep a local SQLite copy of both libraries and compute the sync with indexed queries.")
+    parser.add_argument("--tmdb-workers", type=int, default=8, metavar="N", help="Number of concurrent TMDB write requests (default: 8).")
+    parser.add_argument("--trakt-batch-size", type=int, default=100, metavar="N", help="Number of items sent per Trakt sync request (default: 100).")
+    parser.add_argument("--history-source", choices=["watched", "history"], default="watched", help="Read the Trakt watch history from the aggregated watched lists (watched, default) or from every play (history).")
+    plan_group = parser.add_mutually_exclusive_group()
+    plan_group.add_argument("--plan", metavar="FILE", help="Fetch both libraries and save the changes to make to FILE, without making them.")
+    plan_group.add_argument("--apply", metavar="FILE", help="Make the changes saved by --plan, without fetching the libraries.")
+    parser.add_argument("--shard", type=shard_argument, metavar="I/N", help="With --apply, make only the I-th of N equal parts of the changes, e.g. 1/4.")
+    parser.add_argument("--max-runtime", type=float, metavar="SECONDS", help="End the run after about SECONDS. No new change starts shortly before then, removals and the newest items go first, and the next run makes the rest.")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="FILE", help="Save every API request and response, without credentials, to the compressed cassette FILE.")
+    cassette_group.add_argument("--replay", metavar="FILE", help="Run offline against the responses recorded with --record, your accounts and settings are not touched.")
+    parser.add_argument("--replay-timing", choices=["original", "fast"], default="original", help="With --replay, keep the recorded pacing and response times (original) or answer at once (fast).")
     
     args = parser.parse_args()
+    if args.shard and not args.apply:
+        parser.error("--shard requires --apply")
+    if args.max_runtime is not None and args.max_runtime <= 0:
+        parser.error("--max-runtime must be greater than 0")
     
     main_directory = os.path.dirname(os.path.realpath(__file__))
 
@@ -34,454 +485,150 @@ def main():
     if args.directory:
         arguments.print_directory(main_directory)
     
+    if args.show_log is not None:
+        arguments.show_log(main_directory, args.show_log)
+    
     # If no arguments are passed, run the main package logic
-    if not any([args.clear_user_data, args.clear_cache, args.uninstall, args.clean_uninstall, args.directory]):
+    if not any([args.clear_user_data, args.clear_cache, args.uninstall, args.clean_uninstall, args.directory, args.show_log is not None]):
     
         # Run main package
         print("Starting TMDBTraktSyncer....")
+        import time
         from TMDBTraktSyncer import checkVersion as CV
         from TMDBTraktSyncer import verifyCredentials as VC
-        from TMDBTraktSyncer import traktData
-        from TMDBTraktSyncer import tmdbData
         from TMDBTraktSyncer import errorHandling as EH
         from TMDBTraktSyncer import errorLogger as EL
+        from TMDBTraktSyncer import httpSession as HS
+        from TMDBTraktSyncer import metadataCache as MC
+        from TMDBTraktSyncer import asyncRequests as AR
+        from TMDBTraktSyncer import syncPlanner as SP
+        from TMDBTraktSyncer import syncWriter as SW
+        from TMDBTraktSyncer import writeJournal as WJ
+    
+        # Write errors to log.txt
+        EL.setup_logging()
     
-        # Check if package is up to date
-        CV.checkVersion()
+        # Check if package is up to date, in the background unless checked in the last day. Replays run offline.
+        if not args.replay:
+            CV.checkVersion()
+
+        local_store = None
+        journal = WJ.WriteJournal()
+
+        # With a time budget, reading stops and no new writes start close to the deadline, rate limit waits and retries never wait past it
+        dispatch_deadline = None
+        if args.max_runtime is not None:
+            deadline = time.monotonic() + args.max_runtime
+            dispatch_deadline = SW.dispatch_deadline(deadline, args.max_runtime)
+            EH.set_deadline(deadline)
 
         try:
+            if args.record or args.replay:
+                from TMDBTraktSyncer import httpCassette as HC
+                if args.record:
+                    state_directory = HC.start_recording(args.record)
+                else:
+                    state_directory = HC.start_replay(args.replay, realtime=args.replay_timing == 'original')
+                # Recorded and replayed runs keep their journal apart from the one of normal runs
+                journal = WJ.WriteJournal(os.path.join(state_directory, 'write_journal.jsonl'))
+
             # Print credentials directory
             VC.print_directory(main_directory)
         
             # Save the credential values as variables
             _, _, _, _, _ = VC.prompt_get_credentials()
-            sync_ratings_value = VC.prompt_sync_ratings()
-            sync_watchlist_value = VC.prompt_sync_watchlist()
-            remove_watched_from_watchlists_value = VC.prompt_remove_watched_from_watchlists()
-            
-            # Initalize list values
-            trakt_watchlist = trakt_ratings = watched_content = tmdb_watchlist = tmdb_ratings = []
-            
-            print('Processing Trakt Data')
-            trakt_encoded_username = traktData.get_trakt_encoded_username()
-            if sync_watchlist_value or remove_watched_from_watchlists_value:
-                trakt_watchlist = traktData.get_trakt_watchlist(trakt_encoded_username)
-            if sync_ratings_value:
-                trakt_ratings = traktData.get_trakt_ratings(trakt_encoded_username)
-            if remove_watched_from_watchlists_value:
-                watched_content = traktData.get_trakt_watch_history(trakt_encoded_username)
-            print('Processing Trakt Data Complete')
-            
-            print('Processing TMDB Data')
-            tmdb_account_id = tmdbData.fetch_account_id()
-            if sync_watchlist_value or remove_watched_from_watchlists_value:
-                tmdb_watchlist = tmdbData.get_tmdb_watchlist(tmdb_account_id)
-            if sync_ratings_value:
-                tmdb_ratings = tmdbData.get_tmdb_ratings(tmdb_account_id)
-            print('Processing TMDB Data Complete')
-            
-            '''
-            # Filter out items that share the same Title, Year and Type, AND have non-matching TMDB_IDs
-            trakt_ratings, tmdb_ratings = EH.filter_mismatched_items(trakt_ratings, tmdb_ratings)
-            trakt_watchlist, tmdb_watchlist = EH.filter_mismatched_items(trakt_watchlist, tmdb_watchlist)
-            '''
-
-            #Get trakt and tmdb ratings and filter out trakt ratings with missing tmdb id
-            trakt_ratings = [rating for rating in trakt_ratings if rating['TMDB_ID'] is not None]
-            tmdb_ratings = [rating for rating in tmdb_ratings if rating['TMDB_ID'] is not None]
-            trakt_watchlist = [item for item in trakt_watchlist if item['TMDB_ID'] is not None]
-            tmdb_watchlist = [item for item in tmdb_watchlist if item['TMDB_ID'] is not None]
             
-            # Filter out items already set: Filters items from the target_list that are not already present in the source_list based on key
-            tmdb_ratings_to_set = EH.filter_items(tmdb_ratings, trakt_ratings, key="TMDB_ID")
-            trakt_ratings_to_set = EH.filter_items(trakt_ratings, tmdb_ratings, key="TMDB_ID")
-            tmdb_watchlist_to_set = EH.filter_items(tmdb_watchlist, trakt_watchlist, key="TMDB_ID")
-            trakt_watchlist_to_set = EH.filter_items(trakt_watchlist, tmdb_watchlist, key="TMDB_ID")
+            if args.local_store:
+                from TMDBTraktSyncer import localStore as LS
+                local_store = LS.LocalStore()
             
-            # If remove_watched_from_watchlists_value is true
-            if remove_watched_from_watchlists_value:        
-                # Get the IDs from watched_content
-                watched_content_ids = set(item['TMDB_ID'] for item in watched_content if item['TMDB_ID'])
-                        
-                # Filter out watched content from trakt_watchlist_to_set
-                trakt_watchlist_to_set = [item for item in trakt_watchlist_to_set if item['TMDB_ID'] not in watched_content_ids]
-                # Filter out watched content from trakt_watchlist_to_set
-                tmdb_watchlist_to_set = [item for item in tmdb_watchlist_to_set if item['TMDB_ID'] not in watched_content_ids]
-                
-                # Find items to remove from trakt_watchlist
-                trakt_watchlist_items_to_remove = [item for item in trakt_watchlist if item['TMDB_ID'] in watched_content_ids]
-                # Find items to remove from tmdb_watchlist
-                tmdb_watchlist_items_to_remove = [item for item in tmdb_watchlist if item['TMDB_ID'] in watched_content_ids]
-                
-            # Sort lists by date
-            tmdb_ratings_to_set = EH.sort_by_date_added(tmdb_ratings_to_set)
-            trakt_ratings_to_set = EH.sort_by_date_added(trakt_ratings_to_set)
-            tmdb_watchlist_to_set = EH.sort_by_date_added(tmdb_watchlist_to_set)
-            trakt_watchlist_to_set = EH.sort_by_date_added(trakt_watchlist_to_set)
-            
-            # If sync_watchlist_value is true
-            if sync_watchlist_value:
-
-                # Set TMDB Watchlist Items
-                if tmdb_watchlist_to_set:
-                    print('Setting TMDB Watchlist Items')
-                    
-                    # Fetch Account ID
-                    response = EH.make_tmdb_request('https://api.themoviedb.org/3/account')
-                    json_data = json.loads(response.text)
-                    account_id = json_data['id']
-                    
-                    # Count the total number of items
-                    num_items = len(tmdb_watchlist_to_set)
-                    item_count = 0
-                    
-                    url = f"https://api.themoviedb.org/3/account/{account_id}/watchlist"
-                    
-                    for item in tmdb_watchlist_to_set:
-                        item_count += 1
-                        payload = {}  # Add any additional payload parameters if required
-                        if item['Type'] == 'movie':
-                            payload['media_type'] = "movie"
-                            payload['media_id'] = item['TMDB_ID']
-                            payload['watchlist'] = True
-
-                        elif item['Type'] == 'show':
-                            payload['media_type'] = "tv"
-                            payload['media_id'] = item['TMDB_ID']
-                            payload['watchlist'] = True
-                        
-                        response = EH.make_tmdb_request(url, payload=payload)
-                        
-                        season_number = item.get('SeasonNumber')
-                        episode_number = item.get('EpisodeNumber')
-                        if season_number and episode_number:
-                            season_number = str(season_number).zfill(2)
-                            episode_number = str(episode_number).zfill(2)
-                            episode_title = f'[S{season_number}E{episode_number}] '
-                        else:
-                            episode_title = ''
-                        
-                        if response and response.status_code in [200, 201, 204]:
-                            print(f" - Added {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) to TMDB Watchlist (TMDB ID: {item['TMDB_ID']})")
-                        else:
-                            error_message = f"Failed to add {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) to TMDB Watchlist (TMDB ID: {item['TMDB_ID']})"
-                            print(f"   - {error_message}")
-                            EL.logger.error(error_message)
-
-                    print('Setting TMDB Watchlist Items Complete')
-                else:
-                    print('No TMDB Watchlist Items To Set')
-
-                # Set Trakt Watchlist Items
-                if trakt_watchlist_to_set:
-                    print('Setting Trakt Watchlist Items')
-
-                    # Count the total number of items
-                    num_items = len(trakt_watchlist_to_set)
-                    item_count = 0
-
-                    for item in trakt_watchlist_to_set:
-                        item_count += 1
-                        tmdb_id = item['TMDB_ID']
-                        media_type = item['Type']  # 'movie', 'show', or 'episode'
-
-                        url = f"https://api.trakt.tv/sync/watchlist"
-
-                        data = {
-                            "movies": [],
-                            "shows": [],
-                            "episodes": []
-                        }
-
-                        if media_type == 'movie':
-                            data['movies'].append({
-                                "ids": {
-                                    "tmdb": tmdb_id
-                                }
-                            })
-                        elif media_type == 'show':
-                            data['shows'].append({
-                                "ids": {
-                                    "tmdb": tmdb_id
-                                }
-                            })
-                        elif media_type == 'episode':
-                            data['episodes'].append({
-                                "ids": {
-                                    "tmdb": tmdb_id
-                                }
-                            })
-
-                        response = EH.make_trakt_request(url, payload=data)
-                        
-                        season_number = item.get('SeasonNumber')
-                        episode_number = item.get('EpisodeNumber')
-                        if season_number and episode_number:
-                            season_number = str(season_number).zfill(2)
-                            episode_number = str(episode_number).zfill(2)
-                            episode_title = f'[S{season_number}E{episode_number}] '
-                        else:
-                            episode_title = ''
-                                
-                        if response and response.status_code in [200, 201, 204]:
-                            print(f" - Added {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) to Trakt Watchlist (TMDB ID: {item['TMDB_ID']})")
-                        else:
-                            error_message = f"Failed to add {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) to Trakt Watchlist (TMDB ID: {item['TMDB_ID']})"
-                            print(f"   - {error_message}")
-                            EL.logger.error(error_message)
-                            
-                    print('Setting Trakt Watchlist Items Complete')
-                else:
-                    print('No Trakt Watchlist Items To Set')
-
-            # If sync_ratings_value is true
-            if sync_ratings_value:
-                
-                # Set TMDB Ratings
-                if tmdb_ratings_to_set:
-                    print('Setting TMDB Ratings')
-                    
-                    # Count the total number of items to rate
-                    num_items = len(tmdb_ratings_to_set)
-                    item_count = 0
-                    
-                    # Set TMDB Rating
-                    for item in tmdb_ratings_to_set:
-                        item_count += 1
-
-                        if item['Type'] == 'movie':
-                            payload = {
-                                'value': item['Rating']
-                            }
-                            url = f"https://api.themoviedb.org/3/movie/{item['TMDB_ID']}/rating"
-
-                        elif item['Type'] == 'show':
-                            payload = {
-                                'value': item['Rating']
-                            }
-                            url = f"https://api.themoviedb.org/3/tv/{item['TMDB_ID']}/rating"
-
-                        elif item['Type'] == 'episode':
-                            payload = {
-                                'value': item['Rating']
-                            }
-                            url = f"https://api.themoviedb.org/3/tv/{item['TMDB_ShowID']}/season/{item['Season']}/episode/{item['Episode']}/rating"
-
-                        response = EH.make_tmdb_request(url, payload=payload)
-                            
-                        season_number = item.get('SeasonNumber')
-                        episode_number = item.get('EpisodeNumber')
-                        if season_number and episode_number:
-                            season_number = str(season_number).zfill(2)
-                            episode_number = str(episode_number).zfill(2)
-                            episode_title = f'[S{season_number}E{episode_number}] '
-                        else:
-                            episode_title = ''
-                        
-                        if response and response.status_code in [200, 201, 204]:
-                            print(f" - Rated {item['Type']} ({item_count} of {num_items}): {item['Title']} {episode_title}({item['Year']}): {item['Rating']}/10 on TMDB (TMDB ID: {item['TMDB_ID']})")
-                        else:
-                            error_message = f"Failed rating {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}): {item['Rating']}/10 on TMDB (TMDB ID: {item['TMDB_ID']})"
-                            print(f"   - {error_message}")
-                            EL.logger.error(error_message)
-
-                    print('Setting TMDB Ratings Complete')
+            if args.apply:
+                # Apply a plan written by --plan, or the given shard of it
+                sync_plan, sync_options, created_at = SP.load_plan(args.apply)
+                shard_index, shard_count = args.shard or (1, 1)
+                sync_plan = sync_plan.shard(shard_index - 1, shard_count)
+                print(f'Applying {args.apply} (shard {shard_index}/{shard_count}, {sync_plan.total} items)')
+
+                # One journal per shard, so an interrupted worker resumes its own shard
+                journal = WJ.WriteJournal(f'{args.apply}.{shard_index}-of-{shard_count}.journal')
+                journal_options = {'plan_created_at': created_at, 'shard': [shard_index, shard_count]}
+                resumed_plan = journal.resume(journal_options)
+                if resumed_plan is not None:
+                    print(f'Resuming Interrupted Apply ({resumed_plan.total} items left)')
+                    sync_plan = resumed_plan
                 else:
-                    print('No TMDB Ratings To Set')
-
-                # Set Trakt Ratings
-                if trakt_ratings_to_set:
-                    print('Setting Trakt Ratings')
-
-                    # Set the API endpoints
-                    rate_url = "https://api.trakt.tv/sync/ratings"
-                    
-                    # Count the total number of items to rate
-                    num_items = len(trakt_ratings_to_set)
-                    item_count = 0
-                            
-                    # Loop through your data table and rate each item on Trakt
-                    for item in trakt_ratings_to_set:
-                        item_count += 1
-                        if item["Type"] == "show":
-                            # This is a TV show
-                            data = {
-                                "shows": [{
-                                    "ids": {
-                                        "tmdb": item["TMDB_ID"]
-                                    },
-                                    "rating": item["Rating"]
-                                }]
-                            }
-                        elif item["Type"] == "movie":
-                            # This is a movie
-                            data = {
-                                "movies": [{
-                                    "ids": {
-                                        "tmdb": item["TMDB_ID"]
-                                    },
-                                    "rating": item["Rating"]
-                                }]
-                            }
-                        elif item["Type"] == "episode":
-                            # This is an episode
-                            data = {
-                                "episodes": [{
-                                    "ids": {
-                                        "tmdb": item["TMDB_ID"]
-                                    },
-                                    "rating": item["Rating"]
-                                }]
-                            }
-
-                        # Make the API call to rate the item
-                        response = EH.make_trakt_request(rate_url, payload=data)
-                        
-                        season_number = item.get('SeasonNumber')
-                        episode_number = item.get('EpisodeNumber')
-                        if season_number and episode_number:
-                            season_number = str(season_number).zfill(2)
-                            episode_number = str(episode_number).zfill(2)
-                            episode_title = f'[S{season_number}E{episode_number}] '
-                        else:
-                            episode_title = ''
-                        
-                        if response and response.status_code in [200, 201, 204]:
-                            print(f" - Rated {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}): {item['Rating']}/10 on Trakt (TMDB ID: {item['TMDB_ID']})")
-                        else:
-                            error_message = f"Failed rating {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}): {item['Rating']}/10 on Trakt (TMDB ID: {item['TMDB_ID']})"
-                            print(f"   - {error_message}")
-                            EL.logger.error(error_message)
-
-                    print('Setting Trakt Ratings Complete')
+                    journal.start(sync_plan, journal_options)
+            else:
+                sync_ratings_value = VC.prompt_sync_ratings()
+                sync_watchlist_value = VC.prompt_sync_watchlist()
+                remove_watched_from_watchlists_value = VC.prompt_remove_watched_from_watchlists()
+                sync_options = {'ratings': sync_ratings_value, 'watchlist': sync_watchlist_value, 'remove_watched': remove_watched_from_watchlists_value}
+
+                # Trakt's latest change per category, an interrupted sync is only continued if nothing else changed since
+                from TMDBTraktSyncer import traktData
+                trakt_activities = traktData.get_trakt_last_activities()
+
+                # Continue an interrupted sync from the write journal instead of fetching everything again
+                sync_plan = None if args.plan or trakt_activities is None else journal.resume(sync_options, trakt_activities)
+                if sync_plan is not None:
+                    print(f'Resuming Interrupted Sync ({sync_plan.total} items left)')
                 else:
-                    print('No Trakt Ratings To Set')
-            
-            # If remove_watched_from_watchlists_value is true
-            if remove_watched_from_watchlists_value:
+                    sync_plan = compute_plan(sync_ratings_value, sync_watchlist_value, remove_watched_from_watchlists_value, local_store, dispatch_deadline, args.history_source, trakt_activities)
+
+                    if args.plan:
+                        # Only write the plan, the writes are made by --apply
+                        SP.save_plan(args.plan, sync_plan, sync_options)
+                        counts = ', '.join(f'{operation}: {count}' for operation, count in sync_plan.counts().items())
+                        print(f'Saved Sync Plan To {args.plan} ({counts})')
+                        return
             
-                # Remove Watched Items Trakt Watchlist
-                if trakt_watchlist_items_to_remove:
-                    print('Removing Watched Items From Trakt Watchlist')
-
-                    # Set the API endpoint
-                    remove_url = "https://api.trakt.tv/sync/watchlist/remove"
-
-                    # Count the total number of items
-                    num_items = len(trakt_watchlist_items_to_remove)
-                    item_count = 0
-
-                    # Loop through the items to remove from the watchlist
-                    for item in trakt_watchlist_items_to_remove:
-                        item_count += 1
-                        if item["Type"] == "show":
-                            # This is a TV show
-                            data = {
-                                "shows": [{
-                                    "ids": {
-                                        "trakt": item["TraktID"]
-                                    }
-                                }]
-                            }
-                        elif item["Type"] == "movie":
-                            # This is a movie
-                            data = {
-                                "movies": [{
-                                    "ids": {
-                                        "trakt": item["TraktID"]
-                                    }
-                                }]
-                            }
-                        elif item["Type"] == "episode":
-                            # This is an episode
-                            data = {
-                                "episodes": [{
-                                    "ids": {
-                                        "trakt": item["TraktID"]
-                                    }
-                                }]
-                            }
-
-                        # Make the API call to remove the item from the watchlist
-                        response = EH.make_trakt_request(remove_url, payload=data)
-                            
-                        season_number = item.get('SeasonNumber')
-                        episode_number = item.get('EpisodeNumber')
-                        if season_number and episode_number:
-                            season_number = str(season_number).zfill(2)
-                            episode_number = str(episode_number).zfill(2)
-                            episode_title = f'[S{season_number}E{episode_number}] '
-                        else:
-                            episode_title = ''
-                        
-                        if response and response.status_code in [200, 201, 204]:
-                            print(f" - Removed {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) from Trakt Watchlist (TMDB ID: {item['TMDB_ID']})")
-                        else:
-                            error_message = f"Failed removing {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) from Trakt Watchlist (TMDB ID: {item['TMDB_ID']})"
-                            print(f"   - {error_message}")
-                            EL.logger.error(error_message)
-
-                    print('Removing Watched Items From Trakt Watchlist Complete')
-                else:
-                    print('No Watched Items To Remove From Trakt Watchlist')
+                    # Journal the plan, an interrupted run resumes from it
+                    journal.start(sync_plan, sync_options, trakt_activities)
 
-                # Remove Watched Items TMDB Watchlist
-                if tmdb_watchlist_items_to_remove:
-                    print('Removing Watched Items From TMDB Watchlist')
-                    
-                    # Fetch Account ID
-                    response = EH.make_tmdb_request('https://api.themoviedb.org/3/account')
-                    json_data = json.loads(response.text)
-                    account_id = json_data['id']
-                    
-                    # Count the total number of items
-                    num_items = len(tmdb_watchlist_items_to_remove)
-                    item_count = 0
-                    
-                    url = f"https://api.themoviedb.org/3/account/{account_id}/watchlist"
-                    
-                    for item in tmdb_watchlist_items_to_remove:
-                        item_count += 1
-                        payload = {}  # Add any additional payload parameters if required
-                        if item['Type'] == 'movie':
-                            payload['media_type'] = "movie"
-                            payload['media_id'] = item['TMDB_ID']
-                            payload['watchlist'] = False  # Set watchlist to False to remove the item
-
-                        elif item['Type'] == 'show':
-                            payload['media_type'] = "tv"
-                            payload['media_id'] = item['TMDB_ID']
-                            payload['watchlist'] = False  # Set watchlist to False to remove the item
-                        
-                        response = EH.make_tmdb_request(url, payload=payload)
-                        
-                        season_number = item.get('SeasonNumber')
-                        episode_number = item.get('EpisodeNumber')
-                        if season_number and episode_number:
-                            season_number = str(season_number).zfill(2)
-                            episode_number = str(episode_number).zfill(2)
-                            episode_title = f'[S{season_number}E{episode_number}] '
-                        else:
-                            episode_title = ''
-                        
-                        if response and response.status_code in [200, 201, 204]:
-                            print(f" - Removed {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) from TMDB Watchlist (TMDB ID: {item['TMDB_ID']})")
-                        else:
-                            error_message = f"Failed to remove {item['Type']} ({item_count} of {num_items}): {episode_title}{item['Title']} ({item['Year']}) from TMDB Watchlist (TMDB ID: {item['TMDB_ID']})"
-                            print(f"   - {error_message}")
-                            EL.logger.error(error_message)
+            deferred = apply_plan(sync_plan, sync_options, journal, local_store, tmdb_workers=args.tmdb_workers, trakt_batch_size=args.trakt_batch_size, dispatch_deadline=dispatch_deadline)
 
-                    
-                    print('Removing Watched Items From TMDB Watchlist Complete')
-                else:
-                    print('No Watched Items To Remove From TMDB Watchlist')
+            if deferred:
+                # Keep the journal, the next run resumes with the deferred items
+                counts = ', '.join(f'{operation}: {count}' for operation, count in deferred.items())
+                print(f"Time Budget Reached, {sum(deferred.values())} Items Deferred To The Next Run ({counts})")
+            else:
+                # Every planned write was attempted, the next run starts from a fresh fetch
+                journal.finish()
 
             print("TMDBTraktSyncer Complete")
             
+        except KeyboardInterrupt:
+            print("TMDBTraktSyncer Interrupted, the next run continues where this one stopped.")
+
+        except EH.DeadlineExceeded:
+            print("Time Budget Reached While Reading The Libraries, Nothing Was Changed.")
+            
         except Exception as e:
             error_message = "An error occurred while running the script."
             EH.report_error(error_message)
             EL.logger.error(error_message, exc_info=True)
 
+        finally:
+            # Release the request threads, pooled keep-alive connections and save cached metadata
+            AR.shutdown_executor()
+            # Keep-alive reuse per service, the log file only records errors so this is printed
+            for service, stats in HS.get_connection_stats().items():
+                if stats['requests']:
+                    print(f"{service.upper()} Connections: {stats['requests']} requests, {stats['connections_opened']} opened, {stats['connections_reused']} reused")
+            HS.close_sessions()
+            journal.close()
+            if local_store:
+                local_store.close()
+            try:
+                MC.cache.flush()
+            except Exception:
+                EL.logger.error("Failed to save metadata cache.", exc_info=True)
+            if args.record or args.replay:
+                from TMDBTraktSyncer import httpCassette as HC
+                HC.stop()
+
+            # Report the version check started at startup, waiting briefly if it is still running
+            CV.print_version_notice()
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
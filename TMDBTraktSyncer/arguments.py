@@ -111,8 +111,8 @@ def clear_cache(main_directory):
                 print(f"Skipping {file_path} (credentials.txt)")
                 continue  # Skip this file
             
-            # Remove .txt files (except credentials.txt)
-            elif file.endswith(".txt"):
+            # Remove .txt files (except credentials.txt) and the local state store
+            elif file.endswith(".txt") or file.startswith("state.db"):
                 try_remove(file_path)
         
         # Delete directories after files
@@ -152,8 +152,8 @@ def uninstall(main_directory):
                 print(f"Skipping {file_path} (credentials.txt)")
                 continue  # Skip this file
             
-            # Remove .txt files (except credentials.txt)
-            elif file.endswith(".txt"):
+            # Remove .txt files (except credentials.txt) and the local state store
+            elif file.endswith(".txt") or file.startswith("state.db"):
                 try_remove(file_path)
         
         # Delete directories after files
@@ -192,8 +192,8 @@ def clean_uninstall(main_directory):
         for file in files:
             file_path = os.path.join(root, file)
             
-            # Remove .txt files (except credentials.txt)
-            if file.endswith(".txt"):
+            # Remove .txt files and the local state store
+            if file.endswith(".txt") or file.startswith("state.db"):
                 try_remove(file_path)
         
         # Delete directories after files
@@ -216,4 +216,23 @@ def clean_uninstall(main_directory):
     print("Clean uninstall complete.")
 
 def print_directory(main_directory):
-    print(f"Install Directory: {main_directory}")
\ No newline at end of file
+    print(f"Install Directory: {main_directory}")
+
+def show_log(main_directory, limit=20):
+    """
+    Prints the newest log entries, newest first.
+
+    :param main_directory: Directory path containing log.txt.
+    :param limit: Number of entries to print.
+    """
+    from TMDBTraktSyncer import errorLogger as EL
+
+    entries = EL.read_log_entries(os.path.join(main_directory, "log.txt"), limit)
+    if not entries:
+        print("No log entries.")
+        return
+
+    for entry in entries:
+        print(EL.ENTRY_SEPARATOR)
+        print(entry)
+    print(EL.ENTRY_SEPARATOR)
\ No newline at end of file
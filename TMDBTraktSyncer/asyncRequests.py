@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from TMDBTraktSyncer import errorHandling as EH
+
+# Threads used to send requests on the pooled sessions while the event loop keeps running
+REQUEST_THREADS = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=REQUEST_THREADS, thread_name_prefix='request')
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+async def run_request_steps_async(steps):
+    """
+    Drive a request generator (trakt_request_steps or tmdb_request_steps) on the event loop.
+
+    Rate limit waits and retry delays are awaited with asyncio.sleep and the HTTP call itself
+    runs on a worker thread, so retry, status code and logging behaviour is exactly the same
+    as the synchronous make_trakt_request / make_tmdb_request.
+
+    :return: The generator's return value, the response or None.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        action, value = next(steps)
+        while True:
+            try:
+                if action == 'send':
+                    result = await loop.run_in_executor(get_executor(), value)
+                elif action == 'acquire':
+                    result = await value.acquire_async(EH.get_deadline())
+                else:
+                    await asyncio.sleep(value)
+                    result = None
+            except asyncio.CancelledError:
+                steps.close()
+                raise
+            except Exception as e:
+                # Let the retry loop handle errors raised by the request
+                action, value = steps.throw(e)
+                continue
+            action, value = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+async def make_trakt_request_async(url, headers=None, params=None, payload=None, max_retries=5):
+    """
+    Asyncio version of errorHandling.make_trakt_request.
+    """
+    return await run_request_steps_async(EH.trakt_request_steps(url, headers, params, payload, max_retries))
+
+async def make_tmdb_request_async(url, headers=None, payload=None, max_retries=5):
+    """
+    Asyncio version of errorHandling.make_tmdb_request.
+    """
+    return await run_request_steps_async(EH.tmdb_request_steps(url, headers, payload, max_retries))
+
+async def gather_or_cancel(*coroutines):
+    """
+    Run coroutines concurrently and return their results in order.
+
+    Unlike asyncio.gather, the first failure cancels the coroutines that are still running
+    and waits for them to finish before the exception is raised, so no request is left
+    running in the background of a failed sync.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
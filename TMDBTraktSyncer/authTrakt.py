@@ -1,8 +1,5 @@
-import sys
 import datetime
 from datetime import timedelta, timezone
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from TMDBTraktSyncer import errorHandling as EH
 from TMDBTraktSyncer import errorLogger as EL
 
@@ -0,0 +1,393 @@
+import sys
+import time
+import random
+import subprocess
+import argparse
+import tracemalloc
+from datetime import datetime
+from TMDBTraktSyncer import traktData
+from TMDBTraktSyncer import mediaItem as MI
+from TMDBTraktSyncer import syncPlanner as SP
+from TMDBTraktSyncer import timestamps as TS
+
+def synthetic_play_history(plays, episodes_per_show=100, movie_share=0.1, page_size=100, seed=0):
+    """
+    Generate pages shaped like the Trakt /history?extended=full endpoint.
+
+    :param plays: Total number of plays.
+    :param episodes_per_show: Number of aired episodes per show (10 seasons of equal size).
+    :param movie_share: Fraction of plays that are movies.
+    :param page_size: Number of plays per page.
+    :return: List of pages, each a list of play dicts.
+    """
+    rng = random.Random(seed)
+    movie_plays = int(plays * movie_share)
+    episode_plays = plays - movie_plays
+    show_count = max(1, episode_plays // episodes_per_show)
+    season_size = max(1, episodes_per_show // 10)
+
+    history = []
+    # Plays per show, episodes are watched in order and rewatched after the last one
+    show_plays = {}
+    for i in range(movie_plays):
+        movie_id = rng.randint(1, max(1, movie_plays))
+        history.append({
+            'type': 'movie',
+            'watched_at': '2024-01-01T00:00:00.000Z',
+            'movie': {'title': f'Movie {movie_id}', 'year': 2000, 'ids': {'trakt': movie_id, 'tmdb': movie_id}}
+        })
+    for i in range(episode_plays):
+        show_id = rng.randint(1, show_count)
+        index = show_plays.get(show_id, 0) % episodes_per_show
+        show_plays[show_id] = show_plays.get(show_id, 0) + 1
+        season, number = index // season_size + 1, index % season_size + 1
+        history.append({
+            'type': 'episode',
+            'watched_at': '2024-01-01T00:00:00.000Z',
+            'show': {'title': f'Show {show_id}', 'year': 2000, 'status': 'ended' if show_id % 2 else 'returning series', 'aired_episodes': episodes_per_show, 'ids': {'trakt': 10000000 + show_id, 'tmdb': show_id}},
+            'episode': {'season': season, 'number': number, 'title': f'Episode {number}', 'first_aired': '2000-01-01T00:00:00.000Z', 'ids': {'trakt': 20000000 + show_id * 1000 + index, 'tmdb': 20000000 + show_id * 1000 + index}}
+        })
+    rng.shuffle(history)
+    return [history[i:i + page_size] for i in range(0, len(history), page_size)]
+
+def legacy_completion_filter(watched_shows, watched_episodes):
+    """
+    The previous O(shows x episodes) show completion filter, kept as a reference for bench_history.
+    """
+    filtered_watched_shows = []
+    for show in watched_shows:
+        episode_numbers = [episode.episode for episode in watched_episodes if episode.type == 'episode' and episode.trakt_show_id == show['TraktID']]
+        if traktData.is_show_completed(show['ShowStatus'], show['AiredEpisodes'], len(episode_numbers)):
+            filtered_watched_shows.append(show)
+    return filtered_watched_shows
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def fold_play_history(pages):
+    """
+    Fold /history pages into a traktData.WatchedIndex and return the watched [type, tmdb_id] pairs.
+    """
+    index = traktData.WatchedIndex()
+    for page in pages:
+        index.add_history_page(page)
+    return index.watched_ids()
+
+def _episode_items(pages):
+    # Unique watched episodes as MediaItems, the input of the legacy filter
+    episodes = {}
+    for page in pages:
+        for item in page:
+            if item['type'] == 'episode':
+                episode = item['episode']
+                episodes.setdefault(episode['ids']['trakt'], MI.MediaItem(MI.EPISODE, tmdb_id=episode['ids']['tmdb'], trakt_show_id=item['show']['ids']['trakt'], season=episode['season'], episode=episode['number']))
+    return list(episodes.values())
+
+def bench_history(sizes=(10000, 25000, 50000, 100000), legacy=True):
+    """
+    Time folding synthetic histories of increasing size into a traktData.WatchedIndex.
+
+    With legacy=True the previous quadratic completion filter is also timed on the same
+    plays, which shows how the two scale with the number of plays.
+    """
+    print(f"{'plays':>8} {'shows':>6} {'parse (s)':>10} {'legacy filter (s)':>18}")
+    for size in sizes:
+        pages = synthetic_play_history(size)
+        watched, parse_time = _timed(fold_play_history, pages)
+
+        legacy_time = ''
+        if legacy:
+            # The legacy filter ran over every show with at least one play
+            shows = {}
+            for page in pages:
+                for item in page:
+                    if item['type'] == 'episode':
+                        show = item['show']
+                        shows.setdefault(show['ids']['trakt'], {'TraktID': show['ids']['trakt'], 'ShowStatus': show['status'], 'AiredEpisodes': show['aired_episodes']})
+            _, elapsed = _timed(legacy_completion_filter, list(shows.values()), _episode_items(pages))
+            legacy_time = f'{elapsed:.3f}'
+
+        show_count = sum(1 for item_type, _ in watched if item_type == 'show')
+        print(f'{size:>8} {show_count:>6} {parse_time:>10.3f} {legacy_time:>18}')
+
+def synthetic_library(size, seed=0):
+    """
+    Generate a library of rated movies, shows and episodes as MediaItems.
+    """
+    rng = random.Random(seed)
+    items = []
+    for i in range(size):
+        item_type = (MI.MOVIE, MI.SHOW, MI.EPISODE)[i % 3]
+        item = MI.MediaItem(item_type, tmdb_id=i + 1, trakt_id=i + 1, title=f'Title {i}', year=rng.randint(1950, 2024), rating=rng.randint(1, 10), date_added=rng.randint(1262304000, 1735689600))
+        if item_type is MI.EPISODE:
+            item.show_tmdb_id = rng.randint(1, size)
+            item.season = rng.randint(1, 10)
+            item.episode = rng.randint(1, 24)
+        items.append(item)
+    return items
+
+def _traced_size(build):
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+def bench_memory(size=100000):
+    """
+    Compare the memory used by a library held as dicts (the previous item format) and as MediaItems.
+    """
+    library = synthetic_library(size)
+    # Both representations are built from the same already allocated values (titles, dates)
+    dicts, dict_size = _traced_size(lambda: [item.to_dict() for item in library])
+    items, item_size = _traced_size(lambda: [MI.MediaItem.from_dict(data) for data in dicts])
+
+    print(f'{size} items')
+    print(f"{'dicts':>12}: {dict_size / 1e6:8.1f} MB ({dict_size / size:.0f} bytes/item)")
+    print(f"{'MediaItems':>12}: {item_size / 1e6:8.1f} MB ({item_size / size:.0f} bytes/item)")
+
+    # Attribute vs string key lookup cost
+    start = time.perf_counter()
+    sum(1 for item in dicts if item['TMDB_ID'] and item['Type'] == 'movie')
+    dict_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sum(1 for item in items if item.tmdb_id and item.type is MI.MOVIE)
+    item_time = time.perf_counter() - start
+    print(f"{'lookup':>12}: dicts {dict_time * 1000:.1f} ms, MediaItems {item_time * 1000:.1f} ms")
+
+def bench_plan(sizes=(10000, 100000, 1000000)):
+    """
+    Time syncPlanner.plan_sync on libraries of increasing size, half of each list shared by both sides.
+    """
+    print(f"{'items':>9} {'plan (s)':>9} {'ops':>9}")
+    for size in sizes:
+        library = synthetic_library(size)
+        quarter = size // 4
+        trakt_items, tmdb_items = library[:3 * quarter], library[quarter:]
+        watched = [[item.type, item.tmdb_id] for item in library[::10]]
+        plan, elapsed = _timed(SP.plan_sync, trakt_items, trakt_items, watched, tmdb_items, tmdb_items, True)
+        print(f'{size:>9} {elapsed:>9.3f} {plan.total:>9}')
+
+def synthetic_timestamps(count, seed=0):
+    """
+    Generate Trakt style timestamps ("2024-01-02T03:04:05.000Z") between 2010 and 2025.
+    """
+    rng = random.Random(seed)
+    timestamps = []
+    for _ in range(count):
+        value = datetime.utcfromtimestamp(rng.randint(1262304000, 1735689600))
+        timestamps.append(value.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+    return timestamps
+
+def bench_timestamps(count=1000000):
+    """
+    Compare strptime with timestamps.parse_iso8601, and sorting with a parsing sort key with
+    sorting pre-parsed epoch ints.
+    """
+    values = synthetic_timestamps(count)
+    print(f'{count} timestamps')
+
+    _, strptime_time = _timed(lambda: [datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ") for value in values])
+    epochs, parse_time = _timed(lambda: [TS.parse_iso8601(value) for value in values])
+    print(f"{'strptime':>20}: {strptime_time:6.2f} s")
+    print(f"{'parse_iso8601':>20}: {parse_time:6.2f} s")
+
+    _, old_sort_time = _timed(lambda: sorted(values, key=lambda value: datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")))
+    _, new_sort_time = _timed(sorted, epochs)
+    print(f"{'sort, strptime key':>20}: {old_sort_time:6.2f} s")
+    print(f"{'sort, epoch ints':>20}: {new_sort_time:6.2f} s")
+
+# Import time budget of the CLI paths that don't sync, in milliseconds
+STARTUP_BUDGET_MS = 150
+# Modules only a sync needs, none of them may be imported by those paths
+STARTUP_HEAVY_MODULES = ('requests', 'urllib3', 'asyncio', 'sqlite3', 'concurrent.futures')
+STARTUP_COMMANDS = (['--help'], ['--directory'], ['--show-log', '0'])
+
+def import_times(arguments):
+    """
+    Run the CLI with -X importtime and return {module: cumulative microseconds} of the top level imports.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'TMDBTraktSyncer.TMDBTraktSyncer'] + list(arguments),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2][1:].rstrip()
+        # Nested imports are indented and already counted in their parent's cumulative time
+        if name == name.lstrip():
+            times[name] = int(fields[1])
+        else:
+            times.setdefault(name.strip(), 0)
+    return times
+
+def bench_startup(budget_ms=STARTUP_BUDGET_MS, runs=5):
+    """
+    Measure the import time of the CLI fast paths and check it against budget_ms.
+
+    The best of several runs is used to keep the check stable on a busy machine.
+
+    :return: True if every path is within budget and imports none of STARTUP_HEAVY_MODULES.
+    """
+    passed = True
+    print(f"{'command':>16} {'imports (ms)':>13} {'budget (ms)':>12}  heavy modules")
+    for arguments in STARTUP_COMMANDS:
+        best, heavy = None, []
+        for _ in range(runs):
+            times = import_times(arguments)
+            total = sum(times.values()) / 1000
+            best = total if best is None else min(best, total)
+            heavy = [module for module in STARTUP_HEAVY_MODULES if module in times]
+        ok = best <= budget_ms and not heavy
+        passed = passed and ok
+        print(f"{' '.join(arguments):>16} {best:>13.1f} {budget_ms:>12}  {', '.join(heavy) or '-'}{'' if ok else '  FAIL'}")
+    return passed
+
+# Scenarios run by bench_sync, in order, each against the state left by the previous one
+SYNC_SCENARIOS = ('full', 'no-change', 'catch-up')
+
+def _stub_request(base_url, path, payload=None):
+    import json
+    import urllib.request
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(base_url + path, data=data, headers={'Content-Type': 'application/json'}, method='POST' if data is not None else 'GET')
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read() or b'{}')
+
+def bench_sync(size=1000, latency=0.0, rate_limit=0, fault_rate=0.0, catch_up_items=None, real_limits=False, seed=0):
+    """
+    Run full syncs end to end against the local stub server and report throughput.
+
+    The stub server runs in its own process with a generated library of size items. Three
+    syncs are run one after the other with every sync option enabled:
+
+    - full: the first sync of a library, every difference between the services is written
+    - no-change: a sync right after it, nothing left to write
+    - catch-up: a sync after catch_up_items new items were added on both sides
+
+    Credentials, caches, the delta snapshot, the journal and the log all live in a temporary
+    directory, so the bench never touches the real settings or accounts.
+
+    :param rate_limit: Requests per second the stub allows per service, 0 for no limit.
+    :param real_limits: Keep the client's production rate limits instead of matching the stub's.
+    """
+    import io
+    import os
+    import tempfile
+    import contextlib
+    from TMDBTraktSyncer import TMDBTraktSyncer as M
+    from TMDBTraktSyncer import httpSession as HS
+    from TMDBTraktSyncer import rateLimiter as RL
+    from TMDBTraktSyncer import errorLogger as EL
+    from TMDBTraktSyncer import asyncRequests as AR
+    from TMDBTraktSyncer import verifyCredentials as VC
+    from TMDBTraktSyncer import metadataCache as MC
+    from TMDBTraktSyncer import deltaSync as DS
+    from TMDBTraktSyncer import writeJournal as WJ
+
+    if catch_up_items is None:
+        catch_up_items = max(1, size // 100)
+
+    server = subprocess.Popen([sys.executable, '-m', 'TMDBTraktSyncer.stubServer', '--size', str(size), '--latency', str(latency),
+                               '--rate-limit', str(rate_limit), '--fault-rate', str(fault_rate), '--seed', str(seed)],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        # "Listening on http://127.0.0.1:PORT"
+        base_url = server.stdout.readline().split()[-1]
+        with tempfile.TemporaryDirectory() as directory:
+            HS.set_base_url(HS.TRAKT, base_url + '/trakt')
+            HS.set_base_url(HS.TMDB, base_url + '/tmdb')
+            if not real_limits:
+                # Match the stub's limit, or get out of the way of an unlimited stub
+                rate = rate_limit or 1000000
+                for name in (RL.TRAKT_GET, RL.TRAKT_POST, RL.TMDB):
+                    RL.configure_bucket(name, rate, rate)
+            # No expiry date, so the first request refreshes the token through /oauth/token
+            VC.store = VC.CredentialsStore(os.path.join(directory, 'credentials.txt'))
+            VC.store.replace({'trakt_client_id': 'stub', 'trakt_client_secret': 'stub', 'trakt_access_token': 'stub',
+                              'trakt_refresh_token': 'stub', 'tmdb_access_token': 'stub', 'trakt_token_expires': 'empty'})
+            MC.cache = MC.MetadataCache(os.path.join(directory, 'metadata.json'))
+            DS.snapshot_path = os.path.join(directory, 'trakt_snapshot.json')
+            EL.setup_logging(os.path.join(directory, 'log.txt'))
+            sync_options = {'ratings': True, 'watchlist': True, 'remove_watched': True}
+
+            print(f"{size} items, latency {latency:g}s, rate limit {rate_limit or '-'}/s, fault rate {fault_rate:g}")
+            print(f"{'scenario':>10} {'wall (s)':>9} {'planned':>8} {'trakt':>7} {'tmdb':>7} {'req/s':>8} {'429':>6} {'5xx':>6}")
+            for scenario in SYNC_SCENARIOS:
+                if scenario == 'catch-up':
+                    _stub_request(base_url, '/_stub/add_items', {'count': catch_up_items})
+                _stub_request(base_url, '/_stub/reset', {})
+                journal = WJ.WriteJournal(os.path.join(directory, 'write_journal.jsonl'))
+                start = time.perf_counter()
+                # The sync's progress output would drown the results
+                with contextlib.redirect_stdout(io.StringIO()):
+                    plan = M.compute_plan(True, True, True)
+                    journal.start(plan, sync_options)
+                    M.apply_plan(plan, sync_options, journal)
+                    journal.finish()
+                elapsed = time.perf_counter() - start
+                stats = _stub_request(base_url, '/_stub/stats')
+                trakt = sum(count for key, count in stats['requests'].items() if key.startswith('trakt '))
+                tmdb = sum(count for key, count in stats['requests'].items() if key.startswith('tmdb '))
+                throttled = stats['statuses'].get('429', 0)
+                faults = sum(count for status, count in stats['statuses'].items() if status.startswith('5'))
+                print(f"{scenario:>10} {elapsed:>9.2f} {plan.total:>8} {trakt:>7} {tmdb:>7} {(trakt + tmdb) / elapsed:>8.1f} {throttled:>6} {faults:>6}")
+    finally:
+        HS.close_sessions()
+        AR.shutdown_executor()
+        HS.set_base_url(HS.TRAKT, None)
+        HS.set_base_url(HS.TMDB, None)
+        EL.stop_logging()
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="TMDBTraktSyncer benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    history_parser = subparsers.add_parser("history", help="Watch history parsing and show completion filter scaling.")
+    history_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 25000, 50000, 100000], metavar="N", help="Number of plays per run.")
+    history_parser.add_argument("--skip-legacy", action="store_true", help="Do not time the previous quadratic filter.")
+    memory_parser = subparsers.add_parser("memory", help="Memory used by a library of dicts versus MediaItems.")
+    memory_parser.add_argument("--size", type=int, default=100000, metavar="N", help="Number of items in the library.")
+    plan_parser = subparsers.add_parser("plan", help="Sync planner scaling.")
+    plan_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], metavar="N", help="Number of items per run.")
+    timestamps_parser = subparsers.add_parser("timestamps", help="Timestamp parsing and sorting.")
+    timestamps_parser.add_argument("--count", type=int, default=1000000, metavar="N", help="Number of timestamps.")
+    startup_parser = subparsers.add_parser("startup", help="Import time of the CLI paths that don't sync, fails over budget.")
+    startup_parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, metavar="MS", help="Import time budget per command in milliseconds.")
+    startup_parser.add_argument("--runs", type=int, default=5, metavar="N", help="Runs per command, the fastest counts.")
+    sync_parser = subparsers.add_parser("sync", help="Full, no-change and catch-up syncs against the local stub server.")
+    sync_parser.add_argument("--size", type=int, default=1000, metavar="N", help="Number of items in the generated library.")
+    sync_parser.add_argument("--latency", type=float, default=0.0, metavar="SECONDS", help="Delay the stub adds to every request.")
+    sync_parser.add_argument("--rate-limit", type=float, default=0, metavar="N", help="Requests per second per service the stub allows, 0 for no limit.")
+    sync_parser.add_argument("--fault-rate", type=float, default=0.0, metavar="SHARE", help="Share of requests the stub answers with a 5xx error.")
+    sync_parser.add_argument("--catch-up", type=int, default=None, metavar="N", help="Items added before the catch-up sync (default: 1%% of the size).")
+    sync_parser.add_argument("--real-limits", action="store_true", help="Keep the client's production rate limits.")
+    args = parser.parse_args()
+
+    if args.benchmark == "history":
+        bench_history(args.sizes, legacy=not args.skip_legacy)
+    elif args.benchmark == "memory":
+        bench_memory(args.size)
+    elif args.benchmark == "plan":
+        bench_plan(args.sizes)
+    elif args.benchmark == "timestamps":
+        bench_timestamps(args.count)
+    elif args.benchmark == "startup":
+        if not bench_startup(args.budget, args.runs):
+            sys.exit(1)
+    elif args.benchmark == "sync":
+        bench_sync(args.size, args.latency, args.rate_limit, args.fault_rate, args.catch_up, args.real_limits)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
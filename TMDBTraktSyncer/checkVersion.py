@@ -1,42 +1,77 @@
+import os
+import json
+import time
+import threading
 import xml.etree.ElementTree as ET
 import urllib.request
-import subprocess
-import sys
+from TMDBTraktSyncer import metadataCache as MC
+
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:  # Python 3.7
+    try:
+        import importlib_metadata
+    except ImportError:
+        importlib_metadata = None
+
+# The latest release is looked up at most once a day
+VERSION_CACHE_TTL = 24 * 60 * 60
+# Seconds allowed for the PyPI request, the sync never waits for it
+VERSION_CHECK_TIMEOUT = 5
+# Seconds the end of the run waits for a check that is still running, a slower check is reported by a later run
+VERSION_NOTICE_WAIT = 2
+
+version_cache_path = os.path.join(MC.cache_directory, 'version_check.json')
+
+_check_thread = None
+_latest_version = None
+_check_error = None
 
 def get_installed_version():
     """
-    Retrieve the installed version of the 'tmdbtraktsyncer' package.
+    Retrieve the installed version of the 'tmdbtraktsyncer' package from its metadata.
     """
+    if importlib_metadata is None:
+        return None
     try:
-        result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'show', 'TMDBTraktSyncer'],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        for line in result.stdout.splitlines():
-            if line.startswith("Version:"):
-                return line.split()[1]
-    except subprocess.CalledProcessError as e:
-        print(f"Error: Could not retrieve TMDBTraktSyncer version using '{sys.executable} -m pip': {e}")
-    except FileNotFoundError:
-        print(f"Error: Python executable '{sys.executable}' does not have pip installed.")
-
-    # If all attempts fail
+        return importlib_metadata.version('TMDBTraktSyncer')
+    except importlib_metadata.PackageNotFoundError:
+        return None
+
+def _query_latest_version(timeout):
+    with urllib.request.urlopen("https://pypi.org/rss/project/tmdbtraktsyncer/releases.xml", timeout=timeout) as response:
+        xml_data = response.read()
+    root = ET.fromstring(xml_data)
+    for item in root.findall('./channel/item'):
+        title = item.find('title').text
+        if title:
+            return title
+    return None
+
+def _read_cached_latest_version():
+    try:
+        with open(version_cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if time.time() - cached['checked_at'] < VERSION_CACHE_TTL:
+            return cached['latest_version']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
     return None
 
-def get_latest_version():
+def _fetch_latest_version():
+    global _latest_version, _check_error
     try:
-        with urllib.request.urlopen("https://pypi.org/rss/project/tmdbtraktsyncer/releases.xml") as response:
-            xml_data = response.read()
-        root = ET.fromstring(xml_data)
-        for item in root.findall('./channel/item'):
-            title = item.find('title').text
-            if title:
-                return title
+        latest_version = _query_latest_version(VERSION_CHECK_TIMEOUT)
     except Exception as e:
-        print(f"Error retrieving latest version: {e}")
-        return None
+        # Reported by print_version_notice so it doesn't interrupt the sync output
+        _check_error = e
+        return
+    if latest_version:
+        try:
+            MC.write_json_atomic(version_cache_path, {'checked_at': time.time(), 'latest_version': latest_version})
+        except OSError:
+            pass
+    _latest_version = latest_version
 
 def compare_versions(installed, latest):
     def parse_version(v):
@@ -45,17 +80,47 @@ def compare_versions(installed, latest):
     return parse_version(installed) < parse_version(latest)
 
 def checkVersion():
+    """
+    Start the version check without blocking.
+
+    A result cached within the last day is used directly, otherwise PyPI is queried on a
+    background thread. Call print_version_notice() later to report the outcome. Nothing is
+    checked when the installed version is unknown, e.g. in a source checkout.
+    """
+    global _check_thread, _latest_version, _check_error
+    _check_thread = None
+    _check_error = None
+    _latest_version = None
+    if not get_installed_version():
+        return
+    _latest_version = _read_cached_latest_version()
+    if _latest_version is None:
+        _check_thread = threading.Thread(target=_fetch_latest_version, name='version-check', daemon=True)
+        _check_thread.start()
+
+def print_version_notice(timeout=VERSION_NOTICE_WAIT):
+    """
+    Print a notice if a newer release is available, nothing if the installed version is unknown.
+
+    :param timeout: Seconds to wait for a background check that is still running.
+    """
     installed_version = get_installed_version()
     if not installed_version:
-        print("TMDBTraktSyncer is not installed.")
         return
 
-    latest_version = get_latest_version()
+    if _check_thread is not None:
+        _check_thread.join(timeout)
+    if _check_error is not None:
+        print(f"Error retrieving latest version: {_check_error}")
+    latest_version = _latest_version
     if not latest_version:
-        print("Could not retrieve the latest version.")
         return
 
-    if compare_versions(installed_version, latest_version):
+    try:
+        newer = compare_versions(installed_version, latest_version)
+    except ValueError:
+        return
+    if newer:
         print(f"A new version of TMDBTraktSyncer is available: {latest_version} (installed: {installed_version}).")
         print("To update use: python -m pip install TMDBTraktSyncer --upgrade")
         print("Documentation: https://github.com/RileyXX/TMDB-Trakt-Syncer/releases")
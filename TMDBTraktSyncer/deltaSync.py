@@ -0,0 +1,117 @@
+import os
+import json
+import time
+from TMDBTraktSyncer import errorLogger as EL
+from TMDBTraktSyncer import metadataCache as MC
+from TMDBTraktSyncer import mediaItem as MI
+
+# Fields of /sync/last_activities that change when each category of data changes
+ACTIVITY_FIELDS = {
+    'watchlist': [('movies', 'watchlisted_at'), ('shows', 'watchlisted_at'), ('seasons', 'watchlisted_at'), ('episodes', 'watchlisted_at')],
+    'ratings': [('movies', 'rated_at'), ('shows', 'rated_at'), ('seasons', 'rated_at'), ('episodes', 'rated_at')],
+    'history': [('movies', 'watched_at'), ('episodes', 'watched_at')]
+}
+
+# Watch history also depends on show status and aired episode counts, which change
+# without any user activity, so its snapshot is refreshed at least once a day.
+MAX_SNAPSHOT_AGE = {
+    'history': 24 * 60 * 60
+}
+
+# Bumped when the stored item format changes, older snapshots are ignored
+SNAPSHOT_VERSION = 3
+
+snapshot_path = os.path.join(MC.cache_directory, 'trakt_snapshot.json')
+
+def activity_signature(last_activities, category):
+    """
+    Return the list of last_activities timestamps relevant to a category.
+    """
+    signature = []
+    for section, field in ACTIVITY_FIELDS[category]:
+        signature.append((last_activities.get(section) or {}).get(field))
+    return signature
+
+def _dump_items(items):
+    # MediaItems are stored as dicts, other items (e.g. [type, tmdb_id] pairs) as they are
+    return [item.to_dict() if isinstance(item, MI.MediaItem) else item for item in items]
+
+def _load_items(items):
+    return [MI.MediaItem.from_dict(item) if isinstance(item, dict) else item for item in items]
+
+class DeltaState:
+    """
+    Decides which Trakt categories need to be fetched again.
+
+    The snapshot saved by the previous run holds the fetched items of each category with
+    the last_activities timestamps they were fetched at. A category whose timestamps are
+    unchanged is served from the snapshot instead of the API.
+    """
+    def __init__(self, username, last_activities, file_path=None):
+        self.username = username
+        self.last_activities = last_activities
+        self.file_path = file_path or snapshot_path
+        self.snapshot = self._load()
+        self.changed = False
+
+    def _load(self):
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            EL.logger.error("Could not read Trakt snapshot, doing a full sync.", exc_info=True)
+            return {}
+        if not isinstance(snapshot, dict) or snapshot.get('username') != self.username or snapshot.get('version') != SNAPSHOT_VERSION:
+            return {}
+        return snapshot.get('categories', {})
+
+    def is_unchanged(self, category):
+        if self.last_activities is None:
+            return False
+        entry = self.snapshot.get(category)
+        if not entry:
+            return False
+        max_age = MAX_SNAPSHOT_AGE.get(category)
+        if max_age is not None and time.time() - entry.get('saved_at', 0) > max_age:
+            return False
+        return entry.get('signature') == activity_signature(self.last_activities, category)
+
+    def fetch(self, category, fetch_function, *args):
+        """
+        Return the items of a category, from the snapshot if nothing changed or from fetch_function(*args).
+        """
+        if self.is_unchanged(category):
+            return _load_items(self.snapshot[category]['items'])
+        return self._store(category, fetch_function(*args))
+
+    async def fetch_async(self, category, fetch_function, *args):
+        """
+        Asyncio version of fetch, fetch_function is a coroutine function.
+        """
+        if self.is_unchanged(category):
+            return _load_items(self.snapshot[category]['items'])
+        return self._store(category, await fetch_function(*args))
+
+    def _store(self, category, items):
+        if self.last_activities is not None:
+            self.snapshot[category] = {
+                'signature': activity_signature(self.last_activities, category),
+                'saved_at': time.time(),
+                'items': _dump_items(items)
+            }
+            self.changed = True
+        return items
+
+    def save(self):
+        """
+        Persist the snapshot if any category was refetched.
+        """
+        if not self.changed:
+            return
+        try:
+            MC.write_json_atomic(self.file_path, {'version': SNAPSHOT_VERSION, 'username': self.username, 'categories': self.snapshot})
+            self.changed = False
+        except Exception:
+            EL.logger.error("Failed to save Trakt snapshot.", exc_info=True)
@@ -2,12 +2,10 @@ import traceback
 import requests
 from requests.exceptions import ConnectionError, RequestException, Timeout, TooManyRedirects, SSLError, ProxyError
 import time
-from datetime import datetime, timedelta
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from TMDBTraktSyncer import verifyCredentials as VC
 from TMDBTraktSyncer import errorLogger as EL
+from TMDBTraktSyncer import httpSession as HS
+from TMDBTraktSyncer import rateLimiter as RL
 
 def report_error(error_message):
     github_issue_url = "https://github.com/RileyXX/TMDB-Trakt-Syncer/issues/new?template=bug_report.yml"
@@ -22,41 +20,116 @@ def report_error(error_message):
     print(f"Submit the error here: {github_issue_url}")
     print("-" * 50)
 
+# time.monotonic() value the run has to finish by, see set_deadline
+_deadline = None
+
+class DeadlineExceeded(Exception):
+    """
+    The run's time budget ran out before the libraries were read, nothing was changed.
+    """
+
+def set_deadline(deadline):
+    """
+    Make rate limit waits and retry loops give up instead of waiting past deadline (a time.monotonic() value, or None for no limit).
+    """
+    global _deadline
+    _deadline = deadline
+
+def get_deadline():
+    return _deadline
+
+def waits_past_deadline(delay):
+    """
+    Return True if waiting delay seconds would end after the deadline set with set_deadline.
+    """
+    return _deadline is not None and time.monotonic() + delay > _deadline
+
+def _out_of_time(service, url):
+    error_message = f"Giving up on {service} request, the run's time budget is used up."
+    print(f" - {error_message}")
+    EL.logger.error(f"{error_message} URL: {url}")
+    return None
+
+def run_request_steps(steps):
+    """
+    Drive a request generator (trakt_request_steps or tmdb_request_steps) synchronously.
+
+    :return: The generator's return value, the response or None.
+    """
+    try:
+        action, value = next(steps)
+        while True:
+            try:
+                if action == 'send':
+                    result = value()
+                elif action == 'acquire':
+                    result = value.acquire(_deadline)
+                else:
+                    time.sleep(value)
+                    result = None
+            except Exception as e:
+                # Let the retry loop handle errors raised by the request
+                action, value = steps.throw(e)
+                continue
+            action, value = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
 def make_trakt_request(url, headers=None, params=None, payload=None, max_retries=5):
+    """
+    Makes an HTTP request to the Trakt API with retry logic, see trakt_request_steps.
+
+    :return: The API response, or None if all retries fail
+    """
+    return run_request_steps(trakt_request_steps(url, headers, params, payload, max_retries))
+
+def trakt_request_steps(url, headers=None, params=None, payload=None, max_retries=5):
+    """
+    Retry loop of a Trakt API request, written as a generator so the same logic can be driven
+    by make_trakt_request or by the asyncio request core.
+
+    The generator yields ('acquire', bucket), ('send', function) and ('sleep', seconds) steps.
+    The driver performs each step and sends back its result (the response of 'send' steps, the
+    time waited or None past the deadline for 'acquire' steps), or throws the exception raised
+    by the request into the generator. The final response is the generator's return value.
+    """
     # Set default headers if none are provided
     if headers is None:
-        # Get credentials
-        trakt_client_id, _, trakt_access_token, _, _ = VC.prompt_get_credentials()
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'trakt-api-version': '2',
-            'trakt-api-key': trakt_client_id,
-            'Authorization': f'Bearer {trakt_access_token}'
-        }
+        # Use the prebuilt headers from the in-memory credentials store
+        headers = VC.get_trakt_headers()
     
+    url = HS.resolve_url(HS.TRAKT, url)  # Base URL override, if any
     retry_delay = 1  # Initial delay between retries (in seconds)
     retry_attempts = 0  # Count of retry attempts made
     connection_timeout = 20  # Timeout for requests (in seconds)
     total_wait_time = sum(1 * (2 ** i) for i in range(max_retries))  # Total possible wait time
+    session = HS.get_session(HS.TRAKT)  # Shared keep-alive session
+    bucket = RL.trakt_bucket(payload)  # Shared rate limit bucket (GET and POST are limited separately)
 
     # Retry loop to handle network errors or server overload scenarios
     while retry_attempts < max_retries:
         response = None
         try:
+            # Wait for a rate limit token before sending
+            if (yield ('acquire', bucket)) is None:
+                return _out_of_time('Trakt', url)
+
             # Send GET or POST request depending on whether a payload is provided
             if payload is None:
                 if params:
                     # GET request with query parameters
-                    response = requests.get(url, headers=headers, params=params, timeout=connection_timeout)
+                    response = yield ('send', lambda: session.get(url, headers=headers, params=params, timeout=connection_timeout))
                 else:
                     # GET request without query parameters
-                    response = requests.get(url, headers=headers, timeout=connection_timeout)
+                    response = yield ('send', lambda: session.get(url, headers=headers, timeout=connection_timeout))
             else:
                 # POST request with JSON payload
-                response = requests.post(url, headers=headers, json=payload, timeout=connection_timeout)
+                response = yield ('send', lambda: session.post(url, headers=headers, json=payload, timeout=connection_timeout))
             
             if response is not None:
+                # Adapt the limiter to the rate limit reported by Trakt
+                RL.observe_trakt_headers(bucket, response.headers)
+
                 # If request is successful, return the response
                 if response.status_code in [200, 201, 204]:
                     return response
@@ -66,16 +139,22 @@ def make_trakt_request(url, headers=None, params=None, payload=None, max_retries
                     retry_attempts += 1  # Increment retry counter
 
                     # Respect the 'Retry-After' header if provided, otherwise use default delay
-                    retry_after = int(response.headers.get('Retry-After', retry_delay))
+                    retry_after = RL.parse_retry_after(response.headers, retry_delay)
+                    if waits_past_deadline(retry_after):
+                        return _out_of_time('Trakt', url)
                     # Skip logging rate limit errors
                     if response.status_code != 429:
                         remaining_time = sum(1 * (2 ** i) for i in range(retry_attempts, max_retries))
-                        print(f" - Server returned {response.status_code}. Retrying after {retry_after}s... "
+                        print(f" - Server returned {response.status_code}. Retrying after {retry_after:g}s... "
                               f"({retry_attempts}/{max_retries}) - Time remaining: {remaining_time}s")
-                        EL.logger.warning(f"Server returned {response.status_code}. Retrying after {retry_after}s... "
+                        EL.logger.warning(f"Server returned {response.status_code}. Retrying after {retry_after:g}s... "
                                           f"({retry_attempts}/{max_retries}) - Time remaining: {remaining_time}s")
 
-                    time.sleep(retry_after)  # Wait before retrying
+                    if response.status_code == 429:
+                        # Hold back every caller sharing this bucket until the limit resets
+                        bucket.pause(retry_after)
+                    else:
+                        yield ('sleep', retry_after)  # Wait before retrying
                     retry_delay *= 2  # Apply exponential backoff for retries
                 
                 else:
@@ -91,7 +170,9 @@ def make_trakt_request(url, headers=None, params=None, payload=None, max_retries
                 retry_attempts += 1
                 print(f" - No response received. Retrying... ({retry_attempts}/{max_retries})")
                 EL.logger.warning(f"No response received. Retrying... ({retry_attempts}/{max_retries})")
-                time.sleep(retry_delay)
+                if waits_past_deadline(retry_delay):
+                    return _out_of_time('Trakt', url)
+                yield ('sleep', retry_delay)
                 retry_delay *= 2
 
         # Handle Network errors (connection issues, timeouts, SSL, etc.)
@@ -103,7 +184,9 @@ def make_trakt_request(url, headers=None, params=None, payload=None, max_retries
             EL.logger.warning(f"Network error: {network_error}. Retrying ({retry_attempts}/{max_retries})... "
                               f"Time remaining: {remaining_time}s")
             
-            time.sleep(retry_delay)  # Wait before retrying
+            if waits_past_deadline(retry_delay):
+                return _out_of_time('Trakt', url)
+            yield ('sleep', retry_delay)  # Wait before retrying
             retry_delay *= 2  # Apply exponential backoff for retries
 
         # Handle general request-related exceptions (non-retryable)
@@ -157,28 +240,35 @@ def make_tmdb_request(url, headers=None, payload=None, max_retries=5):
     :param max_retries: Maximum number of retry attempts in case of failure
     :return: The API response or None if all retries fail
     """
+    return run_request_steps(tmdb_request_steps(url, headers, payload, max_retries))
     
-    
+def tmdb_request_steps(url, headers=None, payload=None, max_retries=5):
+    """
+    Retry loop of a TMDB API request as a generator of steps, see trakt_request_steps.
+    """
     if headers is None:
-        # Get credentials
-        _, _, _, _, tmdb_access_token = VC.prompt_get_credentials()
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {tmdb_access_token}'  # Assuming VC.tmdb_access_token is valid
-        }
+        # Use the prebuilt headers from the in-memory credentials store
+        headers = VC.get_tmdb_headers()
 
+    url = HS.resolve_url(HS.TMDB, url)  # Base URL override, if any
     retry_delay = 1  # Initial delay between retries in seconds
     retry_attempts = 0
     connection_timeout = 20  # Timeout for each request in seconds
+    session = HS.get_session(HS.TMDB)  # Shared keep-alive session
+    bucket = RL.get_bucket(RL.TMDB)  # Shared rate limit bucket for all TMDB requests
 
     while retry_attempts < max_retries:
         response = None
         try:        
+            # Wait for a rate limit token before sending
+            if (yield ('acquire', bucket)) is None:
+                return _out_of_time('TMDB', url)
+
             # Send GET or POST request based on payload
             if payload is None:
-                response = requests.get(url, headers=headers, timeout=connection_timeout)
+                response = yield ('send', lambda: session.get(url, headers=headers, timeout=connection_timeout))
             else:
-                response = requests.post(url, headers=headers, json=payload, timeout=connection_timeout)
+                response = yield ('send', lambda: session.post(url, headers=headers, json=payload, timeout=connection_timeout))
 
             if response is None:
                 # If the response is None, treat it as retryable
@@ -190,7 +280,9 @@ def make_tmdb_request(url, headers=None, payload=None, max_retries=5):
                 )
                 print(f" - {error_message}")
                 EL.logger.error(error_message)
-                time.sleep(retry_delay)
+                if waits_past_deadline(retry_delay):
+                    return _out_of_time('TMDB', url)
+                yield ('sleep', retry_delay)
                 retry_delay *= 2  # Exponential backoff
                 continue  # Skip the current loop and retry
 
@@ -202,7 +294,14 @@ def make_tmdb_request(url, headers=None, payload=None, max_retries=5):
                 # Retryable errors, such as rate limiting or server issues
                 retry_attempts += 1
                 time_remaining = sum(1 * (2 ** i) for i in range(max_retries - retry_attempts))
-                time.sleep(retry_delay)
+                retry_after = RL.parse_retry_after(response.headers, retry_delay) if status_code == 429 else retry_delay
+                if waits_past_deadline(retry_after):
+                    return _out_of_time('TMDB', url)
+                if status_code == 429:
+                    # Respect 'Retry-After' and hold back every TMDB caller until the limit resets
+                    bucket.pause(retry_after)
+                else:
+                    yield ('sleep', retry_delay)
                 retry_delay *= 2  # Exponential backoff
                 # Skip logging rate limit errors
                 if status_code != 429:
@@ -231,7 +330,9 @@ def make_tmdb_request(url, headers=None, payload=None, max_retries=5):
             )
             print(f" - {error_message}")
             EL.logger.error(error_message, exc_info=True)
-            time.sleep(retry_delay)  # Wait before retrying
+            if waits_past_deadline(retry_delay):
+                return _out_of_time('TMDB', url)
+            yield ('sleep', retry_delay)  # Wait before retrying
             retry_delay *= 2  # Exponential backoff for retries
 
         except RequestException as e:
@@ -310,21 +411,16 @@ def get_tmdb_message(status_code):
 # Function to filter out items that share the same Title, Year, and Type
 # AND have non-matching TMDB_ID values
 def filter_mismatched_items(trakt_list, tmdb_list):
-    # Define the keys to be used for comparison
-    comparison_keys = ['Title', 'Year', 'Type', 'TMDB_ID']
-
     # Group items by (Title, Year, Type)
     trakt_grouped = {}
     for item in trakt_list:
-        if all(key in item for key in comparison_keys):
-            key = (item['Title'], item['Year'], item['Type'])
-            trakt_grouped.setdefault(key, set()).add(item['TMDB_ID'])
+        key = (item.title, item.year, item.type)
+        trakt_grouped.setdefault(key, set()).add(item.tmdb_id)
 
     tmdb_grouped = {}
     for item in tmdb_list:
-        if all(key in item for key in comparison_keys):
-            key = (item['Title'], item['Year'], item['Type'])
-            tmdb_grouped.setdefault(key, set()).add(item['TMDB_ID'])
+        key = (item.title, item.year, item.type)
+        tmdb_grouped.setdefault(key, set()).add(item.tmdb_id)
 
     # Find conflicting items (same Title, Year, Type but different TMDB_IDs)
     conflicting_items = {
@@ -334,47 +430,48 @@ def filter_mismatched_items(trakt_list, tmdb_list):
     
     # Filter out conflicting items from both lists
     filtered_trakt_list = [
-        item for item in trakt_list if (item['Title'], item['Year'], item['Type']) not in conflicting_items
+        item for item in trakt_list if (item.title, item.year, item.type) not in conflicting_items
     ]
     filtered_tmdb_list = [
-        item for item in tmdb_list if (item['Title'], item['Year'], item['Type']) not in conflicting_items
+        item for item in tmdb_list if (item.title, item.year, item.type) not in conflicting_items
     ]
 
     return filtered_trakt_list, filtered_tmdb_list
 '''   
-def filter_items(source_list, target_list, key="TMDB_ID"):
+def filter_items(source_list, target_list, key="tmdb_id"):
     """
     Filters items from the target_list that are not already present in the source_list based on a key.
 
     Args:
-        source_list (list): The list whose elements are used to filter the target_list.
-        target_list (list): The list to be filtered.
-        key (str): The key to identify unique elements. Defaults to "TMDB_ID".
+        source_list (list): The MediaItems used to filter the target_list.
+        target_list (list): The MediaItems to be filtered.
+        key (str): The MediaItem attribute identifying unique elements. Defaults to "tmdb_id".
 
     Returns:
         list: A filtered list containing items from the target_list that are not in the source_list.
     """
-    source_set = {item[key] for item in source_list}
-    return [item for item in target_list if item[key] not in source_set]
+    source_set = {getattr(item, key) for item in source_list}
+    return [item for item in target_list if getattr(item, key) not in source_set]
     
+# Sort key of items without a date (before any epoch timestamp)
+_EARLIEST_DATE = float('-inf')
+
 def sort_by_date_added(items, descending=False):
     """
-    Sorts a list of items by the 'Date_Added' field.
+    Sorts a list of items by their date_added field.
+
+    Dates are parsed to epoch seconds when items are created, so sorting compares plain ints.
+    Items without a date sort first, as the earliest date.
 
     Args:
-        items (list): A list of dictionaries or objects with a 'Date_Added' field.
+        items (list): A list of MediaItems.
         descending (bool): Whether to sort in descending order. Defaults to False (ascending).
 
     Returns:
-        list: A sorted list of items by the 'Date_Added' field.
+        list: A sorted list of items by the date_added field.
     """
-    def parse_date(item):
-        date_str = item.get('Date_Added')  # Safely get the Date_Added field
-        if date_str:
-            try:
-                return datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-            except ValueError:
-                pass  # Invalid date format
-        return datetime.min  # Use the earliest date as a fallback
+    return sorted(items, key=_date_added_key, reverse=descending)
 
-    return sorted(items, key=parse_date, reverse=descending)
\ No newline at end of file
+def _date_added_key(item):
+    date_added = item.date_added
+    return date_added if date_added is not None else _EARLIEST_DATE
\ No newline at end of file
@@ -1,5 +1,8 @@
 import os
+import atexit
+import queue
 import logging
+import logging.handlers
 
 class CustomFormatter(logging.Formatter):
     def formatException(self, exc_info):
@@ -18,38 +21,99 @@ class CustomFormatter(logging.Formatter):
             message = super().format(record)
             return f"{'`' * 100}\n{message}\n{'`' * 100}\n"
 
-class PrependFileHandler(logging.Handler):
-    def __init__(self, filename):
-        super().__init__()
-        self.filename = filename
+# Rotate log.txt once it reaches LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT older files
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
 
-    def emit(self, record):
+ENTRY_SEPARATOR = '`' * 100
+
+def rotated_name(default_name):
+    """
+    Name rotated logs log.1.txt, log.2.txt, ... instead of log.txt.1 so they stay .txt files.
+    """
+    base, _, index = default_name.rpartition('.')
+    root, extension = os.path.splitext(base)
+    return f"{root}.{index}{extension}"
+
+def log_files(file_path):
+    """
+    Return the log file followed by its rotated files, newest first.
+    """
+    return [file_path] + [rotated_name(f"{file_path}.{index}") for index in range(1, LOG_BACKUP_COUNT + 1)]
+
+def read_log_entries(file_path, limit=None):
+    """
+    Read log entries across the log file and its rotated files.
+
+    Records are appended to the end of the file, this returns them newest first.
+
+    :param limit: Maximum number of entries to return, None for all.
+    :return: List of entry strings without the separator lines.
+    """
+    entries = []
+    for path in log_files(file_path):
         try:
-            log_entry = self.format(record) + "\n"
-            if os.path.exists(self.filename):
-                with open(self.filename, "r+", encoding="utf-8") as file:
-                    old_content = file.read()
-                    file.seek(0)
-                    file.write(log_entry + old_content)
-            else:
-                with open(self.filename, "w", encoding="utf-8") as file:
-                    file.write(log_entry)
-        except Exception:
-            print("Error writing log.")
+            with open(path, "r", encoding="utf-8") as file:
+                content = file.read()
+        except FileNotFoundError:
+            continue
+        # Entries are wrapped in separator lines: the message is every second chunk
+        file_entries = [chunk.strip("\n") for chunk in content.split(ENTRY_SEPARATOR)[1::2]]
+        entries.extend(reversed(file_entries))
+        if limit is not None and len(entries) >= limit:
+            break
+    return entries if limit is None else entries[:limit]
 
 # Get the directory of the script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 log_file = os.path.join(script_dir, "log.txt")
 
-# Create a custom file handler for prepending logs
-handler = PrependFileHandler(log_file)
-handler.setLevel(logging.ERROR)
+# The root logger, handlers are attached by setup_logging()
+logger = logging.getLogger("")
 
-# Set the log format
-formatter = CustomFormatter("%(asctime)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
+_listener = None
+_file_handler = None
+_queue_handler = None
 
-# Get the root logger and add the handler
-logger = logging.getLogger("")
-logger.setLevel(logging.ERROR)
-logger.addHandler(handler)
\ No newline at end of file
+def setup_logging(file_path=log_file):
+    """
+    Send ERROR records of every logger to the log file. Safe to call more than once.
+
+    Records are put on a queue by the logging threads and written by a single listener thread
+    with an append-only, size rotated file handler, so request workers never wait on disk I/O.
+    Nothing is set up at import time, so importing this module has no side effects.
+    """
+    global _listener, _file_handler, _queue_handler
+    if _listener is not None:
+        return
+
+    # Opened on the first record
+    _file_handler = logging.handlers.RotatingFileHandler(file_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True)
+    _file_handler.namer = rotated_name
+    _file_handler.setLevel(logging.ERROR)
+    _file_handler.setFormatter(CustomFormatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, _file_handler, respect_handler_level=True)
+    _listener.start()
+
+    logger.setLevel(logging.ERROR)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    logger.addHandler(_queue_handler)
+
+    # Write out queued records on exit
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """
+    Write out the queued records and close the log file. Safe to call more than once.
+    """
+    global _listener, _file_handler, _queue_handler
+    if _listener is None:
+        return
+    logger.removeHandler(_queue_handler)
+    _listener.stop()
+    _file_handler.close()
+    _listener = None
+    _file_handler = None
+    _queue_handler = None
\ No newline at end of file
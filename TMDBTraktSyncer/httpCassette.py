@@ -0,0 +1,339 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import tempfile
+import threading
+import urllib.parse
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from TMDBTraktSyncer import errorLogger as EL
+from TMDBTraktSyncer import httpSession as HS
+
+# Bumped when the cassette format changes, older cassettes are refused
+CASSETTE_VERSION = 1
+
+# Replaces every secret written to a cassette
+REDACTED = 'REDACTED'
+
+# Request headers carrying credentials, never written to a cassette
+SECRET_HEADERS = ('authorization', 'trakt-api-key', 'cookie')
+# Response headers left out of a cassette
+DROPPED_RESPONSE_HEADERS = ('set-cookie', 'content-encoding', 'transfer-encoding', 'content-length', 'connection')
+# JSON fields (request payloads and response bodies) and query parameters holding secrets
+SECRET_FIELDS = ('access_token', 'refresh_token', 'client_id', 'client_secret', 'code', 'api_key', 'request_token', 'session_id')
+
+# Sync settings stored in a cassette, so a replay runs with the options of the recording
+SETTINGS = ('sync_ratings', 'sync_watchlist', 'remove_watched_from_watchlists')
+
+def sanitize(data):
+    """
+    Return a copy of parsed JSON with the value of every field in SECRET_FIELDS redacted.
+    """
+    if isinstance(data, dict):
+        return {key: REDACTED if key in SECRET_FIELDS else sanitize(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [sanitize(value) for value in data]
+    return data
+
+def _sanitize_body(body):
+    if not body:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    try:
+        return json.dumps(sanitize(json.loads(body)), separators=(',', ':'))
+    except ValueError:
+        return body
+
+def request_path(service, url):
+    """
+    Return url relative to the API root of the service, with secret query parameters redacted.
+
+    Cassettes key responses on this path, so a cassette recorded against the real API
+    replays the same against a base URL override and the other way around.
+    """
+    root = HS.resolve_url(service, HS.BASE_URLS[service])
+    if url.startswith(root):
+        url = url[len(root):]
+    else:
+        url = urllib.parse.urlsplit(url)._replace(scheme='', netloc='').geturl()
+    path, _, query = url.partition('?')
+    if not query:
+        return path
+    parameters = [(name, REDACTED if name in SECRET_FIELDS else value) for name, value in urllib.parse.parse_qsl(query, keep_blank_values=True)]
+    return f'{path}?{urllib.parse.urlencode(parameters)}'
+
+class CassetteRecorder:
+    """
+    Writes every request of both services with its response and timing to a gzip compressed
+    cassette of JSON lines.
+
+    The first line is a header with the cassette version and the sync settings of the run,
+    each following line one exchange. Credentials are redacted from headers, payloads, query
+    strings and token responses before anything is written. The library content itself is
+    kept, that is what a replay is for.
+    """
+    def __init__(self, file_path, settings=None):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.count = 0
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(file_path, 'wt', encoding='utf-8')
+        self._write({'version': CASSETTE_VERSION, 'created_at': time.time(), 'settings': settings or {}})
+
+    def record(self, service, request, response, elapsed, started):
+        """
+        Add one exchange to the cassette.
+
+        :param elapsed: Seconds from sending the request to reading the whole response.
+        :param started: time.monotonic() value the request was sent at.
+        """
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in DROPPED_RESPONSE_HEADERS}
+        self._write({
+            'service': service,
+            'method': request.method,
+            'path': request_path(service, request.url),
+            'request_headers': {name: value for name, value in request.headers.items() if name.lower() not in SECRET_HEADERS},
+            'request_body': _sanitize_body(request.body),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': headers,
+            'body': _sanitize_body(response.content),
+            'offset': round(started - self._started, 6),
+            'elapsed': round(elapsed, 6)
+        })
+        with self._lock:
+            self.count += 1
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line)
+            except OSError:
+                EL.logger.error("Failed to write to the cassette.", exc_info=True)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class Cassette:
+    """
+    The exchanges of a recorded cassette, served back in recording order.
+
+    Responses are matched on (service, method, path). Repeated requests to the same path
+    (paginated Trakt sync batches, retries) get the recorded responses in order, and the last
+    one again once they run out.
+
+    The replay starts when the cassette is loaded, at the same point of the run the recording
+    started at, so recorded offsets line up with the replay.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.settings = {}
+        self.created_at = None
+        self._exchanges = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+        self.started = time.monotonic()
+
+    def _load(self):
+        records = []
+        try:
+            with gzip.open(self.file_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    records.append(line)
+        except EOFError:
+            # Cassette of an interrupted recording, the exchanges written until then are used
+            EL.logger.warning(f"Cassette {self.file_path} is truncated, replaying the {max(len(records) - 1, 0)} complete exchanges.")
+        header = json.loads(records[0]) if records else {}
+        if not isinstance(header, dict) or header.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"{self.file_path} is not a cassette of this TMDBTraktSyncer version")
+        self.settings = header.get('settings') or {}
+        self.created_at = header.get('created_at')
+        for line in records[1:]:
+            try:
+                exchange = json.loads(line)
+            except ValueError:
+                # Partial line of an interrupted recording
+                continue
+            key = (exchange['service'], exchange['method'], exchange['path'])
+            self._exchanges.setdefault(key, []).append(exchange)
+
+    def next_exchange(self, service, method, path):
+        """
+        Return the next recorded exchange for a request, or None if none was recorded.
+        """
+        with self._lock:
+            exchanges = self._exchanges.get((service, method, path))
+            if not exchanges:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return exchanges.pop(0) if len(exchanges) > 1 else exchanges[0]
+
+    def answer_at(self, exchange, received):
+        """
+        Return the time.monotonic() value to answer an exchange at with original timing.
+
+        A request sent earlier in the run than it was recorded is held until its recorded
+        offset, so the recorded pacing and gaps are kept, and every response takes at least its
+        recorded response time.
+
+        :param received: time.monotonic() value the request was received at.
+        """
+        return max(received, self.started + exchange['offset']) + exchange['elapsed']
+
+class RecordingHTTPAdapter(BaseAdapter):
+    """
+    Sends requests through the service's normal adapter and records every exchange.
+    """
+    def __init__(self, service, adapter, recorder):
+        super().__init__()
+        self.service = service
+        self.adapter = adapter
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        response = self.adapter.send(request, **kwargs)
+        # Read the body here so the timing covers the whole response, requests keeps it for the caller
+        response.content
+        self.recorder.record(self.service, request, response, time.monotonic() - started, started)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+class ReplayHTTPAdapter(BaseAdapter):
+    """
+    Answers requests from a Cassette without touching the network.
+
+    :param realtime: Answer on the recorded schedule (see Cassette.answer_at), otherwise immediately.
+    """
+    def __init__(self, service, adapter, cassette, realtime=True):
+        super().__init__()
+        self.service = service
+        self.stats = adapter.stats
+        self.cassette = cassette
+        self.realtime = realtime
+
+    def send(self, request, **kwargs):
+        received = time.monotonic()
+        self.stats.request_sent()
+        path = request_path(self.service, request.url)
+        exchange = self.cassette.next_exchange(self.service, request.method, path)
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        if exchange is None:
+            EL.logger.error(f"No recorded response for {self.service} {request.method} {path}")
+            response.status_code = 404
+            response.reason = 'Not Recorded'
+            response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+            response._content = b'{}'
+            return response
+
+        if self.realtime:
+            delay = self.cassette.answer_at(exchange, received) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        response.status_code = exchange['status']
+        response.reason = exchange.get('reason')
+        response.headers = CaseInsensitiveDict(exchange['headers'])
+        response._content = (exchange['body'] or '').encode('utf-8')
+        return response
+
+    def close(self):
+        pass
+
+_recorder = None
+_cassette = None
+_state_directory = None
+
+def _isolate_state():
+    """
+    Move the metadata cache and the Trakt delta snapshot to a temporary directory.
+
+    Recordings then fetch everything, so a cassette holds every request a sync makes, and
+    replays make the same requests whatever the state of the machine they run on.
+    """
+    global _state_directory
+    from TMDBTraktSyncer import metadataCache as MC
+    from TMDBTraktSyncer import deltaSync as DS
+
+    _state_directory = tempfile.mkdtemp(prefix='tmdbtraktsyncer-cassette-')
+    MC.cache = MC.MetadataCache(os.path.join(_state_directory, 'metadata.json'))
+    DS.snapshot_path = os.path.join(_state_directory, 'trakt_snapshot.json')
+    return _state_directory
+
+def start_recording(file_path):
+    """
+    Record the traffic of both services to the cassette at file_path.
+
+    :return: Directory holding the state of this run (see _isolate_state), also used for its write journal.
+    """
+    global _recorder
+    from TMDBTraktSyncer import verifyCredentials as VC
+
+    settings = {key: VC.store.get(key) for key in SETTINGS if VC.store.get(key) is not None}
+    _recorder = CassetteRecorder(file_path, settings)
+    HS.set_adapter_hook(lambda service, adapter: RecordingHTTPAdapter(service, adapter, _recorder))
+    return _isolate_state()
+
+def start_replay(file_path, realtime=True):
+    """
+    Answer the requests of both services from the cassette at file_path, without network access.
+
+    Replays run with placeholder credentials and the sync settings of the recording, in a
+    temporary directory, so the real credentials, caches and journal are never touched.
+
+    :param realtime: Replay the recorded pacing and response times, otherwise replay as fast as possible.
+    :return: Directory holding the state of this run, also used for its write journal.
+    """
+    global _cassette
+    from TMDBTraktSyncer import verifyCredentials as VC
+
+    _cassette = Cassette(file_path)
+    HS.set_adapter_hook(lambda service, adapter: ReplayHTTPAdapter(service, adapter, _cassette, realtime))
+    directory = _isolate_state()
+    VC.store = VC.CredentialsStore(os.path.join(directory, 'credentials.txt'))
+    VC.store.replace(dict({
+        'trakt_client_id': REDACTED,
+        'trakt_client_secret': REDACTED,
+        'trakt_access_token': REDACTED,
+        'trakt_refresh_token': REDACTED,
+        'tmdb_access_token': REDACTED,
+        # Never expires, a replay has no token to refresh
+        'trakt_token_expires': '9999-12-31T00:00:00+00:00'
+    }, **_cassette.settings))
+    return directory
+
+def stop():
+    """
+    Finish a recording or replay, report what it covered and remove its temporary state.
+    """
+    global _recorder, _cassette, _state_directory
+    HS.set_adapter_hook(None)
+    if _recorder is not None:
+        _recorder.close()
+        print(f"Recorded {_recorder.count} requests to {_recorder.file_path}")
+        _recorder = None
+    if _cassette is not None:
+        print(f"Replayed {_cassette.hits} requests from {_cassette.file_path}, {_cassette.misses} had no recorded response")
+        _cassette = None
+    if _state_directory is not None:
+        shutil.rmtree(_state_directory, ignore_errors=True)
+        _state_directory = None
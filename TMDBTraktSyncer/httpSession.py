@@ -0,0 +1,170 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+TRAKT = 'trakt'
+TMDB = 'tmdb'
+
+# API roots the request URLs are written against
+BASE_URLS = {
+    TRAKT: 'https://api.trakt.tv',
+    TMDB: 'https://api.themoviedb.org'
+}
+
+# Environment variables pointing a service at another server, e.g. the local stub server
+BASE_URL_VARIABLES = {
+    TRAKT: 'TMDBTRAKTSYNCER_TRAKT_URL',
+    TMDB: 'TMDBTRAKTSYNCER_TMDB_URL'
+}
+
+_base_urls = {}
+
+def set_base_url(service, base_url):
+    """
+    Send the requests of a service to base_url instead of its API root, or back to it with None.
+    """
+    if base_url:
+        _base_urls[service] = base_url.rstrip('/')
+    else:
+        _base_urls.pop(service, None)
+
+def resolve_url(service, url):
+    """
+    Return url with the API root of the service replaced by the base URL set with
+    set_base_url or its environment variable, if any.
+    """
+    base_url = _base_urls.get(service) or os.environ.get(BASE_URL_VARIABLES[service])
+    root = BASE_URLS[service]
+    if base_url and url.startswith(root):
+        return base_url.rstrip('/') + url[len(root):]
+    return url
+
+# Connection pool sizes per service. Trakt writes are serialized by its POST limit so a
+# small pool is enough there, TMDB gets more room for the concurrent write paths.
+POOL_SIZES = {
+    TRAKT: 8,
+    TMDB: 16
+}
+
+class ConnectionStats:
+    """
+    Thread-safe counters for the requests sent and connections opened by one service session.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def request_sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': max(self.requests - self.connections_opened, 0)
+            }
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records every request sent and every new TCP connection opened,
+    so keep-alive reuse can be measured per service.
+    """
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.connection_opened()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.connection_opened()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.request_sent()
+        return super().send(request, **kwargs)
+
+_sessions = {}
+_stats = {}
+_lock = threading.Lock()
+
+# Function wrapping the adapter of each new session, see set_adapter_hook
+_adapter_hook = None
+
+def set_adapter_hook(hook):
+    """
+    Wrap the transport of every session with hook(service, adapter), or go back to plain adapters with None.
+
+    Used by httpCassette to record or replay the traffic of both services. Open sessions are
+    closed so the next request picks up the new adapter.
+    """
+    global _adapter_hook
+    close_sessions()
+    _adapter_hook = hook
+
+def get_session(service):
+    """
+    Return the shared keep-alive session for a service, creating it on first use.
+
+    The session is only used for sending requests (headers are passed per request), which
+    keeps it safe to share between threads. The underlying urllib3 pools are thread-safe.
+
+    :param service: TRAKT or TMDB.
+    :return: requests.Session for the service.
+    """
+    session = _sessions.get(service)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(service)
+        if session is None:
+            pool_size = POOL_SIZES.get(service, 10)
+            stats = _stats.setdefault(service, ConnectionStats())
+            adapter = CountingHTTPAdapter(stats, pool_connections=2, pool_maxsize=pool_size, pool_block=True)
+            if _adapter_hook is not None:
+                adapter = _adapter_hook(service, adapter)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[service] = session
+    return session
+
+def get_connection_stats():
+    """
+    Return the request and connection counters for every service used so far.
+
+    :return: dict mapping service name to a dict of requests, connections_opened and connections_reused.
+    """
+    with _lock:
+        return {service: stats.as_dict() for service, stats in _stats.items()}
+
+def close_sessions():
+    """
+    Close all service sessions and their pooled connections.
+    """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,143 @@
+import os
+import json
+import sqlite3
+from TMDBTraktSyncer import mediaItem as MI
+
+# Stored next to credentials.txt
+store_path = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'state.db')
+
+# Bumped when the schema changes, a store of an older schema is dropped and filled again by the next fetch
+SCHEMA_VERSION = 2
+
+# An item is stored once per list, the unique key also serves as the index of the diff joins
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    source TEXT NOT NULL,
+    list TEXT NOT NULL,
+    type TEXT NOT NULL,
+    tmdb_id INTEGER,
+    trakt_id INTEGER,
+    data TEXT NOT NULL,
+    UNIQUE (source, list, type, tmdb_id)
+);
+CREATE INDEX IF NOT EXISTS idx_items_type_tmdb_id ON items (type, tmdb_id);
+CREATE INDEX IF NOT EXISTS idx_items_trakt_id ON items (trakt_id);
+'''
+
+class LocalStore:
+    """
+    SQLite copy of the Trakt and TMDB watchlists, ratings and watched items.
+
+    Each list is replaced after a successful fetch and patched after successful writes, and
+    the sync diffs are computed with indexed joins on (type, tmdb_id) instead of rebuilding
+    sets from the item lists in memory. Lists are identified by a source ('trakt' or 'tmdb')
+    and a list name ('watchlist', 'ratings' or 'watched').
+    """
+    def __init__(self, file_path=store_path):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.connection.executescript(f'DROP TABLE IF EXISTS items; PRAGMA user_version = {SCHEMA_VERSION};')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _row(source, list_name, item):
+        return (source, list_name, item.type, item.tmdb_id, item.trakt_id, json.dumps(item.to_dict()))
+
+    @staticmethod
+    def _row_key(row):
+        # (type, tmdb_id), items without a TMDB ID are told apart by their data
+        return (row[2], row[3]) if row[3] is not None else (row[2], None, row[5])
+
+    def replace_list(self, source, list_name, items):
+        """
+        Replace the stored content of a list with freshly fetched items.
+
+        Only the rows that differ from the stored list are written, an unchanged list is left untouched.
+
+        :return: True if the stored list changed.
+        """
+        rows = {}
+        for item in items:
+            row = self._row(source, list_name, item)
+            rows[self._row_key(row)] = row
+
+        stored = {}
+        for rowid, *row in self.connection.execute('SELECT rowid, * FROM items WHERE source = ? AND list = ?', (source, list_name)):
+            stored[self._row_key(row)] = (rowid, tuple(row))
+
+        removed = [(rowid,) for key, (rowid, _) in stored.items() if key not in rows]
+        changed = [row for key, row in rows.items() if key not in stored or stored[key][1] != row]
+        if not removed and not changed:
+            return False
+        with self.connection:
+            self.connection.executemany('DELETE FROM items WHERE rowid = ?', removed)
+            self.connection.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)', changed)
+        return True
+
+    def add_items(self, source, list_name, items):
+        """
+        Record items that were successfully written to a list.
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?)', (self._row(source, list_name, item) for item in items))
+
+    def remove_items(self, source, list_name, items):
+        """
+        Drop items that were successfully removed from a list.
+        """
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM items WHERE source = ? AND list = ? AND type = ? AND tmdb_id = ?',
+                ((source, list_name, item.type, item.tmdb_id) for item in items)
+            )
+
+    def get_list(self, source, list_name):
+        rows = self.connection.execute('SELECT data FROM items WHERE source = ? AND list = ? ORDER BY rowid', (source, list_name))
+        return [MI.MediaItem.from_dict(json.loads(data)) for (data,) in rows]
+
+    def missing_items(self, from_source, to_source, list_name, exclude_watched=False):
+        """
+        Items in from_source's list that are not in to_source's list, matched on (type, tmdb_id).
+
+        :param exclude_watched: Also skip items present in the Trakt watched list.
+        :return: List of MediaItems from from_source.
+        """
+        query = '''
+            SELECT a.data FROM items a
+            WHERE a.source = ? AND a.list = ? AND a.tmdb_id IS NOT NULL
+            AND NOT EXISTS (
+                SELECT 1 FROM items b
+                WHERE b.source = ? AND b.list = ? AND b.type = a.type AND b.tmdb_id = a.tmdb_id
+            )
+        '''
+        params = [from_source, list_name, to_source, list_name]
+        if exclude_watched:
+            query += '''
+            AND NOT EXISTS (
+                SELECT 1 FROM items w
+                WHERE w.source = 'trakt' AND w.list = 'watched' AND w.type = a.type AND w.tmdb_id = a.tmdb_id
+            )
+            '''
+        query += ' ORDER BY a.rowid'
+        return [MI.MediaItem.from_dict(json.loads(data)) for (data,) in self.connection.execute(query, params)]
+
+    def watched_items(self, source, list_name):
+        """
+        Items in a list that are also in the Trakt watched list, matched on (type, tmdb_id).
+        """
+        query = '''
+            SELECT a.data FROM items a
+            WHERE a.source = ? AND a.list = ? AND a.tmdb_id IS NOT NULL
+            AND EXISTS (
+                SELECT 1 FROM items w
+                WHERE w.source = 'trakt' AND w.list = 'watched' AND w.type = a.type AND w.tmdb_id = a.tmdb_id
+            )
+            ORDER BY a.rowid
+        '''
+        return [MI.MediaItem.from_dict(json.loads(data)) for (data,) in self.connection.execute(query, (source, list_name))]
@@ -0,0 +1,123 @@
+import sys
+from TMDBTraktSyncer import timestamps as TS
+
+# Interned type tags, compare with == or `is`
+MOVIE = sys.intern('movie')
+SHOW = sys.intern('show')
+EPISODE = sys.intern('episode')
+
+_TYPES = {MOVIE: MOVIE, SHOW: SHOW, EPISODE: EPISODE}
+
+def intern_type(value):
+    """
+    Return the shared instance of a type tag, e.g. for tags read back from JSON.
+    """
+    return _TYPES.get(value) or sys.intern(value)
+
+# Attribute name -> key used by to_dict / from_dict
+_DICT_KEYS = (
+    ('type', 'Type'),
+    ('tmdb_id', 'TMDB_ID'),
+    ('trakt_id', 'TraktID'),
+    ('title', 'Title'),
+    ('year', 'Year'),
+    ('rating', 'Rating'),
+    ('date_added', 'Date_Added'),
+    ('show_tmdb_id', 'TMDB_ShowID'),
+    ('trakt_show_id', 'TraktShowID'),
+    ('season', 'Season'),
+    ('episode', 'Episode'),
+    ('watched_at', 'WatchedAt'),
+    ('show_status', 'ShowStatus'),
+    ('aired_episodes', 'AiredEpisodes')
+)
+
+# Older key names still accepted by from_dict
+_DICT_ALIASES = {
+    'ShowID': 'show_tmdb_id',
+    'SeasonNumber': 'season',
+    'EpisodeNumber': 'episode'
+}
+
+# Attributes holding epoch seconds
+_DATE_ATTRIBUTES = ('date_added', 'watched_at')
+
+class MediaItem:
+    """
+    A movie, show or episode of a watchlist, ratings list or watch history.
+
+    Uses __slots__ so a library of 100k items costs a fraction of the equivalent dicts.
+    Episodes always carry their show's TMDB id in show_tmdb_id and their numbers in season
+    and episode, whichever service they were read from. date_added and watched_at are epoch
+    seconds (see timestamps.parse_iso8601).
+    """
+    __slots__ = tuple(attribute for attribute, _ in _DICT_KEYS)
+
+    def __init__(self, type, tmdb_id=None, trakt_id=None, title=None, year=None, rating=None, date_added=None,
+                 show_tmdb_id=None, trakt_show_id=None, season=None, episode=None, watched_at=None,
+                 show_status=None, aired_episodes=None):
+        self.type = intern_type(type)
+        self.tmdb_id = tmdb_id
+        self.trakt_id = trakt_id
+        self.title = title
+        self.year = year
+        self.rating = rating
+        self.date_added = date_added
+        self.show_tmdb_id = show_tmdb_id
+        self.trakt_show_id = trakt_show_id
+        self.season = season
+        self.episode = episode
+        self.watched_at = watched_at
+        self.show_status = show_status
+        self.aired_episodes = aired_episodes
+
+    @property
+    def key(self):
+        """
+        (type, tmdb_id), the identity of an item across Trakt and TMDB.
+        """
+        return (self.type, self.tmdb_id)
+
+    def episode_label(self):
+        """
+        Return '[S01E02] ' for episodes with known numbers, otherwise ''.
+        """
+        if self.season and self.episode:
+            return f'[S{str(self.season).zfill(2)}E{str(self.episode).zfill(2)}] '
+        return ''
+
+    def to_dict(self):
+        """
+        Return a JSON friendly dict, fields that are None are left out.
+        """
+        data = {}
+        for attribute, key in _DICT_KEYS:
+            value = getattr(self, attribute)
+            if value is not None:
+                data[key] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        values = {}
+        for attribute, key in _DICT_KEYS:
+            if key in data:
+                values[attribute] = data[key]
+        for key, attribute in _DICT_ALIASES.items():
+            if key in data and values.get(attribute) is None:
+                values[attribute] = data[key]
+        # Dates are epoch seconds, older files stored ISO 8601 strings
+        for attribute in _DATE_ATTRIBUTES:
+            if isinstance(values.get(attribute), str):
+                values[attribute] = TS.parse_iso8601(values[attribute])
+        return cls(**values)
+
+    def __eq__(self, other):
+        if not isinstance(other, MediaItem):
+            return NotImplemented
+        return all(getattr(self, attribute) == getattr(other, attribute) for attribute in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'MediaItem({self.type!r}, tmdb_id={self.tmdb_id!r}, title={self.title!r})'
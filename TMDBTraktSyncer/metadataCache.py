@@ -0,0 +1,180 @@
+import os
+import json
+import asyncio
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Time to live for cached entries (in seconds)
+SHOW_TTL = 30 * 24 * 60 * 60
+ACCOUNT_TTL = 30 * 24 * 60 * 60
+USERNAME_TTL = 7 * 24 * 60 * 60
+
+class MetadataCache:
+    """
+    Two level cache for API metadata that rarely changes (show details, account ids, usernames).
+
+    Lookups hit an in-memory LRU first and fall back to a JSON file on disk. Every entry carries
+    its own expiry time. The disk store is capped at max_disk_entries, evicting the least recently
+    used entries, and is only written by flush() so a run costs at most one cache write.
+    """
+    def __init__(self, file_path, max_memory_entries=1024, max_disk_entries=10000):
+        self.file_path = file_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._disk = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._pending = {}
+
+    def _load_disk(self):
+        if self._disk is not None:
+            return self._disk
+        self._disk = {}
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._disk = data
+        except (FileNotFoundError, ValueError):
+            pass
+        return self._disk
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None when missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self._load_disk().get(key)
+            if entry is None:
+                return None
+            if entry['expires'] <= now:
+                self._memory.pop(key, None)
+                if self._load_disk().pop(key, None) is not None:
+                    self._dirty = True
+                return None
+            entry['accessed'] = now
+            self._remember(key, entry)
+            return entry['value']
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        entry = {'value': value, 'expires': now + ttl, 'accessed': now}
+        with self._lock:
+            self._remember(key, entry)
+            self._load_disk()[key] = entry
+            self._dirty = True
+
+    def get_or_fetch(self, key, fetch, ttl):
+        """
+        Return the cached value for key, calling fetch() to fill it on a miss.
+
+        Concurrent callers asking for the same key wait for a single fetch instead of
+        all hitting the API. A fetch that returns None is not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key)
+            if value is None:
+                value = fetch()
+                if value is not None:
+                    self.set(key, value, ttl)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    async def get_or_fetch_async(self, key, fetch, ttl):
+        """
+        Asyncio version of get_or_fetch, fetch is a coroutine function.
+
+        Concurrent tasks asking for the same key await the task that is already fetching it.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(fetch())
+            try:
+                value = await pending
+            finally:
+                self._pending.pop(key, None)
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+        return await asyncio.shield(pending)
+
+    def flush(self):
+        """
+        Write the cache to disk if it changed, evicting expired and least recently used entries.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            disk = {key: entry for key, entry in self._load_disk().items() if entry['expires'] > now}
+            if len(disk) > self.max_disk_entries:
+                newest = sorted(disk.items(), key=lambda kv: kv[1]['accessed'], reverse=True)
+                disk = dict(newest[:self.max_disk_entries])
+            self._disk = disk
+
+            write_json_atomic(self.file_path, disk)
+            self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk = {}
+            self._dirty = False
+            try:
+                os.remove(self.file_path)
+            except FileNotFoundError:
+                pass
+
+def write_json_atomic(file_path, data):
+    """
+    Write data as compact JSON through a temporary file and os.replace, creating the folder if needed.
+    """
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, file_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def token_key(prefix, token):
+    """
+    Build a cache key tied to a credential without storing the credential itself.
+    """
+    digest = hashlib.sha256(str(token).encode('utf-8')).hexdigest()[:16]
+    return f'{prefix}:{digest}'
+
+# Shared cache, stored in the cache folder which is removed by --clear-cache
+cache_directory = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'cache')
+cache = MetadataCache(os.path.join(cache_directory, 'metadata.json'))
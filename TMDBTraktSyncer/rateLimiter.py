@@ -0,0 +1,195 @@
+import json
+import asyncio
+import time
+import threading
+import datetime
+from datetime import timezone
+
+# Refilling adds up float fractions, so a bucket can hold 0.999... tokens when it should
+# hold one. Within this margin it counts as a whole token, otherwise the wait computed for
+# the remainder is too small to move the clock and acquire() spins.
+TOKEN_EPSILON = 1e-9
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Every request takes
+    one token and blocks until one is available, and pause() holds back all callers until
+    a point in time, which is how server Retry-After responses are applied to every thread
+    at once instead of only the one that hit the limit.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        # Configured burst size, the capacity never grows past it
+        self.burst = float(capacity)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.paused_until = 0.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def try_acquire(self):
+        """
+        Take one token if available.
+
+        :return: 0 when a token was taken, otherwise the number of seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.tokens >= 1 - TOKEN_EPSILON:
+                self.tokens = max(self.tokens - 1, 0.0)
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def _waits_past(self, delay, deadline):
+        return deadline is not None and time.monotonic() + delay > deadline
+
+    def acquire(self, deadline=None):
+        """
+        Take one token, sleeping until one is available.
+
+        :param deadline: time.monotonic() value to give up at instead of waiting past it, or None.
+        :return: Total time spent waiting in seconds, or None if no token was taken before the deadline.
+        """
+        waited = 0.0
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return waited
+            if self._waits_past(delay, deadline):
+                return None
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, deadline=None):
+        """
+        Take one token without blocking the event loop, see acquire.
+        """
+        waited = 0.0
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return waited
+            if self._waits_past(delay, deadline):
+                return None
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """
+        Block all callers for the given number of seconds and drain the bucket.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + max(float(seconds), 0.0))
+            self.tokens = 0.0
+            self.updated_at = max(now, self.paused_until)
+
+    def update_limit(self, limit, period, remaining=None):
+        """
+        Adapt the refill rate to a server-reported limit of `limit` requests per `period` seconds.
+        The capacity stays at the configured burst, or the limit if that is lower, so a window
+        of 1000 requests does not allow 1000 at once. When the server reports fewer remaining
+        requests than tokens in the bucket, the bucket is drained down to that number so a
+        shared window is not overrun.
+        """
+        with self._lock:
+            if limit and period:
+                self._refill(time.monotonic())
+                self.rate = float(limit) / float(period)
+                self.capacity = min(self.burst, float(limit))
+                self.tokens = min(self.tokens, self.capacity)
+            if remaining is not None:
+                self._refill(time.monotonic())
+                self.tokens = min(self.tokens, float(remaining))
+
+# Trakt allows 1000 GET requests per 5 minutes and 1 POST/PUT/DELETE per second,
+# TMDB allows roughly 50 requests per second per IP, shared by all endpoints.
+TRAKT_GET = 'trakt_get'
+TRAKT_POST = 'trakt_post'
+TMDB = 'tmdb'
+
+_bucket_settings = {
+    TRAKT_GET: (1000 / 300, 20),
+    TRAKT_POST: (1, 1),
+    TMDB: (40, 40)
+}
+
+_buckets = {}
+_lock = threading.Lock()
+
+def get_bucket(name):
+    """
+    Return the shared token bucket for TRAKT_GET, TRAKT_POST or TMDB.
+    """
+    bucket = _buckets.get(name)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.get(name)
+            if bucket is None:
+                rate, capacity = _bucket_settings[name]
+                bucket = _buckets[name] = TokenBucket(rate, capacity)
+    return bucket
+
+def configure_bucket(name, rate, capacity):
+    """
+    Replace the settings of a shared bucket, e.g. to match the limits of a test server.
+    """
+    with _lock:
+        _bucket_settings[name] = (rate, capacity)
+        _buckets.pop(name, None)
+
+def trakt_bucket(payload=None):
+    """
+    Return the Trakt bucket for a request, GET requests and writes are limited separately.
+    """
+    return get_bucket(TRAKT_GET if payload is None else TRAKT_POST)
+
+def parse_retry_after(headers, default=None):
+    """
+    Return the Retry-After header in seconds, or default when missing or invalid.
+    """
+    retry_after = headers.get('Retry-After')
+    if retry_after is None:
+        return default
+    try:
+        return max(float(retry_after), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+def observe_trakt_headers(bucket, headers):
+    """
+    Adapt a Trakt bucket from the X-Ratelimit header, e.g.
+    {"name": "AUTHED_API_GET_LIMIT", "period": 300, "limit": 1000, "remaining": 998, "until": "..."}
+    """
+    raw = headers.get('X-Ratelimit')
+    if not raw:
+        return
+    try:
+        limit_info = json.loads(raw)
+    except (TypeError, ValueError):
+        return
+    if not isinstance(limit_info, dict):
+        return
+
+    bucket.update_limit(limit_info.get('limit'), limit_info.get('period'), limit_info.get('remaining'))
+
+    # Window exhausted: wait until it resets
+    if limit_info.get('remaining') == 0 and limit_info.get('until'):
+        try:
+            until = datetime.datetime.fromisoformat(limit_info['until'].replace('Z', '+00:00'))
+            if until.tzinfo is None:
+                until = until.replace(tzinfo=timezone.utc)
+            bucket.pause((until - datetime.datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            pass
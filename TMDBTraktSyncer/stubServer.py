@@ -0,0 +1,476 @@
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from TMDBTraktSyncer import mediaItem as MI
+from TMDBTraktSyncer import rateLimiter as RL
+
+# Results per page of the paginated TMDB endpoints, as on the real API
+TMDB_PAGE_SIZE = 20
+# Plays per page of the Trakt /history endpoint when no limit is given
+TRAKT_HISTORY_PAGE_SIZE = 100
+
+# Dates of generated items start here and advance a minute per item, so newer items sort last
+BASE_DATE = 1577836800  # 2020-01-01
+
+TMDB_ACCOUNT_ID = 1
+TRAKT_USERNAME = 'stub-user'
+
+# Lists kept per service
+LISTS = (('trakt', 'watchlist'), ('trakt', 'ratings'), ('trakt', 'watched'), ('tmdb', 'watchlist'), ('tmdb', 'ratings'))
+
+def iso8601(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+class StubLibrary:
+    """
+    The Trakt and TMDB libraries served by the stub server.
+
+    Every generated item exists in a shared catalog, so writes can be resolved by TMDB or
+    Trakt id like on the real services, and the lists of both services hold MediaItems keyed
+    by (type, tmdb_id). Generated items are spread so that each service has items the other
+    one is missing, and some items are watched on Trakt:
+
+    - ratings: Trakt for every 4th item and the one after, TMDB for that one and the next
+    - watchlists (movies and shows): Trakt for every 5th item and the one after, TMDB for that one and the next
+    - watched on Trakt: every 7th item
+    """
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.catalog = {}
+        self.trakt_ids = {}
+        # (show_tmdb_id, season, episode) -> key, TMDB addresses episodes by show and numbers
+        self.episodes = {}
+        self.lists = {name: {} for name in LISTS}
+        # Trakt /sync/last_activities timestamps per category
+        self.activities = {'watchlist': BASE_DATE, 'ratings': BASE_DATE, 'history': BASE_DATE}
+        self.lock = threading.RLock()
+        self._count = 0
+        self._last_show = None
+
+    def _new_item(self):
+        index = self._count
+        self._count += 1
+        item_id = index + 1
+        item_type = (MI.MOVIE, MI.SHOW, MI.EPISODE)[index % 3]
+        date = BASE_DATE + index * 60
+        item = MI.MediaItem(item_type, tmdb_id=item_id, trakt_id=item_id, title=f'{item_type.title()} {item_id}', year=2000 + index % 25, rating=self.rng.randint(1, 10), date_added=date)
+        if item_type is MI.SHOW:
+            self._last_show = item
+        elif item_type is MI.EPISODE:
+            item.show_tmdb_id = self._last_show.tmdb_id
+            item.trakt_show_id = self._last_show.trakt_id
+            item.season = 1 + index % 5
+            item.episode = 1 + index % 20
+        return index, item
+
+    def add_items(self, count):
+        """
+        Add count new items to the catalog and spread them over the lists.
+        """
+        with self.lock:
+            for _ in range(count):
+                index, item = self._new_item()
+                self.catalog[item.key] = item
+                self.trakt_ids[(item.type, item.trakt_id)] = item.key
+                if item.type is MI.EPISODE:
+                    self.episodes[(item.show_tmdb_id, item.season, item.episode)] = item.key
+                if index % 4 in (0, 1):
+                    self.lists[('trakt', 'ratings')][item.key] = item
+                if index % 4 in (1, 2):
+                    self.lists[('tmdb', 'ratings')][item.key] = item
+                if item.type is not MI.EPISODE:
+                    if index % 5 in (0, 1):
+                        self.lists[('trakt', 'watchlist')][item.key] = item
+                    if index % 5 in (1, 2):
+                        self.lists[('tmdb', 'watchlist')][item.key] = item
+                if index % 7 == 0:
+                    self.lists[('trakt', 'watched')][item.key] = item
+            for category in self.activities:
+                self.touch(category)
+
+    def items(self, service, list_name, item_type=None):
+        with self.lock:
+            items = list(self.lists[(service, list_name)].values())
+        if item_type is not None:
+            items = [item for item in items if item.type is item_type]
+        return items
+
+    def touch(self, category):
+        # Always moves forward, so two changes within a second still look like a change to the client
+        self.activities[category] = max(int(time.time()), self.activities[category] + 1)
+
+    def counts(self):
+        with self.lock:
+            return {f'{service}_{list_name}': len(items) for (service, list_name), items in self.lists.items()}
+
+    # Trakt responses
+
+    def _trakt_ids(self, item):
+        return {'trakt': item.trakt_id, 'tmdb': item.tmdb_id}
+
+    def _trakt_media(self, item):
+        return {'title': item.title, 'year': item.year, 'ids': self._trakt_ids(item)}
+
+    def _trakt_show(self, show_tmdb_id):
+        show = self.catalog.get((MI.SHOW, show_tmdb_id))
+        data = self._trakt_media(show)
+        data.update({'status': 'ended', 'aired_episodes': 1})
+        return data
+
+    def trakt_watchlist(self):
+        return [{'type': item.type, 'listed_at': iso8601(item.date_added), item.type: self._trakt_media(item)}
+                for item in sorted(self.items('trakt', 'watchlist'), key=lambda item: item.date_added)]
+
+    def trakt_ratings(self):
+        ratings = []
+        for item in self.items('trakt', 'ratings'):
+            entry = {'type': item.type, 'rating': item.rating, 'rated_at': iso8601(item.date_added)}
+            if item.type is MI.EPISODE:
+                entry['show'] = self._trakt_show(item.show_tmdb_id)
+                entry['episode'] = {'season': item.season, 'number': item.episode, 'title': item.title, 'ids': self._trakt_ids(item)}
+            else:
+                entry[item.type] = self._trakt_media(item)
+            ratings.append(entry)
+        return ratings
+
+    def trakt_watched_movies(self):
+        return [{'plays': 1, 'last_watched_at': iso8601(item.date_added), 'movie': self._trakt_media(item)}
+                for item in self.items('trakt', 'watched', MI.MOVIE)]
+
+    def trakt_watched_shows(self):
+        # Watched shows count as completed (ended, one aired episode), watched episodes are listed under their show
+        shows = {}
+        for item in self.items('trakt', 'watched', MI.SHOW):
+            shows[item.tmdb_id] = {'last_watched_at': iso8601(item.date_added), 'show': self._trakt_show(item.tmdb_id),
+                                   'seasons': [{'number': 1, 'episodes': [{'number': 1, 'plays': 1, 'last_watched_at': iso8601(item.date_added)}]}]}
+        for item in self.items('trakt', 'watched', MI.EPISODE):
+            entry = shows.get(item.show_tmdb_id)
+            if entry is None:
+                show = self._trakt_show(item.show_tmdb_id)
+                show.update({'status': 'returning series', 'aired_episodes': 100})
+                entry = shows[item.show_tmdb_id] = {'last_watched_at': iso8601(item.date_added), 'show': show, 'seasons': []}
+            entry['seasons'].append({'number': item.season, 'episodes': [{'number': item.episode, 'plays': 1, 'last_watched_at': iso8601(item.date_added)}]})
+        return list(shows.values())
+
+    def trakt_history(self):
+        history = []
+        for item in self.items('trakt', 'watched'):
+            if item.type is MI.EPISODE:
+                history.append({'type': 'episode', 'watched_at': iso8601(item.date_added), 'show': self._trakt_show(item.show_tmdb_id),
+                                'episode': {'season': item.season, 'number': item.episode, 'title': item.title, 'first_aired': iso8601(item.date_added), 'ids': self._trakt_ids(item)}})
+            elif item.type is MI.MOVIE:
+                history.append({'type': 'movie', 'watched_at': iso8601(item.date_added), 'movie': self._trakt_media(item)})
+        history.sort(key=lambda play: play['watched_at'], reverse=True)
+        return history
+
+    def trakt_last_activities(self):
+        data = {}
+        for section, field, category in (('movies', 'watchlisted_at', 'watchlist'), ('shows', 'watchlisted_at', 'watchlist'),
+                                         ('seasons', 'watchlisted_at', 'watchlist'), ('episodes', 'watchlisted_at', 'watchlist'),
+                                         ('movies', 'rated_at', 'ratings'), ('shows', 'rated_at', 'ratings'),
+                                         ('seasons', 'rated_at', 'ratings'), ('episodes', 'rated_at', 'ratings'),
+                                         ('movies', 'watched_at', 'history'), ('episodes', 'watched_at', 'history')):
+            data.setdefault(section, {})[field] = iso8601(self.activities[category])
+        return data
+
+    def trakt_sync(self, list_name, payload, remove=False):
+        """
+        Apply a /sync/watchlist, /sync/ratings or /sync/watchlist/remove request.
+        """
+        sections = {'movies': MI.MOVIE, 'shows': MI.SHOW, 'episodes': MI.EPISODE}
+        changed = {section: 0 for section in sections}
+        not_found = {section: [] for section in sections}
+        with self.lock:
+            target = self.lists[('trakt', list_name)]
+            for section, item_type in sections.items():
+                for entry in payload.get(section) or []:
+                    ids = entry.get('ids') or {}
+                    if 'tmdb' in ids:
+                        key = (item_type, ids['tmdb'])
+                    else:
+                        key = self.trakt_ids.get((item_type, ids.get('trakt')))
+                    item = self.catalog.get(key)
+                    if item is None:
+                        not_found[section].append(entry)
+                        continue
+                    if remove:
+                        target.pop(key, None)
+                    else:
+                        target[key] = item
+                        if 'rating' in entry:
+                            item.rating = entry['rating']
+                    changed[section] += 1
+            self.touch(list_name)
+        return {'deleted' if remove else 'added': changed, 'not_found': not_found}
+
+    # TMDB responses
+
+    def tmdb_result(self, item, rated=False):
+        if item.type is MI.MOVIE:
+            result = {'id': item.tmdb_id, 'title': item.title, 'release_date': f'{item.year}-01-01'}
+        elif item.type is MI.SHOW:
+            result = {'id': item.tmdb_id, 'name': item.title, 'first_air_date': f'{item.year}-01-01'}
+        else:
+            result = {'id': item.tmdb_id, 'name': item.title, 'air_date': f'{item.year}-01-01', 'show_id': item.show_tmdb_id,
+                      'season_number': item.season, 'episode_number': item.episode}
+        if rated:
+            result['rating'] = item.rating
+        return result
+
+    def tmdb_page(self, list_name, item_type, page):
+        items = self.items('tmdb', list_name, item_type)
+        total_pages = max(1, math.ceil(len(items) / TMDB_PAGE_SIZE))
+        results = [self.tmdb_result(item, list_name == 'ratings') for item in items[(page - 1) * TMDB_PAGE_SIZE:page * TMDB_PAGE_SIZE]]
+        return {'page': page, 'results': results, 'total_pages': total_pages, 'total_results': len(items)}
+
+    def tmdb_set(self, list_name, key, value):
+        """
+        Add (value True or a rating) or remove (value False) a catalog item on a TMDB list.
+        """
+        with self.lock:
+            item = self.catalog.get(key)
+            if item is None:
+                return False
+            if value is False:
+                self.lists[('tmdb', list_name)].pop(key, None)
+            else:
+                self.lists[('tmdb', list_name)][key] = item
+                if list_name == 'ratings':
+                    item.rating = value
+            return True
+
+class StubStats:
+    """
+    Thread-safe request counters per service, method and status code.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.statuses = {}
+            self.started_at = time.monotonic()
+
+    def record(self, service, method, status):
+        with self.lock:
+            key = f'{service} {method}'
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def as_dict(self):
+        with self.lock:
+            return {'requests': dict(self.requests), 'statuses': dict(self.statuses), 'seconds': time.monotonic() - self.started_at}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves the Trakt endpoints under /trakt and the TMDB endpoints under /tmdb, plus the
+    /_stub/stats, /_stub/reset and /_stub/add_items control endpoints.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data=None, headers=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def _payload(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        server = self.server
+        parsed = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        payload = self._payload() if method == 'POST' else None
+        service, _, path = parsed.path.lstrip('/').partition('/')
+        path = '/' + path
+
+        if service == '_stub':
+            self._control(path, payload)
+            return
+        if service not in ('trakt', 'tmdb'):
+            self._send(404, {'error': 'unknown service'})
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        bucket = server.buckets.get(service)
+        delay = bucket.try_acquire() if bucket else 0
+        if delay:
+            status = self._send(429, {'error': 'rate limit exceeded'}, {'Retry-After': max(1, math.ceil(delay))})
+        elif server.fault_rate and server.rng.random() < server.fault_rate:
+            status = self._send(server.rng.choice((502, 503)), {'error': 'injected fault'})
+        else:
+            routes = TRAKT_ROUTES if service == 'trakt' else TMDB_ROUTES
+            for route_method, pattern, handler in routes:
+                match = pattern.fullmatch(path)
+                if route_method == method and match:
+                    status = handler(self, server.library, query, payload, *match.groups())
+                    break
+            else:
+                status = self._send(404, {'error': f'no route for {method} {path}'})
+        server.stats.record(service, method, status)
+
+    def _control(self, path, payload):
+        server = self.server
+        if path == '/stats':
+            self._send(200, dict(server.stats.as_dict(), library=server.library.counts()))
+        elif path == '/reset':
+            server.stats.reset()
+            self._send(200, {})
+        elif path == '/add_items':
+            server.library.add_items(int((payload or {}).get('count', 0)))
+            self._send(200, server.library.counts())
+        else:
+            self._send(404, {'error': 'unknown control endpoint'})
+
+def _trakt_token(handler, library, query, payload):
+    return handler._send(200, {'access_token': 'stub-access-token', 'refresh_token': 'stub-refresh-token', 'expires_in': 7 * 24 * 60 * 60})
+
+def _trakt_history(handler, library, query, payload, username):
+    history = library.trakt_history()
+    limit = int(query.get('limit', TRAKT_HISTORY_PAGE_SIZE))
+    page = int(query.get('page', 1))
+    page_count = max(1, math.ceil(len(history) / limit))
+    headers = {'X-Pagination-Page': page, 'X-Pagination-Limit': limit, 'X-Pagination-Page-Count': page_count, 'X-Pagination-Item-Count': len(history)}
+    return handler._send(200, history[(page - 1) * limit:page * limit], headers)
+
+TRAKT_ROUTES = [
+    ('POST', re.compile(r'/oauth/token'), _trakt_token),
+    ('GET', re.compile(r'/users/me'), lambda handler, library, query, payload: handler._send(200, {'username': TRAKT_USERNAME, 'ids': {'slug': TRAKT_USERNAME}})),
+    ('GET', re.compile(r'/sync/last_activities'), lambda handler, library, query, payload: handler._send(200, library.trakt_last_activities())),
+    ('GET', re.compile(r'/users/([^/]+)/watchlist'), lambda handler, library, query, payload, username: handler._send(200, library.trakt_watchlist())),
+    ('GET', re.compile(r'/users/([^/]+)/ratings'), lambda handler, library, query, payload, username: handler._send(200, library.trakt_ratings())),
+    ('GET', re.compile(r'/users/([^/]+)/history'), _trakt_history),
+    ('GET', re.compile(r'/sync/watched/movies'), lambda handler, library, query, payload: handler._send(200, library.trakt_watched_movies())),
+    ('GET', re.compile(r'/sync/watched/shows'), lambda handler, library, query, payload: handler._send(200, library.trakt_watched_shows())),
+    ('POST', re.compile(r'/sync/watchlist'), lambda handler, library, query, payload: handler._send(201, library.trakt_sync('watchlist', payload))),
+    ('POST', re.compile(r'/sync/watchlist/remove'), lambda handler, library, query, payload: handler._send(200, library.trakt_sync('watchlist', payload, remove=True))),
+    ('POST', re.compile(r'/sync/ratings'), lambda handler, library, query, payload: handler._send(201, library.trakt_sync('ratings', payload)))
+]
+
+def _tmdb_list(list_name, item_type):
+    def handle(handler, library, query, payload, account_id):
+        return handler._send(200, library.tmdb_page(list_name, item_type, int(query.get('page', 1))))
+    return handle
+
+def _tmdb_show(handler, library, query, payload, show_id):
+    show = library.catalog.get((MI.SHOW, int(show_id)))
+    if show is None:
+        return handler._send(404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'})
+    return handler._send(200, {'id': show.tmdb_id, 'name': show.title})
+
+def _tmdb_watchlist(handler, library, query, payload, account_id):
+    item_type = MI.MOVIE if payload.get('media_type') == 'movie' else MI.SHOW
+    if not library.tmdb_set('watchlist', (item_type, payload.get('media_id')), bool(payload.get('watchlist'))):
+        return handler._send(404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'})
+    return handler._send(201, {'status_code': 1, 'status_message': 'Success.'})
+
+def _tmdb_rating(item_type):
+    def handle(handler, library, query, payload, tmdb_id, season=None, episode=None):
+        if item_type is MI.EPISODE:
+            key = library.episodes.get((int(tmdb_id), int(season), int(episode)))
+        else:
+            key = (item_type, int(tmdb_id))
+        if not library.tmdb_set('ratings', key, payload.get('value')):
+            return handler._send(404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'})
+        return handler._send(201, {'status_code': 1, 'status_message': 'Success.'})
+    return handle
+
+TMDB_ROUTES = [
+    ('GET', re.compile(r'/3/account'), lambda handler, library, query, payload: handler._send(200, {'id': TMDB_ACCOUNT_ID, 'username': TRAKT_USERNAME})),
+    ('GET', re.compile(r'/3/tv/(\d+)'), _tmdb_show),
+    ('GET', re.compile(r'/3/account/(\d+)/watchlist/movies'), _tmdb_list('watchlist', MI.MOVIE)),
+    ('GET', re.compile(r'/3/account/(\d+)/watchlist/tv'), _tmdb_list('watchlist', MI.SHOW)),
+    ('GET', re.compile(r'/3/account/(\d+)/rated/movies'), _tmdb_list('ratings', MI.MOVIE)),
+    ('GET', re.compile(r'/3/account/(\d+)/rated/tv'), _tmdb_list('ratings', MI.SHOW)),
+    ('GET', re.compile(r'/3/account/(\d+)/rated/tv/episodes'), _tmdb_list('ratings', MI.EPISODE)),
+    ('POST', re.compile(r'/3/account/(\d+)/watchlist'), _tmdb_watchlist),
+    ('POST', re.compile(r'/3/movie/(\d+)/rating'), _tmdb_rating(MI.MOVIE)),
+    ('POST', re.compile(r'/3/tv/(\d+)/rating'), _tmdb_rating(MI.SHOW)),
+    ('POST', re.compile(r'/3/tv/(\d+)/season/(\d+)/episode/(\d+)/rating'), _tmdb_rating(MI.EPISODE))
+]
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local HTTP server emulating the Trakt and TMDB endpoints used by a sync.
+
+    :param library: StubLibrary to serve.
+    :param latency: Seconds added to every API request.
+    :param rate_limit: Requests per second allowed per service before answering 429 with Retry-After, 0 for no limit.
+    :param fault_rate: Share of API requests answered with a 502 or 503, which both clients retry.
+    """
+    daemon_threads = True
+
+    def __init__(self, library, host='127.0.0.1', port=0, latency=0.0, rate_limit=0, fault_rate=0.0, seed=0):
+        super().__init__((host, port), StubHandler)
+        self.library = library
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.rng = random.Random(seed)
+        self.stats = StubStats()
+        self.buckets = {service: RL.TokenBucket(rate_limit, rate_limit) for service in ('trakt', 'tmdb')} if rate_limit else {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Trakt and TMDB stub server for benchmarks")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on, 0 picks a free one (default: 0).")
+    parser.add_argument("--size", type=int, default=1000, metavar="N", help="Number of generated library items (default: 1000).")
+    parser.add_argument("--latency", type=float, default=0.0, metavar="SECONDS", help="Delay added to every API request.")
+    parser.add_argument("--rate-limit", type=float, default=0, metavar="N", help="Requests per second per service before 429 responses, 0 for no limit.")
+    parser.add_argument("--fault-rate", type=float, default=0.0, metavar="SHARE", help="Share of API requests answered with a 5xx error.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated library and the fault injection.")
+    args = parser.parse_args()
+
+    library = StubLibrary(args.seed)
+    library.add_items(args.size)
+    server = StubServer(library, port=args.port, latency=args.latency, rate_limit=args.rate_limit, fault_rate=args.fault_rate, seed=args.seed)
+
+    # First line of output is read by the benchmark to find the server
+    print(f"Listening on {server.base_url}", flush=True)
+    print(f"Point TMDBTraktSyncer at it with TMDBTRAKTSYNCER_TRAKT_URL={server.base_url}/trakt "
+          f"TMDBTRAKTSYNCER_TMDB_URL={server.base_url}/tmdb", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import os
+import json
+import time
+from TMDBTraktSyncer import mediaItem as MI
+
+# Operations in the order main applies them
+OPERATIONS = (
+    'tmdb_watchlist_add',
+    'trakt_watchlist_add',
+    'tmdb_ratings_set',
+    'trakt_ratings_set',
+    'trakt_watchlist_remove',
+    'tmdb_watchlist_remove'
+)
+
+# Sync option that enables each operation, keys of the sync options dict
+OPERATION_OPTIONS = {
+    'tmdb_watchlist_add': 'watchlist',
+    'trakt_watchlist_add': 'watchlist',
+    'tmdb_ratings_set': 'ratings',
+    'trakt_ratings_set': 'ratings',
+    'trakt_watchlist_remove': 'remove_watched',
+    'tmdb_watchlist_remove': 'remove_watched'
+}
+
+# Order in which a time budgeted run applies the operations. Removals come first, then the
+# Trakt writes, which send up to 100 items per request, before the TMDB writes, which send one.
+PRIORITY_OPERATIONS = (
+    'trakt_watchlist_remove',
+    'tmdb_watchlist_remove',
+    'trakt_watchlist_add',
+    'trakt_ratings_set',
+    'tmdb_watchlist_add',
+    'tmdb_ratings_set'
+)
+
+def _recency(item):
+    dates = [date for date in (item.watched_at, item.date_added) if date is not None]
+    return max(dates) if dates else float('-inf')
+
+def sort_by_priority(items):
+    """
+    Return items newest first by watched_at or date_added, items without either last.
+    """
+    return sorted(items, key=_recency, reverse=True)
+
+class SyncPlan:
+    """
+    Every write a sync run has to make, one list of MediaItems per operation in OPERATIONS.
+    """
+    def __init__(self, **operations):
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown sync operations: {', '.join(sorted(unknown))}")
+        for operation in OPERATIONS:
+            setattr(self, operation, list(operations.get(operation) or []))
+
+    def counts(self):
+        return {operation: len(getattr(self, operation)) for operation in OPERATIONS}
+
+    @property
+    def total(self):
+        return sum(len(getattr(self, operation)) for operation in OPERATIONS)
+
+    def to_dict(self):
+        return {operation: [item.to_dict() for item in getattr(self, operation)] for operation in OPERATIONS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{operation: [MI.MediaItem.from_dict(item) for item in data.get(operation) or []] for operation in OPERATIONS})
+
+    def for_options(self, options):
+        """
+        Return the plan without the operations turned off in the sync options.
+
+        The watchlists are also read for remove_watched alone, so their differences end up in
+        the plan even when the watchlist option is off.
+
+        :param options: Dict with the 'ratings', 'watchlist' and 'remove_watched' sync options.
+        """
+        return SyncPlan(**{operation: getattr(self, operation) for operation in OPERATIONS if options.get(OPERATION_OPTIONS[operation])})
+
+    def shard(self, index, count):
+        """
+        Return the part of the plan handled by one of count workers, index counting from 0.
+
+        Items are dealt out round robin within each operation, so every shard gets a similar
+        share of each operation and of the recent and older items. Shards don't overlap and
+        together cover the whole plan.
+        """
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index} of {count}")
+        return SyncPlan(**{operation: getattr(self, operation)[index::count] for operation in OPERATIONS})
+
+    def __repr__(self):
+        counts = ', '.join(f'{operation}={count}' for operation, count in self.counts().items())
+        return f'SyncPlan({counts})'
+
+# Bumped when the plan file format changes
+PLAN_FILE_VERSION = 1
+
+def save_plan(file_path, plan, options):
+    """
+    Write a plan to a JSON file for a later --apply run.
+
+    :param options: Dict of the sync options the plan was computed for.
+    """
+    data = {'version': PLAN_FILE_VERSION, 'created_at': time.time(), 'options': options, 'plan': plan.to_dict()}
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    # Written next to the target and renamed, so a worker never reads a half written plan
+    tmp_path = f'{file_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, file_path)
+
+def load_plan(file_path):
+    """
+    Read a plan written by save_plan, without the operations its options turn off.
+
+    :return: (plan, options, created_at)
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get('version') != PLAN_FILE_VERSION:
+        raise ValueError(f"{file_path} is not a plan file of this TMDBTraktSyncer version")
+    options = data['options']
+    return SyncPlan.from_dict(data['plan']).for_options(options), options, data['created_at']
+
+def _keys(items):
+    return {item.key for item in items if item.tmdb_id is not None}
+
+def plan_sync(trakt_watchlist, trakt_ratings, watched_content, tmdb_watchlist, tmdb_ratings, remove_watched=False):
+    """
+    Compute all add and remove operations of a sync in one pass over each list.
+
+    Items are matched on (type, tmdb_id), so a movie and a show sharing a numeric TMDB id are
+    different items. Items without a TMDB id are skipped, and item order is kept.
+
+    :param watched_content: Iterable of [type, tmdb_id] pairs of watched items.
+    :param remove_watched: Remove watched items from both watchlists and never add them.
+    :return: SyncPlan
+    """
+    trakt_watchlist_keys = _keys(trakt_watchlist)
+    tmdb_watchlist_keys = _keys(tmdb_watchlist)
+    trakt_rating_keys = _keys(trakt_ratings)
+    tmdb_rating_keys = _keys(tmdb_ratings)
+    watched_keys = {(MI.intern_type(item_type), tmdb_id) for item_type, tmdb_id in watched_content} if remove_watched else set()
+
+    plan = SyncPlan()
+
+    for item in trakt_ratings:
+        if item.tmdb_id is not None and item.key not in tmdb_rating_keys:
+            plan.tmdb_ratings_set.append(item)
+    for item in tmdb_ratings:
+        if item.tmdb_id is not None and item.key not in trakt_rating_keys:
+            plan.trakt_ratings_set.append(item)
+
+    for item in trakt_watchlist:
+        if item.tmdb_id is None:
+            continue
+        key = item.key
+        if key in watched_keys:
+            plan.trakt_watchlist_remove.append(item)
+        elif key not in tmdb_watchlist_keys:
+            plan.tmdb_watchlist_add.append(item)
+    for item in tmdb_watchlist:
+        if item.tmdb_id is None:
+            continue
+        key = item.key
+        if key in watched_keys:
+            plan.tmdb_watchlist_remove.append(item)
+        elif key not in trakt_watchlist_keys:
+            plan.trakt_watchlist_add.append(item)
+
+    return plan
@@ -0,0 +1,216 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from TMDBTraktSyncer import errorHandling as EH
+from TMDBTraktSyncer import errorLogger as EL
+
+# Number of items sent per Trakt sync request
+TRAKT_BATCH_SIZE = 100
+
+# Number of concurrent TMDB write requests
+TMDB_WORKERS = 8
+
+# Seconds before the end of a time budgeted run at which no new writes are started, so the
+# requests already in flight (20 second timeout each) can finish
+DISPATCH_MARGIN = 30
+
+def dispatch_deadline(deadline, max_runtime):
+    """
+    Return the time.monotonic() value after which no new writes should be started.
+
+    :param deadline: time.monotonic() value the run has to finish by.
+    :param max_runtime: Length of the run's time budget in seconds, at most a tenth of it is kept as margin.
+    """
+    return deadline - min(DISPATCH_MARGIN, max_runtime / 10)
+
+def _past(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+# Item type to Trakt sync payload section
+TRAKT_SECTIONS = {
+    'movie': 'movies',
+    'show': 'shows',
+    'episode': 'episodes'
+}
+
+def _not_found_ids(response):
+    """
+    Collect the (section, id_name, id_value) triples listed under 'not_found' in a Trakt sync response.
+    """
+    not_found_ids = set()
+    try:
+        json_data = response.json() if response.content else {}
+    except ValueError:
+        EL.logger.error("Could not decode Trakt sync response.", exc_info=True)
+        return not_found_ids
+
+    not_found = json_data.get('not_found') or {}
+    for section, entries in not_found.items():
+        if not isinstance(entries, list):
+            continue
+        for entry in entries:
+            for id_name, id_value in (entry.get('ids') or {}).items():
+                not_found_ids.add((section, id_name, id_value))
+    return not_found_ids
+
+def write_trakt_batches(url, items, build_entry, batch_size=TRAKT_BATCH_SIZE, deadline=None):
+    """
+    Send items to a Trakt sync endpoint in batches and report the outcome for each item.
+
+    Items are packed into the 'movies', 'shows' and 'episodes' arrays of a single payload,
+    up to batch_size items per request. The 'not_found' section of the response is used to
+    mark individual items as failed, everything else in a successful batch counts as done
+    (whether Trakt reports it as 'added', 'existing' or 'deleted').
+
+    :param url: Trakt sync endpoint, e.g. https://api.trakt.tv/sync/watchlist
+    :param items: List of MediaItems.
+    :param build_entry: Function returning the payload entry (with an 'ids' dict) for an item.
+    :param batch_size: Maximum number of items per request.
+    :param deadline: time.monotonic() value after which no new batch is sent, or None.
+    :return: Generator of (item, success) tuples in the original item order. Items not sent
+             before the deadline are left out.
+    """
+    batch_size = max(1, int(batch_size))
+
+    for start in range(0, len(items), batch_size):
+        if _past(deadline):
+            return
+        batch = items[start:start + batch_size]
+        data = {
+            "movies": [],
+            "shows": [],
+            "episodes": []
+        }
+        item_ids = []
+
+        for item in batch:
+            section = TRAKT_SECTIONS.get(item.type)
+            if section is None:
+                item_ids.append(None)
+                continue
+            entry = build_entry(item)
+            data[section].append(entry)
+            item_ids.append({(section, id_name, id_value) for id_name, id_value in entry['ids'].items()})
+
+        response = EH.make_trakt_request(url, payload=data)
+
+        if response and response.status_code in [200, 201, 204]:
+            not_found_ids = _not_found_ids(response)
+            for item, ids in zip(batch, item_ids):
+                yield item, ids is not None and not (ids & not_found_ids)
+        else:
+            for item in batch:
+                yield item, False
+
+def build_trakt_watchlist_entry(item):
+    """
+    Return the Trakt sync payload entry for adding an item to the watchlist.
+    """
+    return {"ids": {"tmdb": item.tmdb_id}}
+
+def build_trakt_rating_entry(item):
+    """
+    Return the Trakt sync payload entry for rating an item.
+    """
+    return {"ids": {"tmdb": item.tmdb_id}, "rating": item.rating}
+
+def build_trakt_watchlist_removal_entry(item):
+    """
+    Return the Trakt sync payload entry for removing an item from the watchlist, by its Trakt id.
+    """
+    return {"ids": {"trakt": item.trakt_id}}
+
+def _send_tmdb_request(url, payload):
+    try:
+        response = EH.make_tmdb_request(url, payload=payload)
+    except Exception:
+        EL.logger.error(f"Unexpected error sending TMDB request. URL: {url}", exc_info=True)
+        return False
+    return bool(response is not None and response.status_code in [200, 201, 204])
+
+def build_tmdb_watchlist_request(account_id, watchlist):
+    """
+    Return a request builder for adding (watchlist=True) or removing (watchlist=False) TMDB watchlist items.
+    """
+    url = f"https://api.themoviedb.org/3/account/{account_id}/watchlist"
+
+    def build_request(item):
+        payload = {}  # Add any additional payload parameters if required
+        if item.type == 'movie':
+            payload['media_type'] = "movie"
+            payload['media_id'] = item.tmdb_id
+            payload['watchlist'] = watchlist
+        elif item.type == 'show':
+            payload['media_type'] = "tv"
+            payload['media_id'] = item.tmdb_id
+            payload['watchlist'] = watchlist
+        return url, payload
+
+    return build_request
+
+def build_tmdb_rating_request(item):
+    """
+    Return the (url, payload) tuple for rating a movie, show or episode on TMDB.
+    """
+    payload = {
+        'value': item.rating
+    }
+    if item.type == 'movie':
+        url = f"https://api.themoviedb.org/3/movie/{item.tmdb_id}/rating"
+    elif item.type == 'show':
+        url = f"https://api.themoviedb.org/3/tv/{item.tmdb_id}/rating"
+    else:
+        url = f"https://api.themoviedb.org/3/tv/{item.show_tmdb_id}/season/{item.season}/episode/{item.episode}/rating"
+    return url, payload
+
+def write_tmdb_items(items, build_request, max_workers=TMDB_WORKERS, deadline=None):
+    """
+    Send one TMDB write request per item on a bounded thread pool.
+
+    TMDB has no bulk endpoints for ratings or watchlist changes, so the requests are
+    spread over max_workers threads. Only a small window of requests is queued ahead of
+    the workers, and results are handed back on the calling thread so progress output
+    and logging stay in one place.
+
+    :param items: List of MediaItems.
+    :param build_request: Function returning the (url, payload) tuple for an item.
+    :param max_workers: Number of concurrent requests.
+    :param deadline: time.monotonic() value after which no new request is started, or None.
+    :return: Generator of (item, success) tuples in completion order. Items not sent before
+             the deadline are left out. Closing the generator cancels the requests not
+             started yet.
+    """
+    max_workers = max(1, int(max_workers))
+    pending_items = iter(items)
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit_next():
+        if _past(deadline):
+            return False
+        item = next(pending_items, None)
+        if item is None:
+            return False
+        url, payload = build_request(item)
+        in_flight[executor.submit(_send_tmdb_request, url, payload)] = item
+        return True
+
+    try:
+        # Keep up to two requests per worker queued
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                submit_next()
+                yield item, future.result()
+    finally:
+        # Stopped early (Ctrl-C, an error, the caller closed the generator): drop the queued
+        # requests, their outcome would never reach the caller or the write journal. Requests
+        # already running can't be stopped and are waited for, TMDB writes are idempotent so a
+        # resumed run repeating one of them is harmless.
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True)
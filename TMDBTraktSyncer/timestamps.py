@@ -0,0 +1,106 @@
+def _days_from_civil(year, month, day):
+    """
+    Days since 1970-01-01 of a proleptic Gregorian date.
+    """
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+def _number(value, start, end, low, high):
+    """
+    Read the ASCII digits value[start:end] as an int between low and high, raise ValueError otherwise.
+
+    int() alone would also take signs, spaces, underscores and non-ASCII digits.
+    """
+    field = value[start:end]
+    if len(field) != end - start or not field.isascii() or not field.isdigit():
+        raise ValueError(field)
+    number = int(field)
+    if not low <= number <= high:
+        raise ValueError(field)
+    return number
+
+def _days_in_month(year, month):
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+def _parse_day(value):
+    if value[4] != '-' or value[7] != '-':
+        raise ValueError(value)
+    year = _number(value, 0, 4, 1, 9999)
+    month = _number(value, 5, 7, 1, 12)
+    day = _number(value, 8, 10, 1, _days_in_month(year, month))
+    return _days_from_civil(year, month, day)
+
+def _seconds_of_day(value):
+    # Seconds up to 61 like strptime's %S, which allows leap seconds
+    return _number(value, 11, 13, 0, 23) * 3600 + _number(value, 14, 16, 0, 59) * 60 + _number(value, 17, 19, 0, 61)
+
+# "YYYY-MM-DD" -> days since 1970-01-01 of valid dates, bounded to about 27 years of dates
+_DAYS_CACHE_SIZE = 10000
+_days_cache = {}
+
+def parse_iso8601(value):
+    """
+    Convert an ISO 8601 timestamp as returned by Trakt and TMDB to epoch seconds (UTC).
+
+    Handles "2024-01-02T03:04:05.000Z", "2024-01-02T03:04:05+02:00", "2024-01-02T03:04:05"
+    (taken as UTC) and "2024-01-02". Fractional seconds are dropped. Fixed field positions are
+    read directly instead of going through strptime, which is several times faster, and every
+    field is checked the way strptime checks it.
+
+    :return: Epoch seconds as an int, or None for missing or malformed values.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        # Dates repeat a lot in a library, remember the day number of each date seen
+        days = _days_cache.get(value[:10])
+        if days is None:
+            days = _parse_day(value)
+            if len(_days_cache) < _DAYS_CACHE_SIZE:
+                _days_cache[value[:10]] = days
+        if len(value) == 24 and value[10] == 'T' and value[19] == '.' and value[23] == 'Z':
+            # Fast path for the common "2024-01-02T03:04:05.000Z" format, the milliseconds are only checked
+            if value[13] != ':' or value[16] != ':':
+                return None
+            _number(value, 20, 23, 0, 999)
+            return days * 86400 + _seconds_of_day(value)
+        if len(value) == 10:
+            return days * 86400
+        if value[10] not in 'T ' or value[13] != ':' or value[16] != ':':
+            return None
+        seconds = days * 86400 + _seconds_of_day(value)
+
+        # Skip fractional seconds, then apply the UTC offset if any
+        position = 19
+        if position < len(value) and value[position] in '.,':
+            position += 1
+            while position < len(value) and '0' <= value[position] <= '9':
+                position += 1
+            if position == 20:
+                return None
+        offset = value[position:]
+        if offset in ('', 'Z', 'z'):
+            return seconds
+        if offset[0] in '+-' and len(offset) in (3, 5, 6) and (len(offset) != 6 or offset[3] == ':'):
+            minutes = _number(offset, 1, 3, 0, 23) * 60 + (_number(offset, len(offset) - 2, len(offset), 0, 59) if len(offset) > 3 else 0)
+            return seconds - minutes * 60 if offset[0] == '+' else seconds + minutes * 60
+        return None
+    except (ValueError, IndexError):
+        return None
+
+def year_of(value):
+    """
+    Return the year of an ISO 8601 date or timestamp, or None.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return int(value[:4])
+    except ValueError:
+        return None
@@ -1,117 +1,155 @@
-import requests
 import json
-import time
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from TMDBTraktSyncer import errorHandling as EH
-from TMDBTraktSyncer import errorLogger as EL
+import asyncio
+from TMDBTraktSyncer import verifyCredentials as VC
+from TMDBTraktSyncer import metadataCache as MC
+from TMDBTraktSyncer import asyncRequests as AR
+from TMDBTraktSyncer import mediaItem as MI
 
-def fetch_data(url):
-    response = EH.make_tmdb_request(url)
+# Number of pages fetched concurrently per paginated endpoint
+PAGE_WORKERS = 4
+
+async def fetch_data_async(url):
+    response = await AR.make_tmdb_request_async(url)
     json_data = json.loads(response.text)
     results = json_data['results']
     total_pages = json_data['total_pages']
     current_page = json_data['page']
     return results, total_pages, current_page
     
-def fetch_account_id():
-    # Fetch Account ID
-    response = EH.make_tmdb_request('https://api.themoviedb.org/3/account')
-    json_data = json.loads(response.text)
-    account_id = json_data['id']
+def fetch_data(url):
+    return asyncio.run(fetch_data_async(url))
+
+async def fetch_all_pages_async(url, parse_item, max_workers=PAGE_WORKERS):
+    """
+    Fetch every page of a paginated TMDB endpoint and parse the results.
+
+    Page 1 is fetched first to learn total_pages, the remaining pages are then fetched
+    concurrently, at most max_workers at a time. Results keep the original page order. A page
+    that fails cancels the pages still being fetched before the exception is raised.
+
+    :param url: Endpoint URL without the page parameter.
+    :param parse_item: Function or coroutine function converting one result into a MediaItem.
+    :param max_workers: Number of pages fetched at the same time.
+    :return: List of parsed items.
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def fetch_page(page):
+        async with semaphore:
+            results, total_pages, _ = await fetch_data_async(f'{url}?page={page}')
+        page_items = [parse_item(result) for result in results]
+        if asyncio.iscoroutinefunction(parse_item):
+            page_items = list(await asyncio.gather(*page_items))
+        return page_items, total_pages
+
+    items, total_pages = await fetch_page(1)
+
+    if total_pages > 1:
+        pages = await AR.gather_or_cancel(*(fetch_page(page) for page in range(2, total_pages + 1)))
+        for page_items, _ in pages:
+            items.extend(page_items)
+
+    return items
+
+def fetch_all_pages(url, parse_item, max_workers=PAGE_WORKERS):
+    return asyncio.run(fetch_all_pages_async(url, parse_item, max_workers))
+
+async def fetch_endpoints_async(endpoints):
+    """
+    Fetch several independent paginated endpoints at the same time.
+
+    :param endpoints: List of (url, parse_item) tuples.
+    :return: List of parsed items, in the order the endpoints were given.
+    """
+    results = await AR.gather_or_cancel(*(fetch_all_pages_async(url, parse_item) for url, parse_item in endpoints))
+    items = []
+    for endpoint_items in results:
+        items.extend(endpoint_items)
+    return items
+
+def fetch_endpoints(endpoints):
+    return asyncio.run(fetch_endpoints_async(endpoints))
+
+async def fetch_account_id_async():
+    async def fetch():
+        # Fetch Account ID
+        response = await AR.make_tmdb_request_async('https://api.themoviedb.org/3/account')
+        json_data = json.loads(response.text)
+        return json_data['id']
+
+    # The account id never changes for a token, cache it per token
+    _, _, _, _, tmdb_access_token = VC.prompt_get_credentials()
+    account_id = await MC.cache.get_or_fetch_async(MC.token_key('tmdb_account_id', tmdb_access_token), fetch, MC.ACCOUNT_TTL)
     return account_id
 
-def get_tmdb_watchlist(account_id):
-    # Fetch Movies Watchlist
-    movie_watchlist = []
-    page = 1
-    total_pages = 1
-
-    while page <= total_pages:
-        url = f'https://api.themoviedb.org/3/account/{account_id}/watchlist/movies?page={page}'
-        results, total_pages, _ = fetch_data(url)
-        
-        for movie in results:
-            movie_watchlist.append({'Title': movie['title'], 'Year': movie['release_date'][:4], 'TMDB_ID': movie['id'], 'Type': 'movie'})
-        
-        page += 1
-
-    # Fetch TV Show Watchlist
-    show_watchlist = []
-    page = 1
-    total_pages = 1
-
-    while page <= total_pages:
-        url = f'https://api.themoviedb.org/3/account/{account_id}/watchlist/tv?page={page}'
-        results, total_pages, _ = fetch_data(url)
-        
-        for show in results:
-            show_watchlist.append({'Title': show['name'], 'Year': show['first_air_date'][:4], 'TMDB_ID': show['id'], 'Type': 'show'})
-        
-        page += 1
-
-    tmdb_watchlist = movie_watchlist + show_watchlist
+def fetch_account_id():
+    return asyncio.run(fetch_account_id_async())
+
+async def fetch_show_details_async(show_id):
+    """
+    Return the cached details (currently just the name) of a TMDB show, fetching them on a miss.
+    """
+    async def fetch():
+        response = await AR.make_tmdb_request_async(f'https://api.themoviedb.org/3/tv/{show_id}')
+        if response is None:
+            return None
+        show_info = json.loads(response.text)
+        return {'name': show_info.get('name', 'Show Name Not Found')}
+
+    return await MC.cache.get_or_fetch_async(f'tmdb_show:{show_id}', fetch, MC.SHOW_TTL) or {}
+
+def fetch_show_details(show_id):
+    return asyncio.run(fetch_show_details_async(show_id))
+
+def _parse_watchlist_movie(movie):
+    return MI.MediaItem(MI.MOVIE, tmdb_id=movie['id'], title=movie['title'], year=movie['release_date'][:4])
+
+def _parse_watchlist_show(show):
+    return MI.MediaItem(MI.SHOW, tmdb_id=show['id'], title=show['name'], year=show['first_air_date'][:4])
+
+def _parse_movie_rating(movie):
+    return MI.MediaItem(MI.MOVIE, tmdb_id=movie['id'], title=movie['title'], year=movie.get('release_date')[:4] if movie.get('release_date') else None, rating=movie['rating'])
+
+def _parse_show_rating(show):
+    return MI.MediaItem(MI.SHOW, tmdb_id=show['id'], title=show['name'], year=show.get('first_air_date')[:4] if show.get('first_air_date') else None, rating=show['rating'])
+
+async def _parse_episode_rating(episode):
+    show_id = episode['show_id']
+    show_info = await fetch_show_details_async(show_id)
+    show_name = show_info.get('name', 'Show Name Not Found')
+    episode_title = f"{show_name}: {episode.get('name', 'Episode Name Not Found')}"
+    return MI.MediaItem(
+        MI.EPISODE,
+        tmdb_id=episode.get('id'),
+        title=episode_title,
+        year=episode.get('air_date', '')[:4] if episode.get('air_date') else None,
+        rating=episode.get('rating'),
+        show_tmdb_id=show_id,
+        season=episode.get('season_number'),
+        episode=episode.get('episode_number')
+    )
+
+async def get_tmdb_watchlist_async(account_id):
+    # Fetch Movie and TV Show Watchlists
+    tmdb_watchlist = await fetch_endpoints_async([
+        (f'https://api.themoviedb.org/3/account/{account_id}/watchlist/movies', _parse_watchlist_movie),
+        (f'https://api.themoviedb.org/3/account/{account_id}/watchlist/tv', _parse_watchlist_show)
+    ])
     
     return tmdb_watchlist
     
+def get_tmdb_watchlist(account_id):
+    return asyncio.run(get_tmdb_watchlist_async(account_id))
+
+async def get_tmdb_ratings_async(account_id):
+    # Fetch Movie, TV Show and Episode Ratings
+    tmdb_ratings = await fetch_endpoints_async([
+        (f'https://api.themoviedb.org/3/account/{account_id}/rated/movies', _parse_movie_rating),
+        (f'https://api.themoviedb.org/3/account/{account_id}/rated/tv', _parse_show_rating),
+        (f'https://api.themoviedb.org/3/account/{account_id}/rated/tv/episodes', _parse_episode_rating)
+    ])
+
+    return tmdb_ratings
+
 def get_tmdb_ratings(account_id):
-    # Fetch Movie Ratings
-    movie_ratings = []
-    page = 1
-    total_pages = 1
-
-    while page <= total_pages:
-        url = f'https://api.themoviedb.org/3/account/{account_id}/rated/movies?page={page}'
-        results, total_pages, _ = fetch_data(url)
-        
-        for movie in results:
-            movie_ratings.append({'Title': movie['title'], 'Year': movie.get('release_date')[:4] if movie.get('release_date') else None, 'Rating': movie['rating'], 'TMDB_ID': movie['id'], 'Type': 'movie'})
-        
-        page += 1
-
-    # Fetch TV Show Ratings
-    show_ratings = []
-    page = 1
-    total_pages = 1
-
-    while page <= total_pages:
-        url = f'https://api.themoviedb.org/3/account/{account_id}/rated/tv?page={page}'
-        results, total_pages, _ = fetch_data(url)
-        
-        for show in results:
-            show_ratings.append({'Title': show['name'], 'Year': show.get('first_air_date')[:4] if show.get('first_air_date') else None, 'Rating': show['rating'], 'TMDB_ID': show['id'], 'Type': 'show'})
-        
-        page += 1
-
-    # Fetch Episode Ratings
-    episode_ratings = []
-    page = 1
-    total_pages = 1
-
-    while page <= total_pages:
-        url = f'https://api.themoviedb.org/3/account/{account_id}/rated/tv/episodes?page={page}'
-        results, total_pages, _ = fetch_data(url)
-        
-        for episode in results:
-            show_id = episode['show_id']
-            response = EH.make_tmdb_request(f'https://api.themoviedb.org/3/tv/{show_id}')
-            show_info = json.loads(response.text)
-            show_name = show_info.get('name', 'Show Name Not Found')
-            episode_title = f"{show_name}: {episode.get('name', 'Episode Name Not Found')}"
-            episode_ratings.append({
-                'Title': episode_title,
-                'Year': episode.get('air_date', '')[:4] if episode.get('air_date') else None,
-                'Rating': episode.get('rating'),
-                'TMDB_ID': episode.get('id'),
-                'Season': episode.get('season_number'),
-                'Episode': episode.get('episode_number'),
-                'ShowID': show_id,
-                'Type': 'episode'
-            })
-            
-        page += 1
-
-    tmdb_ratings = movie_ratings + show_ratings + episode_ratings
-
-    return tmdb_ratings
\ No newline at end of file
+    return asyncio.run(get_tmdb_ratings_async(account_id))
\ No newline at end of file
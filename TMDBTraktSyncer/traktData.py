@@ -1,23 +1,58 @@
 import json
+import asyncio
 import urllib.parse
-import datetime
-import sys
-from pathlib import Path
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from TMDBTraktSyncer import errorHandling as EH
-from TMDBTraktSyncer import errorLogger as EL
+from TMDBTraktSyncer import verifyCredentials as VC
+from TMDBTraktSyncer import metadataCache as MC
+from TMDBTraktSyncer import deltaSync as DS
+from TMDBTraktSyncer import asyncRequests as AR
+from TMDBTraktSyncer import mediaItem as MI
+from TMDBTraktSyncer import timestamps as TS
 
-def get_trakt_encoded_username():
-    # Process Trakt Ratings and Comments
-    response = EH.make_trakt_request('https://api.trakt.tv/users/me')
-    json_data = json.loads(response.text)
-    username_slug = json_data['ids']['slug']
+# Number of history pages fetched at the same time
+PAGE_WORKERS = 4
+
+async def get_trakt_encoded_username_async():
+    async def fetch():
+        response = await AR.make_trakt_request_async('https://api.trakt.tv/users/me')
+        json_data = json.loads(response.text)
+        return json_data['ids']['slug']
+
+    # Cache the username slug per access token
+    _, _, trakt_access_token, _, _ = VC.prompt_get_credentials()
+    username_slug = await MC.cache.get_or_fetch_async(MC.token_key('trakt_username', trakt_access_token), fetch, MC.USERNAME_TTL)
     encoded_username = urllib.parse.quote(username_slug)
     return encoded_username
 
-def get_trakt_watchlist(encoded_username):  
+def get_trakt_encoded_username():
+    return asyncio.run(get_trakt_encoded_username_async())
+
+async def get_trakt_last_activities_async():
+    # Get the timestamps of the latest changes per category, None if unavailable
+    response = await AR.make_trakt_request_async('https://api.trakt.tv/sync/last_activities')
+    if not response:
+        return None
+    return json.loads(response.text)
+
+def get_trakt_last_activities():
+    return asyncio.run(get_trakt_last_activities_async())
+
+async def get_trakt_delta_state_async(encoded_username, last_activities=None):
+    """
+    Compare /sync/last_activities with the snapshot of the previous run.
+
+    :param last_activities: /sync/last_activities already fetched by the caller, fetched here if None.
+    :return: deltaSync.DeltaState used to fetch only the categories that changed.
+    """
+    if last_activities is None:
+        last_activities = await get_trakt_last_activities_async()
+    return DS.DeltaState(encoded_username, last_activities)
+
+def get_trakt_delta_state(encoded_username, last_activities=None):
+    return asyncio.run(get_trakt_delta_state_async(encoded_username, last_activities))
+
+async def get_trakt_watchlist_async(encoded_username):
     # Get Trakt Watchlist Items
-    response = EH.make_trakt_request(f'https://api.trakt.tv/users/{encoded_username}/watchlist?sort=added,asc')
+    response = await AR.make_trakt_request_async(f'https://api.trakt.tv/users/{encoded_username}/watchlist?sort=added,asc')
     json_data = json.loads(response.text)
 
     trakt_watchlist = []
@@ -27,33 +62,34 @@ def get_trakt_watchlist(encoded_username):
             movie = item.get('movie')
             tmdb_movie_id = movie.get('ids', {}).get('tmdb')
             trakt_movie_id = movie.get('ids', {}).get('trakt')
-            trakt_watchlist.append({'Title': movie.get('title'), 'Year': movie.get('year'), "TMDB_ID": tmdb_movie_id, 'TraktID': trakt_movie_id, 'Date_Added': item.get('listed_at'), 'Type': 'movie'})
+            trakt_watchlist.append(MI.MediaItem(MI.MOVIE, tmdb_id=tmdb_movie_id, trakt_id=trakt_movie_id, title=movie.get('title'), year=movie.get('year'), date_added=TS.parse_iso8601(item.get('listed_at'))))
         elif item['type'] == 'show':
             show = item.get('show')
             tmdb_show_id = show.get('ids', {}).get('tmdb')
             trakt_show_id = show.get('ids', {}).get('trakt')
-            trakt_watchlist.append({'Title': show.get('title'), 'Year': show.get('year'), "TMDB_ID": tmdb_show_id, 'TraktID': trakt_show_id, 'Date_Added': item.get('listed_at'), 'Type': 'show'})
+            trakt_watchlist.append(MI.MediaItem(MI.SHOW, tmdb_id=tmdb_show_id, trakt_id=trakt_show_id, title=show.get('title'), year=show.get('year'), date_added=TS.parse_iso8601(item.get('listed_at'))))
     
     return trakt_watchlist
 
-def get_trakt_ratings(encoded_username):
+def get_trakt_watchlist(encoded_username):
+    return asyncio.run(get_trakt_watchlist_async(encoded_username))
+
+async def get_trakt_ratings_async(encoded_username):
     # Get Trakt Ratings
-    response = EH.make_trakt_request(f'https://api.trakt.tv/users/{encoded_username}/ratings')
+    response = await AR.make_trakt_request_async(f'https://api.trakt.tv/users/{encoded_username}/ratings')
     json_data = json.loads(response.text)
 
-    movie_ratings = []
-    show_ratings = []
-    episode_ratings = []
+    trakt_ratings = []
 
     for item in json_data:
         if item['type'] == 'movie':
             movie = item.get('movie')
             movie_id = movie.get('ids', {}).get('tmdb')
-            movie_ratings.append({'Title': movie.get('title'), 'Year': movie.get('year'), 'Rating': item.get('rating'), "TMDB_ID": movie_id, 'Date_Added': item.get('rated_at'), 'Type': 'movie'})
+            trakt_ratings.append(MI.MediaItem(MI.MOVIE, tmdb_id=movie_id, title=movie.get('title'), year=movie.get('year'), rating=item.get('rating'), date_added=TS.parse_iso8601(item.get('rated_at'))))
         elif item['type'] == 'show':
             show = item.get('show')
             show_id = show.get('ids', {}).get('tmdb')
-            show_ratings.append({'Title': show.get('title'), 'Year': show.get('year'), 'Rating': item.get('rating'), "TMDB_ID": show_id, 'Date_Added': item.get('rated_at'), 'Type': 'show'})
+            trakt_ratings.append(MI.MediaItem(MI.SHOW, tmdb_id=show_id, title=show.get('title'), year=show.get('year'), rating=item.get('rating'), date_added=TS.parse_iso8601(item.get('rated_at'))))
         elif item['type'] == 'episode':
             show = item.get('show')
             show_title = show.get('title')
@@ -61,83 +97,192 @@ def get_trakt_ratings(encoded_username):
             episode = item.get('episode')
             episode_id = episode.get('ids', {}).get('tmdb')
             episode_title = f'{show_title}: {episode.get("title")}'
-            episode_ratings.append({
-                'Title': episode_title,
-                'Year': episode.get('year'),
-                'Rating': item.get('rating'),
-                "TMDB_ID": episode_id,
-                'Season': episode.get('season'),
-                'Episode': episode.get('number'),
-                'TMDB_ShowID': show_tmdb_id,
-                'Type': 'episode'
-            })
-
-    trakt_ratings = movie_ratings + show_ratings + episode_ratings
+            trakt_ratings.append(MI.MediaItem(
+                MI.EPISODE,
+                tmdb_id=episode_id,
+                title=episode_title,
+                year=episode.get('year'),
+                rating=item.get('rating'),
+                show_tmdb_id=show_tmdb_id,
+                season=episode.get('season'),
+                episode=episode.get('number')
+            ))
     
     return trakt_ratings
     
-def get_trakt_watch_history(encoded_username):
-    # Get Trakt Watch History
-    response = EH.make_trakt_request(f'https://api.trakt.tv/users/{encoded_username}/history?limit=100')
-    json_data = json.loads(response.text)
-    total_pages = response.headers.get('X-Pagination-Page-Count')
+def get_trakt_ratings(encoded_username):
+    return asyncio.run(get_trakt_ratings_async(encoded_username))
+    
+# Watch history sources: 'watched' uses the aggregated /sync/watched endpoints,
+# 'history' walks every play of the full /history endpoint
+HISTORY_SOURCES = ('watched', 'history')
 
-    watched_movies = []
-    watched_shows = []
-    watched_episodes = []
-    seen_ids = set()
+def is_show_completed(show_status, aired_episodes, watched_episode_count):
+    """
+    A show counts as watched when its status is ended or cancelled AND at least 80% of its aired episodes were watched.
+    """
+    if not show_status or aired_episodes is None:
+        return False
+    return (show_status.lower() in ['ended', 'cancelled', 'canceled']) and (watched_episode_count >= 0.8 * int(aired_episodes))
 
-    for page in range(1, int(total_pages) + 1):
-        response = EH.make_trakt_request(f'https://api.trakt.tv/users/{encoded_username}/history?extended=full', params={'page': page, 'limit': 100})
-        json_data = json.loads(response.text)
+class WatchedIndex:
+    """
+    Compact fold of a watch history, for callers that only need to know what was watched.
 
-        for item in json_data:
+    Pages are folded one at a time into a set of (type, tmdb_id) pairs for movies and episodes,
+    plus per-show counters of unique watched (season, number) pairs, so memory depends on the
+    size of the library rather than on the number of plays. Show completion is decided once
+    all pages were added.
+    """
+    def __init__(self):
+        self.ids = set()
+        # Trakt show id -> (tmdb id, status, aired episodes)
+        self.shows = {}
+        # Trakt show id -> set of season * 10000 + episode number
+        self.show_episodes = {}
+
+    def add_movie(self, movie):
+        tmdb_movie_id = (movie or {}).get('ids', {}).get('tmdb')
+        if tmdb_movie_id:
+            self.ids.add(('movie', tmdb_movie_id))
+
+    def add_show(self, show):
+        trakt_show_id = show.get('ids', {}).get('trakt')
+        if trakt_show_id and trakt_show_id not in self.shows:
+            self.shows[trakt_show_id] = (show.get('ids', {}).get('tmdb'), show.get('status'), show.get('aired_episodes'))
+        return trakt_show_id
+
+    def add_episode(self, trakt_show_id, season_number, episode_number, tmdb_episode_id=None):
+        if trakt_show_id and season_number is not None and episode_number is not None:
+            self.show_episodes.setdefault(trakt_show_id, set()).add(season_number * 10000 + episode_number)
+        if tmdb_episode_id:
+            self.ids.add(('episode', tmdb_episode_id))
+
+    def add_history_page(self, page):
+        """
+        Fold one page of the /history endpoint.
+        """
+        for item in page:
             if item['type'] == 'movie':
-                movie = item.get('movie')
-                tmdb_movie_id = movie.get('ids', {}).get('tmdb')
-                trakt_movie_id = movie.get('ids', {}).get('trakt')
-                if trakt_movie_id and trakt_movie_id not in seen_ids:
-                    watched_movies.append({'Title': movie.get('title'), 'Year': movie.get('year'), 'TMDB_ID': tmdb_movie_id, 'TraktID': trakt_movie_id, 'WatchedAt': item.get('watched_at'), 'Type': 'movie'})
-                    seen_ids.add(trakt_movie_id)
+                self.add_movie(item.get('movie'))
             elif item['type'] == 'episode':
-                show = item.get('show')
-                tmdb_show_id = show.get('ids', {}).get('tmdb')
-                trakt_show_id = show.get('ids', {}).get('trakt')
-                show_status = show.get('status')
-                aired_episodes = show.get('aired_episodes')
-                
-                if trakt_show_id and trakt_show_id not in seen_ids:
-                    watched_shows.append({'Title': show.get('title'), 'Year': show.get('year'), 'TMDB_ID': tmdb_show_id, 'TraktID': trakt_show_id, 'ShowStatus': show_status, 'AiredEpisodes': aired_episodes, 'WatchedAt': item.get('watched_at'), 'Type': 'show'})
-                    seen_ids.add(trakt_show_id)
-
-                show_title = show.get('title')
-                episode = item.get('episode')
-                season_number = episode.get('season')
-                episode_number = episode.get('number')
-                tmdb_episode_id = episode.get('ids', {}).get('tmdb')
-                trakt_episode_id = episode.get('ids', {}).get('trakt')
-                episode_title = f'{show_title}: {episode.get("title")}'
-                episode_year = datetime.datetime.strptime(episode.get('first_aired'), "%Y-%m-%dT%H:%M:%S.%fZ").year if episode.get('first_aired') else None
-                watched_at = item.get('watched_at')
-                if trakt_episode_id and trakt_episode_id not in seen_ids:
-                    watched_episodes.append({'Title': episode_title, 'Year': episode_year, 'TMDB_ID': tmdb_episode_id, 'TraktID': trakt_episode_id, 'TraktShowID': trakt_show_id, 'SeasonNumber': season_number, 'EpisodeNumber': episode_number, 'WatchedAt': watched_at, 'Type': 'episode'})
-                    seen_ids.add(trakt_episode_id)
-
-    # Filter watched_shows for completed shows where 80% or more of the show has been watched AND where the show's status is "ended" or "cancelled"
-    filtered_watched_shows = []
-    for show in watched_shows:
-        trakt_show_id = show['TraktID']
-        show_status = show['ShowStatus']
-        aired_episodes = show['AiredEpisodes']
-        episode_numbers = [episode['EpisodeNumber'] for episode in watched_episodes if episode['Type'] == 'episode' and episode['TraktShowID'] == trakt_show_id]
-        unique_watched_episode_count = len(episode_numbers)
-        
-        if (show_status.lower() in ['ended', 'cancelled', 'canceled']) and (unique_watched_episode_count >= 0.8 * int(aired_episodes)):
-            filtered_watched_shows.append(show)
-
-    # Update watched_shows with the filtered results
-    watched_shows = filtered_watched_shows
-
-    trakt_watch_history = watched_movies + watched_shows + watched_episodes
-    
-    return trakt_watch_history
\ No newline at end of file
+                trakt_show_id = self.add_show(item.get('show') or {})
+                episode = item.get('episode') or {}
+                self.add_episode(trakt_show_id, episode.get('season'), episode.get('number'), episode.get('ids', {}).get('tmdb'))
+
+    def add_watched_movies(self, json_data):
+        """
+        Fold the /sync/watched/movies response.
+        """
+        for item in json_data:
+            self.add_movie(item.get('movie'))
+
+    def add_watched_shows(self, json_data):
+        """
+        Fold the /sync/watched/shows?extended=full response.
+        """
+        for item in json_data:
+            trakt_show_id = self.add_show(item.get('show') or {})
+            for season in item.get('seasons') or []:
+                for episode in season.get('episodes') or []:
+                    if episode.get('plays'):
+                        self.add_episode(trakt_show_id, season.get('number'), episode.get('number'))
+
+    def add_episode_ids(self, trakt_show_id, episode_ids):
+        """
+        Add the TMDB ids of a show's watched episodes.
+
+        :param episode_ids: dict mapping str(season * 10000 + number) to the episode's TMDB id, see get_show_episode_ids_async.
+        """
+        for code in self.show_episodes.get(trakt_show_id, ()):
+            tmdb_episode_id = episode_ids.get(str(code))
+            if tmdb_episode_id:
+                self.ids.add(('episode', tmdb_episode_id))
+
+    def watched_ids(self):
+        """
+        :return: List of [type, tmdb_id] pairs of watched movies, completed shows and watched episodes.
+        """
+        watched = set(self.ids)
+        for trakt_show_id, (tmdb_show_id, show_status, aired_episodes) in self.shows.items():
+            if tmdb_show_id and is_show_completed(show_status, aired_episodes, len(self.show_episodes.get(trakt_show_id, ()))):
+                watched.add(('show', tmdb_show_id))
+        return [list(pair) for pair in watched]
+
+async def iter_trakt_history_pages_async(encoded_username):
+    """
+    Yield the pages of the /history endpoint in order.
+
+    At most PAGE_WORKERS pages are fetched at a time and each window is released once it was
+    consumed, so the whole history is never held in memory.
+    """
+    response = await AR.make_trakt_request_async(f'https://api.trakt.tv/users/{encoded_username}/history?limit=100')
+    total_pages = int(response.headers.get('X-Pagination-Page-Count') or 1)
+
+    async def fetch_page(page):
+        response = await AR.make_trakt_request_async(f'https://api.trakt.tv/users/{encoded_username}/history?extended=full', params={'page': page, 'limit': 100})
+        return json.loads(response.text)
+
+    for first_page in range(1, total_pages + 1, PAGE_WORKERS):
+        last_page = min(first_page + PAGE_WORKERS, total_pages + 1)
+        for page in await AR.gather_or_cancel(*(fetch_page(page) for page in range(first_page, last_page))):
+            yield page
+
+async def get_show_episode_ids_async(trakt_show_id, watched_codes=()):
+    """
+    Return the TMDB episode ids of a show, keyed by str(season * 10000 + number).
+
+    /sync/watched/shows has no episode ids, so they are read from the show's seasons and
+    cached. The cached map is refreshed when one of watched_codes is missing from it, e.g. an
+    episode that aired since it was saved.
+    """
+    key = f'trakt_show_episodes:{trakt_show_id}'
+    cached = MC.cache.get(key)
+    if cached is not None and all(str(code) in cached for code in watched_codes):
+        return cached
+
+    response = await AR.make_trakt_request_async(f'https://api.trakt.tv/shows/{trakt_show_id}/seasons?extended=episodes')
+    if not response:
+        return cached or {}
+
+    episode_ids = {}
+    for season in json.loads(response.text):
+        for episode in season.get('episodes') or []:
+            if season.get('number') is not None and episode.get('number') is not None:
+                # Episodes without a TMDB id are kept as None so they don't trigger a refresh
+                episode_ids[str(season['number'] * 10000 + episode['number'])] = (episode.get('ids') or {}).get('tmdb')
+    MC.cache.set(key, episode_ids, MC.SHOW_TTL)
+    return episode_ids
+
+async def get_trakt_watched_ids_async(encoded_username, source='watched'):
+    """
+    Stream the watch history into a WatchedIndex and return what was watched.
+
+    :param encoded_username: URL encoded Trakt username slug.
+    :param source: 'watched' or 'history', see HISTORY_SOURCES. Both return the same pairs.
+    :return: List of [type, tmdb_id] pairs, see WatchedIndex.watched_ids.
+    """
+    index = WatchedIndex()
+    if source == 'history':
+        async for page in iter_trakt_history_pages_async(encoded_username):
+            index.add_history_page(page)
+    else:
+        movies_response, shows_response = await asyncio.gather(
+            AR.make_trakt_request_async('https://api.trakt.tv/sync/watched/movies'),
+            AR.make_trakt_request_async('https://api.trakt.tv/sync/watched/shows?extended=full')
+        )
+        index.add_watched_movies(json.loads(movies_response.text))
+        index.add_watched_shows(json.loads(shows_response.text))
+
+        # Look up the episode ids the aggregate leaves out, a bounded number of shows at a time
+        semaphore = asyncio.Semaphore(PAGE_WORKERS)
+
+        async def resolve(trakt_show_id, watched_codes):
+            async with semaphore:
+                index.add_episode_ids(trakt_show_id, await get_show_episode_ids_async(trakt_show_id, watched_codes))
+
+        await AR.gather_or_cancel(*(resolve(trakt_show_id, codes) for trakt_show_id, codes in index.show_episodes.items()))
+    return index.watched_ids()
+
+def get_trakt_watched_ids(encoded_username, source='watched'):
+    return asyncio.run(get_trakt_watched_ids_async(encoded_username, source))
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+from TMDBTraktSyncer import errorLogger as EL
+from TMDBTraktSyncer import metadataCache as MC
+from TMDBTraktSyncer import syncPlanner as SP
+from TMDBTraktSyncer import deltaSync as DS
+from TMDBTraktSyncer import timestamps as TS
+
+# Bumped when the record format changes, older journals are ignored
+JOURNAL_VERSION = 2
+
+# An interrupted sync is resumed from its journal for this long, after that the libraries are fetched again
+JOURNAL_MAX_AGE = 24 * 60 * 60
+
+# Trakt writes of each last_activities category, a change of the category is explained by them
+ACTIVITY_OPERATIONS = {
+    'watchlist': ('watchlist_add', 'watchlist_remove'),
+    'ratings': ('ratings_set',)
+}
+
+# Allowed difference between the Trakt server clock and the local clock
+ACTIVITY_CLOCK_SKEW = 120
+
+journal_path = os.path.join(MC.cache_directory, 'write_journal.jsonl')
+
+def operation_key(operation, item):
+    """
+    Return the (service, op, (type, tmdb_id)) key of a planned write, e.g. ('tmdb', 'watchlist_add', ('movie', 603)).
+    """
+    service, op = operation.split('_', 1)
+    return (service, op, item.key)
+
+def _activities_unchanged(planned, current, records):
+    """
+    Return True if the Trakt library did not change since the plan was computed, apart from the writes of the journal.
+
+    A changed category is only accepted if every new timestamp is no later than the last confirmed
+    Trakt write of that category. Missing last_activities on either side cannot be checked and count as changed.
+    """
+    if not planned or not current:
+        return False
+    for category, ops in ACTIVITY_OPERATIONS.items():
+        before = DS.activity_signature(planned, category)
+        after = DS.activity_signature(current, category)
+        if before == after:
+            continue
+        written_at = [record.get('at') or 0 for record in records if record.get('service') == 'trakt' and record.get('op') in ops]
+        if not written_at:
+            return False
+        for old, new in zip(before, after):
+            changed_at = TS.parse_iso8601(new)
+            if new != old and (changed_at is None or changed_at > max(written_at) + ACTIVITY_CLOCK_SKEW):
+                return False
+    return True
+
+class WriteJournal:
+    """
+    Append-only journal of the write phase of a sync.
+
+    The first line holds the computed SyncPlan and the sync options it was computed for, each
+    following line confirms one completed write. A run that is interrupted (Ctrl-C, an error,
+    a reboot) leaves the journal behind, and the next run with the same options resumes the
+    plan without fetching the libraries again, skipping the writes already confirmed. A run
+    that reaches the end removes the journal. When the current Trakt last_activities are given,
+    the journal is only resumed while Trakt shows no other changes than the journaled writes,
+    otherwise the libraries are fetched again.
+
+    The file is line buffered, so every confirmed write is in the file as soon as it is
+    recorded. A line cut off by a crash is ignored when the journal is read back.
+    """
+    def __init__(self, file_path=journal_path):
+        self.file_path = file_path
+        self._file = None
+        self._partial_line = False
+
+    def _read_records(self):
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError):
+            EL.logger.error("Could not read the write journal, doing a full sync.", exc_info=True)
+            return []
+        self._partial_line = bool(lines) and not lines[-1].endswith('\n')
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Partial line of an interrupted write
+                continue
+        return records
+
+    def resume(self, options, activities=None):
+        """
+        Return the unfinished part of an interrupted sync, or None if there is nothing to resume.
+
+        :param options: Dict of the sync options of this run, a journal written with other options is not resumed.
+        :param activities: Current Trakt /sync/last_activities to check the journal against, or None to skip the check.
+        :return: SyncPlan without the confirmed writes, or None.
+        """
+        records = self._read_records()
+        if not records:
+            return None
+        header = records[0]
+        if (not isinstance(header, dict) or header.get('event') != 'plan' or header.get('version') != JOURNAL_VERSION
+                or header.get('options') != options or time.time() - header.get('created_at', 0) > JOURNAL_MAX_AGE):
+            return None
+
+        try:
+            plan = SP.SyncPlan.from_dict(header['plan'])
+        except (KeyError, TypeError, ValueError):
+            EL.logger.error("Could not read the plan in the write journal, doing a full sync.", exc_info=True)
+            return None
+
+        done = [record for record in records[1:] if isinstance(record, dict) and record.get('event') == 'done']
+        if activities is not None and not _activities_unchanged(header.get('activities'), activities, done):
+            print('Trakt Library Changed Since The Interrupted Sync, Fetching Again')
+            return None
+
+        confirmed = set()
+        for record in done:
+            confirmed.add((record.get('service'), record.get('op'), (record.get('type'), record.get('tmdb_id'))))
+
+        for operation in SP.OPERATIONS:
+            items = getattr(plan, operation)
+            setattr(plan, operation, [item for item in items if operation_key(operation, item) not in confirmed])
+
+        # Keep appending to the same journal, after the end of a line cut off by a crash
+        self._open('a')
+        if self._partial_line:
+            self._file.write('\n')
+        return plan
+
+    def start(self, plan, options, activities=None):
+        """
+        Begin a new journal for a freshly computed plan, replacing any previous journal.
+
+        :param activities: Trakt /sync/last_activities the plan was computed with, checked before the journal is resumed.
+        """
+        self._open('w')
+        header = {'event': 'plan', 'version': JOURNAL_VERSION, 'created_at': time.time(), 'options': options, 'plan': plan.to_dict()}
+        if activities is not None:
+            header['activities'] = activities
+        self._write(header)
+
+    def record(self, operation, item):
+        """
+        Confirm that the write of an item for an operation in syncPlanner.OPERATIONS succeeded.
+        """
+        service, op, (item_type, tmdb_id) = operation_key(operation, item)
+        self._write({'event': 'done', 'service': service, 'op': op, 'type': item_type, 'tmdb_id': tmdb_id, 'at': time.time()})
+
+    def finish(self):
+        """
+        Remove the journal after the whole plan was processed.
+        """
+        self.close()
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self, mode):
+        self.close()
+        directory = os.path.dirname(self.file_path)
+        # Empty for a bare file name in the working directory, e.g. the journal of --apply plan.json
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Line buffered, each record reaches the file when it is written
+        self._file = open(self.file_path, mode, encoding='utf-8', buffering=1)
+
+    def _write(self, record):
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        except OSError:
+            EL.logger.error("Failed to write to the write journal.", exc_info=True)
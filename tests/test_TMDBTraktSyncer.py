@@ -0,0 +1,30 @@
+import asyncio
+from TMDBTraktSyncer import TMDBTraktSyncer as M
+
+def test_libraries_are_read_together_and_a_failure_stops_the_other_side(monkeypatch):
+    events = []
+
+    async def read_trakt_data(*args):
+        events.append('trakt started')
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append('trakt cancelled')
+            raise
+
+    async def read_tmdb_data(*args):
+        events.append('tmdb started')
+        await asyncio.sleep(0)
+        raise ConnectionError('TMDB down')
+
+    monkeypatch.setattr(M, 'read_trakt_data', read_trakt_data)
+    monkeypatch.setattr(M, 'read_tmdb_data', read_tmdb_data)
+
+    async def read():
+        try:
+            await M.read_libraries(True, True, True)
+        except ConnectionError:
+            events.append('raised')
+
+    asyncio.run(read())
+    assert events == ['trakt started', 'tmdb started', 'trakt cancelled', 'raised']
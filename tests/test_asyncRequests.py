@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from TMDBTraktSyncer import asyncRequests as AR
+from TMDBTraktSyncer import errorHandling as EH
+from TMDBTraktSyncer import rateLimiter as RL
+
+@pytest.fixture(autouse=True)
+def executor():
+    yield
+    AR.shutdown_executor()
+
+def retrying_steps(log):
+    """
+    Request steps that fail once with a network error, wait and succeed, logging what the driver sent back.
+    """
+    attempts = []
+
+    def send():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise ConnectionError('reset')
+        return 'response'
+
+    while True:
+        log.append(('acquire', (yield ('acquire', RL.TokenBucket(rate=1, capacity=1)))))
+        try:
+            response = yield ('send', send)
+        except ConnectionError:
+            log.append(('error',))
+            log.append(('sleep', (yield ('sleep', 0))))
+            continue
+        return response
+
+def test_async_driver_behaves_like_the_sync_driver():
+    sync_log = []
+    async_log = []
+    assert EH.run_request_steps(retrying_steps(sync_log)) == 'response'
+    assert asyncio.run(AR.run_request_steps_async(retrying_steps(async_log))) == 'response'
+    assert async_log == sync_log == [('acquire', 0.0), ('error',), ('sleep', None), ('acquire', 0.0)]
+
+def test_cancelled_request_closes_its_steps():
+    closed = []
+
+    def steps():
+        try:
+            yield ('sleep', 10)
+        finally:
+            closed.append(True)
+
+    async def cancel():
+        task = asyncio.ensure_future(AR.run_request_steps_async(steps()))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert closed == [True]
+
+def test_gather_or_cancel_returns_the_results_in_order():
+    async def value(result, delay):
+        await asyncio.sleep(delay)
+        return result
+
+    assert asyncio.run(AR.gather_or_cancel(value('slow', 0.02), value('fast', 0))) == ['slow', 'fast']
+
+def test_gather_or_cancel_stops_the_others_before_raising():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError('failed')
+
+    async def gather():
+        with pytest.raises(ValueError):
+            await AR.gather_or_cancel(slow(), failing())
+        assert cancelled == [True]
+
+    asyncio.run(gather())
@@ -0,0 +1,62 @@
+import pytest
+from TMDBTraktSyncer import checkVersion as CV
+
+@pytest.fixture
+def pypi(tmp_path, monkeypatch):
+    """
+    Installed version 1.0.0 with PyPI answering 1.2.0, counting the queries.
+    """
+    class FakePypi:
+        queries = 0
+        latest_version = '1.2.0'
+
+    def query_latest_version(timeout):
+        FakePypi.queries += 1
+        return FakePypi.latest_version
+
+    monkeypatch.setattr(CV, 'version_cache_path', str(tmp_path / 'version_check.json'))
+    monkeypatch.setattr(CV, '_query_latest_version', query_latest_version)
+    monkeypatch.setattr(CV, 'get_installed_version', lambda: '1.0.0')
+    return FakePypi
+
+def test_newer_release_is_reported(pypi, capsys):
+    CV.checkVersion()
+    CV.print_version_notice()
+    assert 'A new version of TMDBTraktSyncer is available: 1.2.0 (installed: 1.0.0).' in capsys.readouterr().out
+
+def test_latest_release_is_looked_up_once_a_day(pypi, monkeypatch):
+    CV.checkVersion()
+    CV.print_version_notice()
+    CV.checkVersion()
+    assert CV._check_thread is None
+    assert CV._latest_version == '1.2.0'
+    assert pypi.queries == 1
+
+    now = CV.time.time()
+    monkeypatch.setattr(CV.time, 'time', lambda: now + CV.VERSION_CACHE_TTL + 1)
+    CV.checkVersion()
+    CV.print_version_notice()
+    assert pypi.queries == 2
+
+def test_unknown_installed_version_is_silent(pypi, monkeypatch, capsys):
+    monkeypatch.setattr(CV, 'get_installed_version', lambda: None)
+    CV.checkVersion()
+    CV.print_version_notice()
+    assert pypi.queries == 0
+    assert capsys.readouterr().out == ''
+
+def test_up_to_date_install_is_silent(pypi, capsys):
+    pypi.latest_version = '1.0.0'
+    CV.checkVersion()
+    CV.print_version_notice()
+    assert capsys.readouterr().out == ''
+
+def test_notice_waits_briefly_for_a_running_check(pypi, monkeypatch, capsys):
+    def slow_query(timeout):
+        CV.time.sleep(0.2)
+        return '1.2.0'
+
+    monkeypatch.setattr(CV, '_query_latest_version', slow_query)
+    CV.checkVersion()
+    CV.print_version_notice()
+    assert '1.2.0' in capsys.readouterr().out
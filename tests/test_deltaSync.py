@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from TMDBTraktSyncer import deltaSync as DS
+from TMDBTraktSyncer import mediaItem as MI
+
+def last_activities(watchlisted='2024-01-01T00:00:00.000Z', rated='2024-01-01T00:00:00.000Z', watched='2024-01-01T00:00:00.000Z'):
+    return {
+        'movies': {'watchlisted_at': watchlisted, 'rated_at': rated, 'watched_at': watched},
+        'shows': {'watchlisted_at': watchlisted, 'rated_at': rated},
+        'seasons': {'watchlisted_at': watchlisted, 'rated_at': rated},
+        'episodes': {'watchlisted_at': watchlisted, 'rated_at': rated, 'watched_at': watched}
+    }
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return str(tmp_path / 'cache' / 'trakt_snapshot.json')
+
+def watchlist():
+    return [MI.MediaItem(MI.MOVIE, tmdb_id=603, title='The Matrix', date_added=1700000000)]
+
+def run_sync(snapshot, activities, username='user'):
+    """
+    Run one sync's worth of delta fetches and return (state, fetched categories, items).
+    """
+    fetched = []
+
+    def fetch(category, items):
+        fetched.append(category)
+        return items
+
+    state = DS.DeltaState(username, activities, snapshot)
+    items = {
+        'watchlist': state.fetch('watchlist', fetch, 'watchlist', watchlist()),
+        'ratings': state.fetch('ratings', fetch, 'ratings', []),
+        'history': state.fetch('history', fetch, 'history', [['movie', 603]])
+    }
+    state.save()
+    return state, fetched, items
+
+def test_first_run_fetches_every_category(snapshot):
+    _, fetched, _ = run_sync(snapshot, last_activities())
+    assert fetched == ['watchlist', 'ratings', 'history']
+
+def test_unchanged_categories_are_served_from_the_snapshot(snapshot):
+    run_sync(snapshot, last_activities())
+    _, fetched, items = run_sync(snapshot, last_activities())
+    assert fetched == []
+    assert items['watchlist'] == watchlist()
+    assert items['history'] == [['movie', 603]]
+
+def test_only_changed_categories_are_fetched_again(snapshot):
+    run_sync(snapshot, last_activities())
+    _, fetched, _ = run_sync(snapshot, last_activities(rated='2024-02-01T00:00:00.000Z'))
+    assert fetched == ['ratings']
+
+def test_history_is_refetched_once_the_snapshot_is_a_day_old(snapshot, monkeypatch):
+    run_sync(snapshot, last_activities())
+    now = DS.time.time()
+    monkeypatch.setattr(DS.time, 'time', lambda: now + DS.MAX_SNAPSHOT_AGE['history'] + 1)
+    _, fetched, _ = run_sync(snapshot, last_activities())
+    assert fetched == ['history']
+
+def test_snapshot_of_another_account_is_ignored(snapshot):
+    run_sync(snapshot, last_activities(), username='user')
+    _, fetched, _ = run_sync(snapshot, last_activities(), username='someone-else')
+    assert fetched == ['watchlist', 'ratings', 'history']
+
+def test_without_last_activities_everything_is_fetched_and_nothing_saved(snapshot):
+    import os
+    state, fetched, _ = run_sync(snapshot, None)
+    assert fetched == ['watchlist', 'ratings', 'history']
+    assert not os.path.exists(snapshot)
+
+def test_corrupt_snapshot_falls_back_to_a_full_fetch(snapshot):
+    import os
+    os.makedirs(os.path.dirname(snapshot))
+    with open(snapshot, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    _, fetched, _ = run_sync(snapshot, last_activities())
+    assert fetched == ['watchlist', 'ratings', 'history']
+
+def test_fetch_async_uses_the_same_snapshot(snapshot):
+    run_sync(snapshot, last_activities())
+    state = DS.DeltaState('user', last_activities(), snapshot)
+
+    async def fail():
+        raise AssertionError('unchanged category fetched')
+
+    assert asyncio.run(state.fetch_async('watchlist', fail)) == watchlist()
+
+def test_default_snapshot_path_is_read_when_the_state_is_created(tmp_path, monkeypatch):
+    monkeypatch.setattr(DS, 'snapshot_path', str(tmp_path / 'elsewhere.json'))
+    assert DS.DeltaState('user', None).file_path == str(tmp_path / 'elsewhere.json')
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from TMDBTraktSyncer import errorHandling as EH
+from TMDBTraktSyncer import asyncRequests as AR
+from TMDBTraktSyncer import rateLimiter as RL
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+class FakeTime:
+    """
+    Stand-in for the time module, sleeping advances the clock instantly.
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class FakeSession:
+    """
+    Answers requests with the queued responses and counts what was sent.
+    """
+    def __init__(self):
+        self.responses = []
+        self.sent = 0
+
+    def get(self, url, **kwargs):
+        self.sent += 1
+        return self.responses.pop(0)
+
+    post = get
+
+@pytest.fixture
+def service(monkeypatch):
+    """
+    Fake session and a one token bucket for both services on a fake clock.
+    """
+    clock = FakeTime()
+    monkeypatch.setattr(EH, 'time', clock)
+    monkeypatch.setattr(RL, 'time', clock)
+
+    class Service:
+        session = FakeSession()
+        bucket = RL.TokenBucket(rate=1, capacity=1)
+        slept = clock.slept
+        now = clock.monotonic
+
+    monkeypatch.setattr(EH.HS, 'get_session', lambda name: Service.session)
+    monkeypatch.setattr(EH.RL, 'trakt_bucket', lambda payload=None: Service.bucket)
+    monkeypatch.setattr(EH.RL, 'get_bucket', lambda name: Service.bucket)
+    monkeypatch.setattr(EH, '_deadline', None)
+    return Service
+
+def test_retry_is_not_slept_past_the_deadline(service):
+    service.session.responses.append(FakeResponse(503, {'Retry-After': '30'}))
+    EH.set_deadline(service.now() + 5)
+    assert EH.make_trakt_request('https://api.trakt.tv/sync/ratings', headers={}) is None
+    assert service.session.sent == 1
+    assert service.slept == []
+
+def test_retry_within_the_deadline_is_slept(service):
+    service.session.responses.extend([FakeResponse(502), FakeResponse(200)])
+    EH.set_deadline(service.now() + 60)
+    assert EH.make_tmdb_request('https://api.themoviedb.org/3/movie/1', headers={}).status_code == 200
+    # The retry delay also refilled the token, nothing else was waited for
+    assert service.slept == [1]
+
+def test_rate_limit_wait_past_the_deadline_sends_nothing(service):
+    service.bucket.acquire()
+    EH.set_deadline(service.now() - 1)
+    assert EH.make_tmdb_request('https://api.themoviedb.org/3/movie/1', headers={}) is None
+    assert asyncio.run(AR.make_trakt_request_async('https://api.trakt.tv/sync/ratings', headers={})) is None
+    assert service.session.sent == 0
+    assert service.slept == []
@@ -0,0 +1,51 @@
+import os
+import logging
+import threading
+import pytest
+from TMDBTraktSyncer import errorLogger as EL
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(EL.logger, 'level', EL.logger.level)
+    yield str(tmp_path / 'log.txt')
+    EL.stop_logging()
+
+def test_log_rotates_by_size_and_reads_back_newest_first(log_path, monkeypatch):
+    # Small files so a few records rotate them
+    monkeypatch.setattr(EL, 'LOG_MAX_BYTES', 1000)
+    EL.setup_logging(log_path)
+    for index in range(40):
+        EL.logger.error(f'error {index}')
+    EL.stop_logging()
+
+    files = sorted(os.listdir(os.path.dirname(log_path)))
+    assert files == ['log.1.txt', 'log.2.txt', 'log.3.txt', 'log.txt']
+    assert all(os.path.getsize(path) <= 1000 for path in EL.log_files(log_path))
+
+    entries = EL.read_log_entries(log_path)
+    assert entries[0].endswith('error 39')
+    # Only the records of the kept files remain, still newest first
+    numbers = [int(entry.rsplit(' ', 1)[1]) for entry in entries]
+    assert numbers == sorted(numbers, reverse=True)
+    assert numbers == list(range(39, 39 - len(numbers), -1))
+    assert EL.read_log_entries(log_path, limit=3) == entries[:3]
+
+def test_records_from_many_threads_are_all_written(log_path):
+    EL.setup_logging(log_path)
+
+    def log(thread):
+        for index in range(5):
+            EL.logger.error(f'thread {thread} error {index}')
+        # Below the ERROR level, never written
+        EL.logger.warning(f'thread {thread} warning')
+
+    threads = [threading.Thread(target=log, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    EL.stop_logging()
+
+    entries = EL.read_log_entries(log_path)
+    messages = {entry.split(' - ERROR - ')[1] for entry in entries}
+    assert messages == {f'thread {thread} error {index}' for thread in range(4) for index in range(5)}
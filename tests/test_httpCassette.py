@@ -0,0 +1,154 @@
+import json
+import gzip
+import requests
+import pytest
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from TMDBTraktSyncer import httpCassette as HC
+from TMDBTraktSyncer import httpSession as HS
+
+class FakeStats:
+    def __init__(self):
+        self.sent = 0
+
+    def request_sent(self):
+        self.sent += 1
+
+class FakeAdapter(BaseAdapter):
+    """
+    Answers every request with the next of a list of (status, headers, body) responses.
+    """
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.stats = FakeStats()
+
+    def send(self, request, **kwargs):
+        status, headers, body = self.responses.pop(0)
+        response = Response()
+        response.status_code = status
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = json.dumps(body).encode('utf-8')
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+def session_with(adapter):
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return str(tmp_path / 'cassettes' / 'sync.jsonl.gz')
+
+def record(cassette_path, responses, requests_to_send, settings=None):
+    recorder = HC.CassetteRecorder(cassette_path, settings)
+    session = session_with(HC.RecordingHTTPAdapter(HS.TRAKT, FakeAdapter(responses), recorder))
+    for method, url, kwargs in requests_to_send:
+        session.request(method, url, **kwargs)
+    recorder.close()
+    return recorder
+
+def read_cassette(cassette_path):
+    with gzip.open(cassette_path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+def test_recorded_requests_replay_with_the_same_responses(cassette_path):
+    responses = [
+        (200, {'Content-Type': 'application/json', 'X-Pagination-Page-Count': '2'}, [{'movie': {'ids': {'tmdb': 1}}}]),
+        (200, {'Content-Type': 'application/json'}, [{'movie': {'ids': {'tmdb': 2}}}]),
+        (201, {'Content-Type': 'application/json'}, {'added': {'movies': 1}})
+    ]
+    recorder = record(cassette_path, responses, [
+        ('GET', 'https://api.trakt.tv/sync/watchlist?page=1', {}),
+        ('GET', 'https://api.trakt.tv/sync/watchlist?page=2', {}),
+        ('POST', 'https://api.trakt.tv/sync/watchlist', {'json': {'movies': [{'ids': {'tmdb': 3}}]}})
+    ], settings={'sync_ratings': True})
+    assert recorder.count == 3
+
+    cassette = HC.Cassette(cassette_path)
+    assert cassette.settings == {'sync_ratings': True}
+    session = session_with(HC.ReplayHTTPAdapter(HS.TRAKT, FakeAdapter([]), cassette, realtime=False))
+    first = session.get('https://api.trakt.tv/sync/watchlist?page=1')
+    assert first.json() == [{'movie': {'ids': {'tmdb': 1}}}]
+    assert first.headers['X-Pagination-Page-Count'] == '2'
+    assert session.get('https://api.trakt.tv/sync/watchlist?page=2').json() == [{'movie': {'ids': {'tmdb': 2}}}]
+    written = session.post('https://api.trakt.tv/sync/watchlist', json={'movies': []})
+    assert written.status_code == 201
+    assert written.json() == {'added': {'movies': 1}}
+    assert (cassette.hits, cassette.misses) == (3, 0)
+
+def test_unrecorded_requests_are_answered_with_404(cassette_path):
+    record(cassette_path, [], [])
+    cassette = HC.Cassette(cassette_path)
+    session = session_with(HC.ReplayHTTPAdapter(HS.TRAKT, FakeAdapter([]), cassette, realtime=False))
+    assert session.get('https://api.trakt.tv/users/settings').status_code == 404
+    assert cassette.misses == 1
+
+def test_repeated_requests_get_the_recorded_responses_in_order_then_the_last_again(cassette_path):
+    responses = [(429, {'Retry-After': '1'}, {}), (200, {}, {'attempt': 2})]
+    url = 'https://api.trakt.tv/sync/last_activities'
+    record(cassette_path, responses, [('GET', url, {}), ('GET', url, {})])
+    cassette = HC.Cassette(cassette_path)
+    session = session_with(HC.ReplayHTTPAdapter(HS.TRAKT, FakeAdapter([]), cassette, realtime=False))
+    assert [session.get(url).status_code for _ in range(3)] == [429, 200, 200]
+
+def test_secrets_are_never_written(cassette_path):
+    responses = [(200, {'Set-Cookie': 'session=secret-cookie'}, {'access_token': 'secret-access', 'refresh_token': 'secret-refresh', 'created_at': 1})]
+    record(cassette_path, responses, [(
+        'POST',
+        'https://api.trakt.tv/oauth/token?api_key=secret-key',
+        {
+            'json': {'client_id': 'secret-id', 'client_secret': 'secret-client', 'refresh_token': 'secret-old', 'grant_type': 'refresh_token'},
+            'headers': {'Authorization': 'Bearer secret-bearer', 'trakt-api-key': 'secret-trakt'}
+        }
+    )])
+    content = read_cassette(cassette_path)
+    assert 'secret' not in content.replace('client_secret', '')
+    exchange = json.loads(content.splitlines()[1])
+    assert exchange['path'] == '/oauth/token?api_key=REDACTED'
+    assert json.loads(exchange['request_body'])['grant_type'] == 'refresh_token'
+    assert json.loads(exchange['body']) == {'access_token': 'REDACTED', 'refresh_token': 'REDACTED', 'created_at': 1}
+
+def test_request_path_strips_the_api_root_and_any_base_url_override():
+    assert HC.request_path(HS.TMDB, 'https://api.themoviedb.org/3/movie/603?language=en') == '/3/movie/603?language=en'
+    assert HC.request_path(HS.TMDB, 'http://127.0.0.1:8080/3/movie/603') == '/3/movie/603'
+    HS.set_base_url(HS.TMDB, 'http://127.0.0.1:8080/')
+    try:
+        assert HC.request_path(HS.TMDB, 'http://127.0.0.1:8080/3/movie/603') == '/3/movie/603'
+    finally:
+        HS.set_base_url(HS.TMDB, None)
+
+def test_original_timing_keeps_the_recorded_offsets_and_response_times(cassette_path):
+    record(cassette_path, [], [])
+    cassette = HC.Cassette(cassette_path)
+    exchange = {'offset': 5.0, 'elapsed': 0.5}
+    # Sent before its recorded offset: held until the offset, then answered after the response time
+    assert cassette.answer_at(exchange, cassette.started + 1.0) == pytest.approx(cassette.started + 5.5)
+    # Sent later than recorded: answered after the response time only
+    assert cassette.answer_at(exchange, cassette.started + 8.0) == pytest.approx(cassette.started + 8.5)
+
+def test_truncated_recording_replays_the_complete_exchanges(cassette_path):
+    url = 'https://api.trakt.tv/sync/ratings'
+    record(cassette_path, [(200, {}, {'page': 1})], [('GET', url, {})])
+    with gzip.open(cassette_path, 'rb') as f:
+        data = f.read()
+    # A gzip stream cut off mid-way, as an interrupted recording leaves it
+    with open(cassette_path, 'wb') as f:
+        f.write(gzip.compress(data + b'{"service":"trakt","method":"GET","pa')[:-8])
+    cassette = HC.Cassette(cassette_path)
+    assert cassette.next_exchange(HS.TRAKT, 'GET', '/sync/ratings')['status'] == 200
+
+def test_files_that_are_not_cassettes_are_refused(tmp_path):
+    file_path = tmp_path / 'other.gz'
+    with gzip.open(file_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'version': HC.CASSETTE_VERSION + 1}) + '\n')
+    with pytest.raises(ValueError):
+        HC.Cassette(str(file_path))
@@ -0,0 +1,62 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from TMDBTraktSyncer import httpSession as HS
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setattr(HS, '_sessions', {})
+    monkeypatch.setattr(HS, '_stats', {})
+    yield
+    HS.close_sessions()
+
+def test_requests_reuse_the_pooled_connection(server, sessions):
+    session = HS.get_session(HS.TMDB)
+    for _ in range(5):
+        assert session.get(server + '/3/movie/1').status_code == 200
+    assert HS.get_connection_stats()[HS.TMDB] == {'requests': 5, 'connections_opened': 1, 'connections_reused': 4}
+
+def test_each_service_keeps_its_own_session_and_counters(server, sessions):
+    assert HS.get_session(HS.TRAKT) is HS.get_session(HS.TRAKT)
+    assert HS.get_session(HS.TRAKT) is not HS.get_session(HS.TMDB)
+    HS.get_session(HS.TRAKT).get(server + '/sync/watchlist')
+    stats = HS.get_connection_stats()
+    assert stats[HS.TRAKT]['requests'] == 1
+    assert stats[HS.TMDB]['requests'] == 0
+
+def test_resolve_url_swaps_the_api_root_for_the_base_url(monkeypatch):
+    monkeypatch.setattr(HS, '_base_urls', {})
+    for variable in HS.BASE_URL_VARIABLES.values():
+        monkeypatch.delenv(variable, raising=False)
+    assert HS.resolve_url(HS.TRAKT, 'https://api.trakt.tv/sync/ratings') == 'https://api.trakt.tv/sync/ratings'
+    HS.set_base_url(HS.TRAKT, 'http://127.0.0.1:8000/trakt/')
+    assert HS.resolve_url(HS.TRAKT, 'https://api.trakt.tv/sync/ratings') == 'http://127.0.0.1:8000/trakt/sync/ratings'
+    assert HS.resolve_url(HS.TMDB, 'https://api.themoviedb.org/3/movie/1') == 'https://api.themoviedb.org/3/movie/1'
+
+def test_environment_variable_points_a_service_at_another_server(monkeypatch):
+    monkeypatch.setattr(HS, '_base_urls', {})
+    monkeypatch.setenv(HS.BASE_URL_VARIABLES[HS.TMDB], 'http://127.0.0.1:9000/tmdb')
+    assert HS.resolve_url(HS.TMDB, 'https://api.themoviedb.org/3/movie/1') == 'http://127.0.0.1:9000/tmdb/3/movie/1'
@@ -0,0 +1,61 @@
+import sqlite3
+import pytest
+from TMDBTraktSyncer import localStore as LS
+from TMDBTraktSyncer import mediaItem as MI
+
+def movie(tmdb_id, **fields):
+    return MI.MediaItem(MI.MOVIE, tmdb_id=tmdb_id, **fields)
+
+@pytest.fixture
+def store(tmp_path):
+    store = LS.LocalStore(str(tmp_path / 'state.db'))
+    yield store
+    store.close()
+
+def test_unchanged_list_is_not_written(store):
+    assert store.replace_list('trakt', 'watchlist', [movie(1), movie(2)])
+    changes = store.connection.total_changes
+    assert not store.replace_list('trakt', 'watchlist', [movie(1), movie(2)])
+    assert store.connection.total_changes == changes
+
+def test_only_the_changed_rows_are_written(store):
+    store.replace_list('trakt', 'ratings', [movie(1, rating=7), movie(2, rating=8), movie(3, rating=9)])
+    changes = store.connection.total_changes
+    assert store.replace_list('trakt', 'ratings', [movie(1, rating=7), movie(2, rating=5), movie(4, rating=6)])
+    # Rating 2 replaced, 3 deleted and 4 inserted
+    assert store.connection.total_changes - changes == 3
+    assert {(item.tmdb_id, item.rating) for item in store.get_list('trakt', 'ratings')} == {(1, 7), (2, 5), (4, 6)}
+
+def test_an_item_is_stored_once_per_list(store):
+    store.replace_list('tmdb', 'watchlist', [movie(1), movie(1)])
+    store.add_items('tmdb', 'watchlist', [movie(1), movie(2)])
+    store.add_items('trakt', 'watchlist', [movie(1)])
+    assert [item.tmdb_id for item in store.get_list('tmdb', 'watchlist')] == [1, 2]
+    assert [item.tmdb_id for item in store.get_list('trakt', 'watchlist')] == [1]
+
+def test_items_without_a_tmdb_id_are_kept(store):
+    store.replace_list('trakt', 'watchlist', [movie(None, title='A'), movie(None, title='B')])
+    assert not store.replace_list('trakt', 'watchlist', [movie(None, title='A'), movie(None, title='B')])
+    assert [item.title for item in store.get_list('trakt', 'watchlist')] == ['A', 'B']
+
+def test_diffs_match_on_type_and_tmdb_id(store):
+    store.replace_list('trakt', 'watchlist', [movie(1), movie(2), movie(3), MI.MediaItem(MI.SHOW, tmdb_id=4)])
+    store.replace_list('tmdb', 'watchlist', [movie(2), movie(4)])
+    store.replace_list('trakt', 'watched', [movie(3)])
+    assert [item.key for item in store.missing_items('trakt', 'tmdb', 'watchlist')] == [('movie', 1), ('movie', 3), ('show', 4)]
+    assert [item.key for item in store.missing_items('trakt', 'tmdb', 'watchlist', exclude_watched=True)] == [('movie', 1), ('show', 4)]
+    assert [item.key for item in store.watched_items('trakt', 'watchlist')] == [('movie', 3)]
+
+def test_store_of_an_older_schema_is_replaced(tmp_path):
+    file_path = str(tmp_path / 'state.db')
+    connection = sqlite3.connect(file_path)
+    connection.execute('CREATE TABLE items (source TEXT, list TEXT, type TEXT, tmdb_id INTEGER, trakt_id INTEGER, data TEXT)')
+    connection.execute("INSERT INTO items VALUES ('tmdb', 'watchlist', 'movie', 1, NULL, '{}')")
+    connection.commit()
+    connection.close()
+
+    store = LS.LocalStore(file_path)
+    assert store.get_list('tmdb', 'watchlist') == []
+    store.add_items('tmdb', 'watchlist', [movie(1), movie(1)])
+    assert len(store.get_list('tmdb', 'watchlist')) == 1
+    store.close()
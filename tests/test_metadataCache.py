@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from TMDBTraktSyncer import metadataCache as MC
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(MC, 'time', fake)
+    return fake
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'cache' / 'metadata.json')
+
+def test_entries_expire_after_their_ttl(clock, cache_path):
+    cache = MC.MetadataCache(cache_path)
+    cache.set('show:1', {'name': 'A'}, ttl=60)
+    clock.now += 59
+    assert cache.get('show:1') == {'name': 'A'}
+    clock.now += 1
+    assert cache.get('show:1') is None
+
+def test_flush_persists_live_entries_and_drops_expired_ones(clock, cache_path):
+    cache = MC.MetadataCache(cache_path)
+    cache.set('short', 1, ttl=10)
+    cache.set('long', 2, ttl=1000)
+    clock.now += 20
+    cache.flush()
+
+    reloaded = MC.MetadataCache(cache_path)
+    assert reloaded.get('long') == 2
+    assert reloaded.get('short') is None
+    assert set(reloaded._load_disk()) == {'long'}
+
+def test_flush_keeps_the_most_recently_used_entries(clock, cache_path):
+    cache = MC.MetadataCache(cache_path, max_disk_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key, ttl=1000)
+        clock.now += 1
+    # Reading 'a' makes it the most recently used, 'b' is now the oldest
+    cache.get('a')
+    cache.flush()
+
+    reloaded = MC.MetadataCache(cache_path)
+    assert reloaded.get('a') == 'a'
+    assert reloaded.get('c') == 'c'
+    assert reloaded.get('b') is None
+
+def test_memory_is_capped_but_evicted_entries_are_served_from_disk(clock, cache_path):
+    cache = MC.MetadataCache(cache_path, max_memory_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key, ttl=1000)
+    assert list(cache._memory) == ['b', 'c']
+    assert cache.get('a') == 'a'
+    assert list(cache._memory) == ['c', 'a']
+
+def test_flush_without_changes_writes_nothing(cache_path):
+    import os
+    cache = MC.MetadataCache(cache_path)
+    cache.flush()
+    assert not os.path.exists(cache_path)
+
+def test_get_or_fetch_fetches_once_and_does_not_cache_none(cache_path):
+    cache = MC.MetadataCache(cache_path)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return 42
+
+    assert cache.get_or_fetch('key', fetch, ttl=60) == 42
+    assert cache.get_or_fetch('key', fetch, ttl=60) == 42
+    assert len(calls) == 1
+
+    assert cache.get_or_fetch('missing', lambda: None, ttl=60) is None
+    assert cache.get_or_fetch('missing', fetch, ttl=60) == 42
+
+def test_concurrent_async_lookups_share_one_fetch(cache_path):
+    cache = MC.MetadataCache(cache_path)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def lookups():
+        return await asyncio.gather(*(cache.get_or_fetch_async('key', fetch, 60) for _ in range(5)))
+
+    assert asyncio.run(lookups()) == ['value'] * 5
+    assert len(calls) == 1
+
+def test_token_key_is_stable_and_does_not_contain_the_token():
+    key = MC.token_key('tmdb_account_id', 'secret-token')
+    assert key == MC.token_key('tmdb_account_id', 'secret-token')
+    assert key != MC.token_key('tmdb_account_id', 'other-token')
+    assert 'secret-token' not in key
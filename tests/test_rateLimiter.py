@@ -0,0 +1,125 @@
+import json
+import pytest
+from TMDBTraktSyncer import rateLimiter as RL
+
+class FakeTime:
+    """
+    Stand-in for the time module, sleeping advances the clock instantly.
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(RL, 'time', fake)
+    return fake
+
+def test_bucket_starts_full_then_limits_to_rate(clock):
+    bucket = RL.TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    # Empty, the next token arrives after 1 / rate seconds
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=2)
+    bucket.try_acquire()
+    bucket.try_acquire()
+    clock.now += 60
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+def test_acquire_sleeps_until_a_token_is_available(clock):
+    bucket = RL.TokenBucket(rate=4, capacity=1)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.25)
+    assert sum(clock.slept) == pytest.approx(0.25)
+
+def test_acquire_gives_up_instead_of_waiting_past_the_deadline(clock):
+    bucket = RL.TokenBucket(rate=1, capacity=1)
+    bucket.acquire()
+    assert bucket.acquire(deadline=clock.now + 0.5) is None
+    assert clock.slept == []
+    assert bucket.acquire(deadline=clock.now + 5) == pytest.approx(1)
+
+def test_acquire_after_a_refill_does_not_spin_on_rounding_error(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    # Refilling leaves 0.999... tokens, which has to count as the next token
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert len(clock.slept) == 1
+
+def test_pause_holds_back_every_caller_and_drains_the_bucket(clock):
+    bucket = RL.TokenBucket(rate=100, capacity=100)
+    bucket.pause(30)
+    assert bucket.try_acquire() == pytest.approx(30)
+    clock.now += 30
+    # The bucket refills from empty once the pause is over
+    assert bucket.try_acquire() > 0
+    clock.now += 0.02
+    assert bucket.try_acquire() == 0
+
+def test_update_limit_adapts_rate_and_caps_tokens_to_remaining(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=20)
+    bucket.update_limit(limit=60, period=60, remaining=1)
+    assert bucket.rate == 1
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(1)
+
+def test_update_limit_keeps_the_configured_burst(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=20)
+    # Trakt's window of 1000 requests per 5 minutes only changes the rate
+    bucket.update_limit(limit=1000, period=300)
+    assert bucket.capacity == 20
+    clock.now += 600
+    assert [bucket.try_acquire() for _ in range(20)] == [0] * 20
+    assert bucket.try_acquire() > 0
+
+def test_update_limit_recovers_from_a_low_limit(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=20)
+    bucket.update_limit(limit=5, period=1)
+    assert bucket.capacity == 5
+    assert bucket.tokens == 5
+    bucket.update_limit(limit=50, period=1)
+    assert bucket.capacity == 20
+
+def test_observe_trakt_headers_pauses_an_exhausted_window(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=10)
+    headers = {'X-Ratelimit': json.dumps({'limit': 1000, 'period': 300, 'remaining': 0, 'until': '2999-01-01T00:00:00Z'})}
+    RL.observe_trakt_headers(bucket, headers)
+    assert bucket.rate == pytest.approx(1000 / 300)
+    assert bucket.try_acquire() > 60
+
+def test_observe_trakt_headers_ignores_missing_or_invalid_headers(clock):
+    bucket = RL.TokenBucket(rate=10, capacity=10)
+    RL.observe_trakt_headers(bucket, {})
+    RL.observe_trakt_headers(bucket, {'X-Ratelimit': 'not json'})
+    assert bucket.rate == 10
+    assert bucket.try_acquire() == 0
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Retry-After': '7'}, 7.0),
+    ({'Retry-After': '-3'}, 0.0),
+    ({'Retry-After': 'soon'}, 2),
+    ({}, 2)
+])
+def test_parse_retry_after(headers, expected):
+    assert RL.parse_retry_after(headers, default=2) == expected
+
+def test_trakt_reads_and_writes_use_separate_shared_buckets():
+    assert RL.trakt_bucket() is RL.get_bucket(RL.TRAKT_GET)
+    assert RL.trakt_bucket({'movies': []}) is RL.get_bucket(RL.TRAKT_POST)
+    assert RL.get_bucket(RL.TRAKT_GET) is not RL.get_bucket(RL.TRAKT_POST)
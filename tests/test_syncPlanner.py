@@ -0,0 +1,138 @@
+import pytest
+from TMDBTraktSyncer import syncPlanner as SP
+from TMDBTraktSyncer import mediaItem as MI
+
+def movie(tmdb_id, **values):
+    return MI.MediaItem(MI.MOVIE, tmdb_id=tmdb_id, **values)
+
+def show(tmdb_id, **values):
+    return MI.MediaItem(MI.SHOW, tmdb_id=tmdb_id, **values)
+
+def ids(items):
+    return [item.key for item in items]
+
+def test_missing_items_are_added_to_the_other_service():
+    plan = SP.plan_sync(
+        trakt_watchlist=[movie(1), movie(2)],
+        trakt_ratings=[movie(1, rating=8)],
+        watched_content=[],
+        tmdb_watchlist=[movie(2), movie(3)],
+        tmdb_ratings=[show(4, rating=6)]
+    )
+    assert ids(plan.tmdb_watchlist_add) == [('movie', 1)]
+    assert ids(plan.trakt_watchlist_add) == [('movie', 3)]
+    assert ids(plan.tmdb_ratings_set) == [('movie', 1)]
+    assert ids(plan.trakt_ratings_set) == [('show', 4)]
+    assert plan.trakt_watchlist_remove == [] and plan.tmdb_watchlist_remove == []
+
+def test_items_are_keyed_on_type_and_tmdb_id():
+    # A movie and a show with the same numeric TMDB id are different items
+    plan = SP.plan_sync([movie(10)], [], [], [show(10)], [])
+    assert ids(plan.tmdb_watchlist_add) == [('movie', 10)]
+    assert ids(plan.trakt_watchlist_add) == [('show', 10)]
+
+def test_items_without_a_tmdb_id_are_skipped():
+    plan = SP.plan_sync([movie(None), movie(1)], [show(None, rating=5)], [], [], [])
+    assert ids(plan.tmdb_watchlist_add) == [('movie', 1)]
+    assert plan.tmdb_ratings_set == []
+
+def test_watched_items_are_removed_and_never_added():
+    plan = SP.plan_sync(
+        trakt_watchlist=[movie(1), movie(2)],
+        trakt_ratings=[],
+        watched_content=[['movie', 1], ['show', 3]],
+        tmdb_watchlist=[show(3), show(4)],
+        tmdb_ratings=[],
+        remove_watched=True
+    )
+    assert ids(plan.trakt_watchlist_remove) == [('movie', 1)]
+    assert ids(plan.tmdb_watchlist_remove) == [('show', 3)]
+    assert ids(plan.tmdb_watchlist_add) == [('movie', 2)]
+    assert ids(plan.trakt_watchlist_add) == [('show', 4)]
+
+def test_watched_items_are_kept_without_remove_watched():
+    plan = SP.plan_sync([movie(1)], [], [['movie', 1]], [], [])
+    assert ids(plan.tmdb_watchlist_add) == [('movie', 1)]
+    assert plan.trakt_watchlist_remove == []
+
+def test_item_order_is_kept():
+    watchlist = [movie(tmdb_id) for tmdb_id in (5, 3, 9, 1, 7)]
+    plan = SP.plan_sync(watchlist, [], [], [], [])
+    assert [item.tmdb_id for item in plan.tmdb_watchlist_add] == [5, 3, 9, 1, 7]
+
+def test_plan_round_trips_through_dicts():
+    plan = SP.SyncPlan(tmdb_watchlist_add=[movie(1, title='One', date_added=1700000000)], trakt_ratings_set=[show(2, rating=9)])
+    restored = SP.SyncPlan.from_dict(plan.to_dict())
+    assert restored.to_dict() == plan.to_dict()
+    assert restored.tmdb_watchlist_add == plan.tmdb_watchlist_add
+    assert restored.total == 2
+    assert restored.counts()['trakt_ratings_set'] == 1
+
+def test_plan_keeps_only_the_operations_of_the_selected_options():
+    # remove_watched alone still reads both watchlists
+    plan = SP.plan_sync([movie(1), movie(2)], [movie(3, rating=7)], [['movie', 2]], [movie(4)], [], remove_watched=True)
+    plan = plan.for_options({'ratings': False, 'watchlist': False, 'remove_watched': True})
+    assert plan.counts() == {
+        'tmdb_watchlist_add': 0, 'trakt_watchlist_add': 0, 'tmdb_ratings_set': 0,
+        'trakt_ratings_set': 0, 'trakt_watchlist_remove': 1, 'tmdb_watchlist_remove': 0
+    }
+    assert plan.total == 1
+
+def test_unknown_operations_are_refused():
+    with pytest.raises(ValueError):
+        SP.SyncPlan(tmdb_watchlist_delete=[movie(1)])
+
+def test_sort_by_priority_puts_the_newest_items_first():
+    items = [
+        movie(1, date_added=100),
+        movie(2),
+        movie(3, date_added=50, watched_at=300),
+        movie(4, date_added=200)
+    ]
+    assert [item.tmdb_id for item in SP.sort_by_priority(items)] == [3, 4, 1, 2]
+
+def test_shards_are_disjoint_round_robin_and_cover_the_plan():
+    plan = SP.SyncPlan(
+        tmdb_watchlist_add=[movie(tmdb_id) for tmdb_id in range(7)],
+        trakt_watchlist_remove=[show(tmdb_id) for tmdb_id in range(3)]
+    )
+    shards = [plan.shard(index, 3) for index in range(3)]
+    assert [item.tmdb_id for item in shards[0].tmdb_watchlist_add] == [0, 3, 6]
+    assert [item.tmdb_id for item in shards[1].tmdb_watchlist_add] == [1, 4]
+    assert [item.tmdb_id for item in shards[2].trakt_watchlist_remove] == [2]
+    for operation in SP.OPERATIONS:
+        keys = [item.key for shard in shards for item in getattr(shard, operation)]
+        assert sorted(keys) == sorted(item.key for item in getattr(plan, operation))
+        assert len(keys) == len(set(keys))
+
+@pytest.mark.parametrize('index, count', [(0, 0), (-1, 2), (2, 2)])
+def test_invalid_shards_are_refused(index, count):
+    with pytest.raises(ValueError):
+        SP.SyncPlan().shard(index, count)
+
+def test_saved_plans_load_back(tmp_path):
+    file_path = str(tmp_path / 'plans' / 'plan.json')
+    plan = SP.SyncPlan(tmdb_ratings_set=[movie(1, rating=7)], trakt_watchlist_add=[show(2, title='Two')])
+    options = {'ratings': True, 'watchlist': True, 'remove_watched': False}
+    SP.save_plan(file_path, plan, options)
+    loaded, loaded_options, created_at = SP.load_plan(file_path)
+    assert loaded.to_dict() == plan.to_dict()
+    assert loaded_options == options
+    assert created_at > 0
+    assert not (tmp_path / 'plans' / 'plan.json.tmp').exists()
+
+def test_loaded_plans_only_hold_the_operations_of_their_options(tmp_path):
+    # Shard totals of --apply count only the writes that are made
+    file_path = str(tmp_path / 'plan.json')
+    plan = SP.SyncPlan(tmdb_ratings_set=[movie(1, rating=7)], trakt_watchlist_add=[show(2), show(3)])
+    SP.save_plan(file_path, plan, {'ratings': True, 'watchlist': False, 'remove_watched': True})
+    loaded, _, _ = SP.load_plan(file_path)
+    assert loaded.total == 1
+    assert loaded.shard(0, 2).total + loaded.shard(1, 2).total == 1
+
+def test_plan_files_of_another_version_are_refused(tmp_path):
+    import json
+    file_path = tmp_path / 'plan.json'
+    file_path.write_text(json.dumps({'version': SP.PLAN_FILE_VERSION + 1, 'created_at': 0, 'options': {}, 'plan': {}}))
+    with pytest.raises(ValueError):
+        SP.load_plan(str(file_path))
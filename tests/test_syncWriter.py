@@ -0,0 +1,127 @@
+import json
+import time
+import threading
+import pytest
+from TMDBTraktSyncer import syncWriter as SW
+from TMDBTraktSyncer import mediaItem as MI
+
+class FakeResponse:
+    def __init__(self, status_code=201, body=None):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode('utf-8') if body is not None else b''
+
+    def json(self):
+        return json.loads(self.content)
+
+def item(item_type, tmdb_id):
+    return MI.MediaItem(item_type, tmdb_id=tmdb_id)
+
+def build_entry(item):
+    return {'ids': {'tmdb': item.tmdb_id}}
+
+@pytest.fixture
+def trakt(monkeypatch):
+    """
+    Records the payloads sent to Trakt and answers them with the queued responses, 201 without a body by default.
+    """
+    class FakeTrakt:
+        payloads = []
+        responses = []
+
+    def make_trakt_request(url, payload=None, **kwargs):
+        FakeTrakt.payloads.append(payload)
+        return FakeTrakt.responses.pop(0) if FakeTrakt.responses else FakeResponse()
+
+    monkeypatch.setattr(SW.EH, 'make_trakt_request', make_trakt_request)
+    return FakeTrakt
+
+def test_items_are_split_into_batches_across_sections(trakt):
+    items = [item('movie', 1), item('show', 2), item('episode', 3), item('movie', 4), item('episode', 5)]
+    results = list(SW.write_trakt_batches('https://api.trakt.tv/sync/watchlist', items, build_entry, batch_size=2))
+    assert trakt.payloads == [
+        {'movies': [{'ids': {'tmdb': 1}}], 'shows': [{'ids': {'tmdb': 2}}], 'episodes': []},
+        {'movies': [{'ids': {'tmdb': 4}}], 'shows': [], 'episodes': [{'ids': {'tmdb': 3}}]},
+        {'movies': [], 'shows': [], 'episodes': [{'ids': {'tmdb': 5}}]}
+    ]
+    assert results == [(entry, True) for entry in items]
+
+def test_default_batch_size_sends_up_to_100_items_per_request(trakt):
+    items = [item('movie', tmdb_id) for tmdb_id in range(250)]
+    assert len(list(SW.write_trakt_batches('https://api.trakt.tv/sync/ratings', items, build_entry))) == 250
+    assert [len(payload['movies']) for payload in trakt.payloads] == [100, 100, 50]
+
+def test_items_trakt_did_not_find_are_reported_as_failed(trakt):
+    items = [item('movie', 1), item('show', 1), item('episode', 7), item('movie', 2)]
+    trakt.responses.append(FakeResponse(201, {
+        'added': {'movies': 1, 'shows': 1, 'episodes': 0},
+        'not_found': {'movies': [{'ids': {'tmdb': 2}}], 'shows': [], 'episodes': [{'ids': {'tmdb': 7}}]}
+    }))
+    results = list(SW.write_trakt_batches('https://api.trakt.tv/sync/watchlist', items, build_entry))
+    # The show shares the not found movie's numeric id and still counts as done
+    assert [success for _, success in results] == [True, True, False, False]
+
+def test_not_found_only_fails_items_of_its_own_batch(trakt):
+    items = [item('movie', 1), item('movie', 2), item('movie', 1)]
+    trakt.responses.append(FakeResponse(201, {'not_found': {'movies': [{'ids': {'tmdb': 1}}]}}))
+    results = list(SW.write_trakt_batches('https://api.trakt.tv/sync/watchlist', items, build_entry, batch_size=2))
+    assert [success for _, success in results] == [False, True, True]
+
+def test_a_failed_request_fails_its_whole_batch(trakt):
+    items = [item('movie', 1), item('movie', 2), item('movie', 3)]
+    trakt.responses.extend([None, FakeResponse(201)])
+    results = list(SW.write_trakt_batches('https://api.trakt.tv/sync/watchlist', items, build_entry, batch_size=2))
+    assert [success for _, success in results] == [False, False, True]
+
+def test_unknown_item_types_are_failed_without_being_sent(trakt):
+    items = [item('person', 1), item('movie', 2)]
+    results = list(SW.write_trakt_batches('https://api.trakt.tv/sync/watchlist', items, build_entry))
+    assert trakt.payloads == [{'movies': [{'ids': {'tmdb': 2}}], 'shows': [], 'episodes': []}]
+    assert [success for _, success in results] == [False, True]
+
+def test_tmdb_writes_report_every_item_and_stay_within_the_worker_limit(monkeypatch):
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def send(url, payload):
+        with lock:
+            running.append(url)
+            peak.append(len(running))
+        time.sleep(0.005)
+        with lock:
+            running.remove(url)
+        # Odd ids fail
+        return payload['media_id'] % 2 == 0
+
+    monkeypatch.setattr(SW, '_send_tmdb_request', send)
+    items = [item('movie', tmdb_id) for tmdb_id in range(20)]
+    results = list(SW.write_tmdb_items(items, SW.build_tmdb_watchlist_request(42, True), max_workers=3))
+    assert sorted(entry.tmdb_id for entry, _ in results) == list(range(20))
+    assert all(success == (entry.tmdb_id % 2 == 0) for entry, success in results)
+    assert max(peak) <= 3
+
+def test_nothing_is_sent_after_the_deadline(trakt, monkeypatch):
+    sent = []
+    monkeypatch.setattr(SW, '_send_tmdb_request', lambda url, payload: sent.append(url) or True)
+    items = [item('movie', tmdb_id) for tmdb_id in range(5)]
+    deadline = time.monotonic() - 1
+    assert list(SW.write_trakt_batches('https://api.trakt.tv/sync/watchlist', items, build_entry, deadline=deadline)) == []
+    assert list(SW.write_tmdb_items(items, lambda item: (f'/movie/{item.tmdb_id}', None), deadline=deadline)) == []
+    assert trakt.payloads == []
+    assert sent == []
+
+def test_dispatch_deadline_keeps_a_margin_for_the_running_writes():
+    assert SW.dispatch_deadline(1000, 3600) == 1000 - SW.DISPATCH_MARGIN
+    # Short budgets keep a tenth of the budget instead
+    assert SW.dispatch_deadline(1000, 60) == 994
+
+def test_tmdb_rating_requests_address_episodes_through_their_show():
+    url, payload = SW.build_tmdb_rating_request(MI.MediaItem('episode', tmdb_id=99, show_tmdb_id=1399, season=1, episode=2, rating=8))
+    assert url == 'https://api.themoviedb.org/3/tv/1399/season/1/episode/2/rating'
+    assert payload == {'value': 8}
+
+def test_trakt_entry_builders_address_items_by_the_expected_ids():
+    movie = MI.MediaItem('movie', tmdb_id=603, trakt_id=481, rating=9)
+    assert SW.build_trakt_watchlist_entry(movie) == {'ids': {'tmdb': 603}}
+    assert SW.build_trakt_rating_entry(movie) == {'ids': {'tmdb': 603}, 'rating': 9}
+    assert SW.build_trakt_watchlist_removal_entry(movie) == {'ids': {'trakt': 481}}
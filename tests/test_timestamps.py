@@ -0,0 +1,60 @@
+import random
+import calendar
+import datetime
+import pytest
+from TMDBTraktSyncer import timestamps as TS
+
+def strptime(value, format):
+    # Whole seconds in UTC, fractions dropped like parse_iso8601 does
+    parsed = datetime.datetime.strptime(value, format)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return calendar.timegm(parsed.utctimetuple())
+
+@pytest.mark.parametrize('value, format', [
+    ('2024-01-02T03:04:05.000Z', '%Y-%m-%dT%H:%M:%S.%f%z'),
+    ('1999-12-31T23:59:59.999Z', '%Y-%m-%dT%H:%M:%S.%f%z'),
+    ('2024-02-29T12:00:00.5Z', '%Y-%m-%dT%H:%M:%S.%f%z'),
+    ('2024-01-02T03:04:05.123456+02:00', '%Y-%m-%dT%H:%M:%S.%f%z'),
+    ('2024-01-02T03:04:05-0530', '%Y-%m-%dT%H:%M:%S%z'),
+    ('2024-01-02 03:04:05', '%Y-%m-%d %H:%M:%S'),
+    ('2024-01-02T03:04:05', '%Y-%m-%dT%H:%M:%S'),
+    ('1970-01-01', '%Y-%m-%d'),
+    ('1969-07-20', '%Y-%m-%d'),
+])
+def test_matches_strptime(value, format):
+    assert TS.parse_iso8601(value) == strptime(value, format)
+
+def test_matches_strptime_on_random_trakt_timestamps():
+    generator = random.Random(0)
+    for _ in range(2000):
+        value = datetime.datetime(1900, 1, 1) + datetime.timedelta(seconds=generator.randrange(200 * 365 * 86400))
+        text = value.strftime('%Y-%m-%dT%H:%M:%S.') + f'{generator.randrange(1000):03d}Z'
+        assert TS.parse_iso8601(text) == strptime(text, '%Y-%m-%dT%H:%M:%S.%f%z')
+
+@pytest.mark.parametrize('value', [
+    None, '', 20240102, 'not a date',
+    '2024-13-02T03:04:05.000Z',
+    '2023-02-29T03:04:05.000Z',
+    '2024-04-31',
+    '2024-01-00',
+    '2024-01-02T24:04:05.000Z',
+    '2024-01-02T03:60:05.000Z',
+    '2024-01-02T03:04:62.000Z',
+    '2024-01-02T03:04:05.abcZ',
+    '2024-01-02T03:04:05.Z',
+    '2024-1-02T03:04:05.000Z',
+    '+024-01-02T03:04:05.000Z',
+    '2024-01-02T 3:04:05.000Z',
+    '2024-01-02T03:04:05+25:00',
+    '2024-01-02T03:04:05+02:00x',
+    '2024-01-02T03:04',
+    '2024-01-0٢',
+])
+def test_malformed_values_are_rejected(value):
+    assert TS.parse_iso8601(value) is None
+
+def test_malformed_date_does_not_poison_the_day_cache():
+    assert TS.parse_iso8601('2023-02-29T00:00:00.000Z') is None
+    assert TS.parse_iso8601('2023-02-29') is None
+    assert TS.parse_iso8601('2023-02-28') == strptime('2023-02-28', '%Y-%m-%d')
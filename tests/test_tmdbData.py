@@ -0,0 +1,118 @@
+import json
+import asyncio
+import urllib.parse
+import pytest
+from TMDBTraktSyncer import tmdbData as TD
+from TMDBTraktSyncer import mediaItem as MI
+
+class FakeResponse:
+    def __init__(self, body):
+        self.text = json.dumps(body)
+
+def parse_movie(result):
+    return MI.MediaItem(MI.MOVIE, tmdb_id=result['id'])
+
+@pytest.fixture
+def tmdb(monkeypatch):
+    """
+    Serves pages of 3 results from a list of ids, later pages answer first.
+
+    Set failing_page to make that page's request raise, every request still running when
+    it fails is recorded in cancelled.
+    """
+    class FakeTmdb:
+        ids = []
+        requested = []
+        cancelled = []
+        failing_page = None
+        in_flight = 0
+        max_in_flight = 0
+
+    async def make_tmdb_request_async(url):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['page'][0])
+        FakeTmdb.requested.append(page)
+        FakeTmdb.in_flight += 1
+        FakeTmdb.max_in_flight = max(FakeTmdb.max_in_flight, FakeTmdb.in_flight)
+        try:
+            if page == FakeTmdb.failing_page:
+                raise ConnectionError('page failed')
+            await asyncio.sleep(0.01 / page)
+            if FakeTmdb.failing_page is not None and page > 1:
+                await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            FakeTmdb.cancelled.append(page)
+            raise
+        finally:
+            FakeTmdb.in_flight -= 1
+        total_pages = max(1, -(-len(FakeTmdb.ids) // 3))
+        results = [{'id': tmdb_id} for tmdb_id in FakeTmdb.ids[(page - 1) * 3:page * 3]]
+        return FakeResponse({'page': page, 'total_pages': total_pages, 'results': results})
+
+    monkeypatch.setattr(TD.AR, 'make_tmdb_request_async', make_tmdb_request_async)
+    return FakeTmdb
+
+def test_pages_are_merged_in_page_order(tmdb):
+    # 4 full pages and a partial last page
+    tmdb.ids = list(range(1, 15))
+    items = TD.fetch_all_pages('https://api.themoviedb.org/3/account/1/watchlist/movies', parse_movie)
+    assert [item.tmdb_id for item in items] == tmdb.ids
+    assert sorted(tmdb.requested) == [1, 2, 3, 4, 5]
+
+def test_single_page_is_fetched_once(tmdb):
+    tmdb.ids = [7, 8]
+    assert [item.tmdb_id for item in TD.fetch_all_pages('https://api.themoviedb.org/3/x', parse_movie)] == [7, 8]
+    assert tmdb.requested == [1]
+
+def test_pages_are_fetched_at_most_max_workers_at_a_time(tmdb):
+    tmdb.ids = list(range(30))
+    TD.fetch_all_pages('https://api.themoviedb.org/3/x', parse_movie, max_workers=2)
+    assert tmdb.max_in_flight == 2
+
+def test_coroutine_parsers_are_awaited(tmdb):
+    async def parse(result):
+        await asyncio.sleep(0)
+        return parse_movie(result)
+
+    tmdb.ids = list(range(1, 8))
+    assert [item.tmdb_id for item in TD.fetch_all_pages('https://api.themoviedb.org/3/x', parse)] == tmdb.ids
+
+def test_a_failed_page_cancels_the_pages_still_fetching(tmdb):
+    tmdb.ids = list(range(1, 16))
+    tmdb.failing_page = 3
+
+    async def fetch():
+        with pytest.raises(ConnectionError):
+            await TD.fetch_all_pages_async('https://api.themoviedb.org/3/x', parse_movie)
+        # Pages 2, 4 and 5 were running and were stopped before the failure was raised
+        assert sorted(tmdb.cancelled) == [2, 4, 5]
+        assert tmdb.in_flight == 0
+
+    asyncio.run(fetch())
+
+def test_ratings_endpoints_are_read_together_and_merged_in_endpoint_order(monkeypatch):
+    results = {
+        '/3/account/1/rated/movies': [{'id': 1, 'title': 'One', 'release_date': '2001-01-01', 'rating': 7}, {'id': 2, 'title': 'Two', 'rating': 8}],
+        '/3/account/1/rated/tv': [{'id': 3, 'name': 'Three', 'first_air_date': '2003-03-03', 'rating': 9}],
+        '/3/account/1/rated/tv/episodes': [{'id': 4, 'show_id': 3, 'name': 'Pilot', 'season_number': 1, 'episode_number': 1, 'rating': 6}]
+    }
+    started = []
+
+    async def make_tmdb_request_async(url):
+        parts = urllib.parse.urlsplit(url)
+        page = int(urllib.parse.parse_qs(parts.query)['page'][0])
+        started.append(parts.path)
+        # The first endpoint answers last, one result per page
+        await asyncio.sleep(0.02 if parts.path.endswith('movies') else 0)
+        endpoint_results = results[parts.path]
+        return FakeResponse({'page': page, 'total_pages': len(endpoint_results), 'results': [endpoint_results[page - 1]]})
+
+    async def fetch_show_details_async(show_id):
+        return {'name': 'Show'}
+
+    monkeypatch.setattr(TD.AR, 'make_tmdb_request_async', make_tmdb_request_async)
+    monkeypatch.setattr(TD, 'fetch_show_details_async', fetch_show_details_async)
+    items = TD.get_tmdb_ratings(1)
+    assert [(item.type, item.tmdb_id, item.rating) for item in items] == [('movie', 1, 7), ('movie', 2, 8), ('show', 3, 9), ('episode', 4, 6)]
+    assert items[3].title == 'Show: Pilot'
+    # Every endpoint's first page was requested before the slow movies page answered
+    assert set(started[:3]) == set(results)
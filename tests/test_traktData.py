@@ -0,0 +1,94 @@
+import json
+import asyncio
+import pytest
+from TMDBTraktSyncer import traktData as TD
+from TMDBTraktSyncer import metadataCache as MC
+from TMDBTraktSyncer import benchmark
+
+class FakeResponse:
+    def __init__(self, body, headers=None):
+        self.text = json.dumps(body)
+        self.headers = headers or {}
+
+def watched_endpoints(pages):
+    """
+    Aggregate /history pages the way Trakt's /sync/watched and /shows/{id}/seasons endpoints do.
+    """
+    movies, shows, seasons = {}, {}, {}
+    for page in pages:
+        for item in page:
+            if item['type'] == 'movie':
+                movie = movies.setdefault(item['movie']['ids']['trakt'], {'plays': 0, 'movie': item['movie']})
+                movie['plays'] += 1
+            else:
+                show, episode = item['show'], item['episode']
+                trakt_show_id = show['ids']['trakt']
+                entry = shows.setdefault(trakt_show_id, {'show': show, 'seasons': {}})
+                entry['seasons'].setdefault(episode['season'], {})[episode['number']] = {'number': episode['number'], 'plays': 1}
+                seasons.setdefault(trakt_show_id, {}).setdefault(episode['season'], {})[episode['number']] = {'number': episode['number'], 'ids': episode['ids']}
+    watched_shows = [
+        {'show': entry['show'], 'seasons': [{'number': number, 'episodes': list(episodes.values())} for number, episodes in entry['seasons'].items()]}
+        for entry in shows.values()
+    ]
+    show_seasons = {
+        trakt_show_id: [{'number': number, 'episodes': list(episodes.values())} for number, episodes in show.items()]
+        for trakt_show_id, show in seasons.items()
+    }
+    return list(movies.values()), watched_shows, show_seasons
+
+@pytest.fixture
+def trakt(monkeypatch, tmp_path):
+    """
+    Answers Trakt requests from a synthetic play history and records the requested URLs.
+    """
+    pages = benchmark.synthetic_play_history(1500, episodes_per_show=20, page_size=100)
+    movies, shows, seasons = watched_endpoints(pages)
+    requested = []
+
+    async def make_trakt_request_async(url, headers=None, params=None, payload=None, max_retries=5):
+        requested.append(url)
+        if url.endswith('/history?limit=100'):
+            return FakeResponse(pages[0], {'X-Pagination-Page-Count': str(len(pages))})
+        if '/history?extended=full' in url:
+            return FakeResponse(pages[params['page'] - 1])
+        if url.endswith('/sync/watched/movies'):
+            return FakeResponse(movies)
+        if url.endswith('/sync/watched/shows?extended=full'):
+            return FakeResponse(shows)
+        trakt_show_id = int(url.split('/shows/')[1].split('/')[0])
+        return FakeResponse(seasons.get(trakt_show_id, []))
+
+    monkeypatch.setattr(TD.AR, 'make_trakt_request_async', make_trakt_request_async)
+    monkeypatch.setattr(MC, 'cache', MC.MetadataCache(str(tmp_path / 'metadata.json')))
+    return requested
+
+def watched_ids(source):
+    return sorted(map(tuple, TD.get_trakt_watched_ids('user', source)))
+
+def test_both_history_sources_return_the_same_items(trakt):
+    from_history = watched_ids('history')
+    from_watched = watched_ids('watched')
+    assert from_watched == from_history
+    assert {item_type for item_type, _ in from_watched} == {'movie', 'show', 'episode'}
+
+def test_episode_ids_are_cached_per_show(trakt):
+    watched_ids('watched')
+    season_requests = [url for url in trakt if '/seasons' in url]
+    assert season_requests
+    trakt.clear()
+    watched_ids('watched')
+    assert [url for url in trakt if '/seasons' in url] == []
+
+def test_episode_ids_are_refetched_for_a_newly_watched_episode(trakt):
+    MC.cache.set('trakt_show_episodes:1', {'10001': 501}, MC.SHOW_TTL)
+    assert asyncio.run(TD.get_show_episode_ids_async(1, [10001])) == {'10001': 501}
+    assert trakt == []
+    # Episode 1x2 is missing from the cached map, so the show is looked up again
+    asyncio.run(TD.get_show_episode_ids_async(1, [10001, 10002]))
+    assert trakt == ['https://api.trakt.tv/shows/1/seasons?extended=episodes']
+
+def test_show_completion_needs_an_ended_status_and_80_percent_watched():
+    assert TD.is_show_completed('ended', 10, 8)
+    assert not TD.is_show_completed('ended', 10, 7)
+    assert not TD.is_show_completed('returning series', 10, 10)
+    assert not TD.is_show_completed(None, 10, 10)
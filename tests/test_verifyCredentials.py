@@ -0,0 +1,117 @@
+import os
+import json
+import datetime
+from datetime import timezone
+import pytest
+from TMDBTraktSyncer import verifyCredentials as VC
+
+def future_expiry():
+    return (datetime.datetime.now(timezone.utc) + datetime.timedelta(days=7)).replace(tzinfo=None).isoformat()
+
+CREDENTIALS = {
+    'trakt_client_id': 'client-id',
+    'trakt_client_secret': 'client-secret',
+    'trakt_access_token': 'access-token',
+    'trakt_refresh_token': 'refresh-token',
+    'tmdb_access_token': 'tmdb-token'
+}
+
+@pytest.fixture
+def credentials_path(tmp_path):
+    file_path = tmp_path / 'credentials.txt'
+    file_path.write_text(json.dumps(dict(CREDENTIALS, trakt_token_expires=future_expiry()), indent=4))
+    return str(file_path)
+
+@pytest.fixture
+def store(credentials_path, monkeypatch):
+    store = VC.CredentialsStore(credentials_path)
+    monkeypatch.setattr(VC, 'store', store)
+    monkeypatch.setattr(VC, '_headers', {})
+    monkeypatch.setattr(VC, '_token_expiration', None)
+    # Any prompt means the stored credentials were not used
+    monkeypatch.setattr('builtins.input', lambda prompt='': pytest.fail(f'Unexpected prompt: {prompt}'))
+    return store
+
+def count_reads(monkeypatch):
+    reads = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file).endswith('credentials.txt'):
+            reads.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+    return reads
+
+def test_file_is_read_once(store, monkeypatch):
+    reads = count_reads(monkeypatch)
+    assert store.get('trakt_client_id') == 'client-id'
+    assert store.get('tmdb_access_token') == 'tmdb-token'
+    assert store.as_dict()['trakt_refresh_token'] == 'refresh-token'
+    assert len(reads) == 1
+
+def test_missing_file_reads_as_empty(tmp_path):
+    store = VC.CredentialsStore(str(tmp_path / 'credentials.txt'))
+    assert store.get('trakt_client_id') is None
+    assert store.as_dict() == {}
+
+def test_unchanged_values_are_not_written(store, credentials_path):
+    before = os.stat(credentials_path).st_mtime_ns
+    assert store.update({'trakt_client_id': 'client-id'}) is False
+    assert store.replace(store.as_dict()) is False
+    assert os.stat(credentials_path).st_mtime_ns == before
+
+def test_changed_values_are_written_and_read_back(store, credentials_path):
+    assert store.set('sync_ratings', True) is True
+    with open(credentials_path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['sync_ratings'] is True
+    assert VC.CredentialsStore(credentials_path).get('sync_ratings') is True
+
+def test_save_is_synced_and_atomic(store, credentials_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(VC.os, 'fsync', lambda fd: synced.append(fd) or real_fsync(fd))
+    store.set('sync_watchlist', False)
+    assert synced
+
+    def fail_replace(source, target):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(VC.os, 'replace', fail_replace)
+    with pytest.raises(OSError):
+        store.set('sync_watchlist', True)
+    # The previous file is untouched and no temporary file is left behind
+    with open(credentials_path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['sync_watchlist'] is False
+    assert os.listdir(os.path.dirname(credentials_path)) == ['credentials.txt']
+
+def test_prompt_get_credentials_uses_the_stored_values(store):
+    assert VC.prompt_get_credentials() == ('client-id', 'client-secret', 'access-token', 'refresh-token', 'tmdb-token')
+    assert VC.get_trakt_headers()['Authorization'] == 'Bearer access-token'
+    assert VC.get_trakt_headers()['trakt-api-key'] == 'client-id'
+    assert VC.get_tmdb_headers()['Authorization'] == 'Bearer tmdb-token'
+
+def test_prompt_get_credentials_fast_path_skips_the_file(store, monkeypatch):
+    VC.prompt_get_credentials()
+    reads = count_reads(monkeypatch)
+    monkeypatch.setattr(store, 'replace', lambda values: pytest.fail('credentials written again'))
+    for _ in range(3):
+        assert VC.prompt_get_credentials()[0] == 'client-id'
+        VC.get_trakt_headers()
+    assert reads == []
+
+def test_expired_token_is_refreshed_once(store, monkeypatch):
+    from TMDBTraktSyncer import authTrakt
+    store.set('trakt_token_expires', '2000-01-01T00:00:00')
+    refreshed = []
+
+    def authenticate(client_id, client_secret, refresh_token=None):
+        refreshed.append(refresh_token)
+        return 'new-access', 'new-refresh', future_expiry()
+
+    monkeypatch.setattr(authTrakt, 'authenticate', authenticate)
+    assert VC.prompt_get_credentials()[2:4] == ('new-access', 'new-refresh')
+    assert VC.prompt_get_credentials()[2] == 'new-access'
+    assert refreshed == ['refresh-token']
+    assert VC.CredentialsStore(store.file_path).get('trakt_access_token') == 'new-access'
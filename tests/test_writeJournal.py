@@ -0,0 +1,163 @@
+import json
+import threading
+import pytest
+from TMDBTraktSyncer import writeJournal as WJ
+from TMDBTraktSyncer import syncPlanner as SP
+from TMDBTraktSyncer import syncWriter as SW
+from TMDBTraktSyncer import mediaItem as MI
+
+OPTIONS = {'sync_ratings': True, 'sync_watchlist': True, 'remove_watched_from_watchlists': False}
+
+def movie(tmdb_id):
+    return MI.MediaItem(MI.MOVIE, tmdb_id=tmdb_id)
+
+def make_plan():
+    return SP.SyncPlan(
+        tmdb_watchlist_add=[movie(1), movie(2), movie(3)],
+        trakt_ratings_set=[MI.MediaItem(MI.SHOW, tmdb_id=1, rating=8)]
+    )
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'cache' / 'write_journal.jsonl')
+
+def interrupted_journal(journal_path):
+    """
+    Journal of a run that confirmed the first TMDB watchlist write and the Trakt rating, then stopped.
+    """
+    plan = make_plan()
+    journal = WJ.WriteJournal(journal_path)
+    journal.start(plan, OPTIONS)
+    journal.record('tmdb_watchlist_add', plan.tmdb_watchlist_add[0])
+    journal.record('trakt_ratings_set', plan.trakt_ratings_set[0])
+    journal.close()
+
+def test_resume_skips_the_confirmed_writes(journal_path):
+    interrupted_journal(journal_path)
+    plan = WJ.WriteJournal(journal_path).resume(OPTIONS)
+    assert [item.tmdb_id for item in plan.tmdb_watchlist_add] == [2, 3]
+    assert plan.trakt_ratings_set == []
+    assert plan.total == 2
+
+def test_resumed_journal_keeps_recording(journal_path):
+    interrupted_journal(journal_path)
+    journal = WJ.WriteJournal(journal_path)
+    plan = journal.resume(OPTIONS)
+    journal.record('tmdb_watchlist_add', plan.tmdb_watchlist_add[0])
+    journal.close()
+    assert [item.tmdb_id for item in WJ.WriteJournal(journal_path).resume(OPTIONS).tmdb_watchlist_add] == [3]
+
+def test_journal_of_other_options_is_not_resumed(journal_path):
+    interrupted_journal(journal_path)
+    assert WJ.WriteJournal(journal_path).resume(dict(OPTIONS, sync_ratings=False)) is None
+
+def test_stale_journal_is_not_resumed(journal_path, monkeypatch):
+    interrupted_journal(journal_path)
+    now = WJ.time.time()
+    monkeypatch.setattr(WJ.time, 'time', lambda: now + WJ.JOURNAL_MAX_AGE + 1)
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS) is None
+
+def test_journal_of_another_version_is_not_resumed(journal_path):
+    interrupted_journal(journal_path)
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    header = json.loads(lines[0])
+    header['version'] = WJ.JOURNAL_VERSION + 1
+    with open(journal_path, 'w', encoding='utf-8') as f:
+        f.writelines([json.dumps(header) + '\n'] + lines[1:])
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS) is None
+
+def test_missing_journal_is_not_resumed(journal_path):
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS) is None
+
+def test_line_cut_off_by_a_crash_is_ignored(journal_path):
+    interrupted_journal(journal_path)
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"event":"done","service":"tmdb","op":"watchlist_add","type":"movie","tmdb')
+    journal = WJ.WriteJournal(journal_path)
+    plan = journal.resume(OPTIONS)
+    assert [item.tmdb_id for item in plan.tmdb_watchlist_add] == [2, 3]
+    # The next record starts on a line of its own and is read back
+    journal.record('tmdb_watchlist_add', plan.tmdb_watchlist_add[0])
+    journal.close()
+    assert [item.tmdb_id for item in WJ.WriteJournal(journal_path).resume(OPTIONS).tmdb_watchlist_add] == [3]
+
+def test_finish_removes_the_journal(journal_path):
+    import os
+    interrupted_journal(journal_path)
+    journal = WJ.WriteJournal(journal_path)
+    journal.resume(OPTIONS)
+    journal.finish()
+    assert not os.path.exists(journal_path)
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS) is None
+
+def test_bare_file_name_in_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    interrupted_journal('plan.json.journal')
+    assert WJ.WriteJournal('plan.json.journal').resume(OPTIONS).total == 2
+
+def activities(watchlisted_at='2024-01-01T00:00:00.000Z', rated_at='2024-01-01T00:00:00.000Z'):
+    return {'movies': {'watchlisted_at': watchlisted_at, 'rated_at': rated_at}, 'shows': {'rated_at': rated_at}}
+
+def test_journal_is_resumed_while_trakt_is_unchanged(journal_path):
+    plan = make_plan()
+    journal = WJ.WriteJournal(journal_path)
+    journal.start(plan, OPTIONS, activities())
+    journal.close()
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS, activities()).total == 4
+
+def test_journal_is_not_resumed_after_another_trakt_change(journal_path):
+    # The interrupted run wrote no Trakt watchlist items, a newer watchlisted_at is someone else's change
+    plan = make_plan()
+    journal = WJ.WriteJournal(journal_path)
+    journal.start(plan, OPTIONS, activities())
+    journal.close()
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS, activities(watchlisted_at='2024-01-02T00:00:00.000Z')) is None
+
+def test_own_trakt_writes_do_not_block_the_resume(journal_path, monkeypatch):
+    plan = make_plan()
+    journal = WJ.WriteJournal(journal_path)
+    journal.start(plan, OPTIONS, activities())
+    monkeypatch.setattr(WJ.time, 'time', lambda: 1704153600.0)  # 2024-01-02T00:00:00Z
+    journal.record('trakt_ratings_set', plan.trakt_ratings_set[0])
+    journal.close()
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS, activities(rated_at='2024-01-01T23:59:59.000Z')).total == 3
+    # A rating made after the last journaled write is not explained by the run
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS, activities(rated_at='2024-01-02T01:00:00.000Z')) is None
+
+def test_journal_without_activities_is_not_resumed_once_they_are_checked(journal_path):
+    interrupted_journal(journal_path)
+    assert WJ.WriteJournal(journal_path).resume(OPTIONS, activities()) is None
+
+def test_writes_past_the_dispatch_deadline_stay_in_the_journal(journal_path, monkeypatch):
+    from TMDBTraktSyncer import TMDBTraktSyncer as M
+    from TMDBTraktSyncer import tmdbData
+    monkeypatch.setattr(tmdbData, 'fetch_account_id', lambda: 1)
+    options = {'ratings': True, 'watchlist': True, 'remove_watched': False}
+    plan = make_plan()
+    journal = WJ.WriteJournal(journal_path)
+    journal.start(plan, options)
+    deferred = M.apply_plan(plan, options, journal, dispatch_deadline=WJ.time.monotonic() - 1)
+    journal.close()
+    assert deferred == {'tmdb_watchlist_add': 3, 'trakt_ratings_set': 1}
+    assert WJ.WriteJournal(journal_path).resume(options).counts() == plan.counts()
+
+def test_closing_the_tmdb_writer_cancels_the_queued_requests(monkeypatch):
+    sent = []
+    release = threading.Event()
+
+    def send(url, payload):
+        sent.append(url)
+        # Hold every request after the first, so closing finds the rest still queued
+        if len(sent) > 1:
+            release.wait(5)
+        return True
+
+    monkeypatch.setattr(SW, '_send_tmdb_request', send)
+    results = SW.write_tmdb_items([movie(tmdb_id) for tmdb_id in range(50)], lambda item: (f'/movie/{item.tmdb_id}', None), max_workers=2)
+    item, success = next(results)
+    assert success
+    release.set()
+    results.close()
+    # At most the running requests finished, the queued ones never started
+    assert len(sent) <= 4